@@ -2,97 +2,476 @@
 Applications Controller for DockFlow POC
 """
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, url_for, stream_with_context
+from app.core.database import read_replica
+from app.core.metrics import REGISTRY
 from app.models.application import Application
-from app.services.docker_service import DockerService
+from app.models.deployment import Deployment
+from app.models.job import Job
+from app.services.bulk_import import InvalidApplication, application_values, import_applications, ndjson_rows, yaml_rows
+from app.services.compose_service import ComposeError, load_project
+from app.services.container_logs import LogStreamer, parse_since, parse_tail
+from app.services.container_state import containers_for_app
+from app.services.docker_resilience import DockerUnavailableError
+from app.services.docker_scheduler import DockerBusyError
+from app.services.docker_service import STRATEGIES, get_docker_service, resolve_docker_host
+from app.services.deployment_queue import DeploymentQueue, QueueFullError
+from app.services.deployment_recorder import DeploymentRecorder
+from app.services.deployment_service import DeploymentService
+from app.services.event_bus import EventBus
+from app.services.image_prepuller import ImagePrePuller
+from app.services.response_cache import ResponseCache
 from app import db
-import subprocess
+from datetime import datetime
+from sqlalchemy import tuple_
+from sqlalchemy.orm import load_only
+import base64
+import hashlib
+import json
 import os
+import time
 
 bp = Blueprint('applications', __name__)
-docker_service = DockerService()
+deployment_queue = DeploymentQueue.from_env()
+event_bus = EventBus()
+deployment_recorder = DeploymentRecorder.from_env()
+image_prepuller = ImagePrePuller.from_env()
+deployment_service = DeploymentService(deployment_queue, event_bus, deployment_recorder, prepuller=image_prepuller)
+response_cache = ResponseCache.from_env()
+log_streamer = LogStreamer.from_env()
+
+REGISTRY.gauge('dockflow_deployments_queued', 'Deployment jobs waiting for a worker') \
+    .set_function(lambda: deployment_queue.stats()['pending'])
+REGISTRY.gauge('dockflow_deployments_running', 'Deployment jobs being run') \
+    .set_function(lambda: deployment_queue.stats()['running'])
+
+# Page sizes of list requests, see _page_size()
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+# Rows fetched per round trip when exporting
+EXPORT_BATCH_SIZE = 500
+
+# Seconds between keep-alive comments on idle event streams
+EVENT_STREAM_HEARTBEAT = float(os.getenv('EVENT_STREAM_HEARTBEAT', 15))
+# Seconds between database checks of idle event streams, which is how they
+# see deployments run by other API processes
+EVENT_STREAM_POLL_INTERVAL = float(os.getenv('EVENT_STREAM_POLL_INTERVAL', 2))
+
+class InvalidQuery(ValueError):
+    """Raised for unusable list query parameters"""
+
+def _encode_cursor(app):
+    """Opaque keyset cursor pointing after an application"""
+    position = json.dumps([app.created_at.isoformat(), app.id])
+    return base64.urlsafe_b64encode(position.encode()).decode().rstrip('=')
+
+def _decode_cursor(cursor):
+    try:
+        created_at, app_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return datetime.fromisoformat(created_at), str(app_id)
+    except (ValueError, TypeError):
+        raise InvalidQuery('Invalid cursor')
+
+def _page_size(args):
+    """limit argument of a list request, DEFAULT_PAGE_SIZE when it is not given"""
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        limit = 0
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise InvalidQuery(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+    return limit
+
+def _after_cursor(query, args):
+    """Applications of a query coming after the cursor argument of a list request, if any"""
+    if args.get('cursor'):
+        created_at, app_id = _decode_cursor(args['cursor'])
+        query = query.filter(tuple_(Application.created_at, Application.id) > tuple_(created_at, app_id))
+    return query
+
+def _requested_fields():
+    """Top-level fields selected with ?fields=, None for all of them"""
+    if not request.args.get('fields'):
+        return None
+    fields = ['id'] + [f for f in request.args['fields'].split(',') if f and f != 'id']
+    unknown = [f for f in fields if f not in Application.FIELDS]
+    if unknown:
+        raise InvalidQuery(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+def _etag(*parts):
+    """Strong ETag of a representation identified by its parts"""
+    return hashlib.sha1(json.dumps(parts, default=str).encode()).hexdigest()
+
+def _conditional_json(etag, tags, build):
+    """JSON response for one version of a resource, 304 if the client has it
+
+    build() returns the payload and extra headers; it only runs when the
+    serialized payload is not in the response cache.
+    """
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        cached = response_cache.get(etag)
+        if cached is None:
+            payload, headers = build()
+            cached = (jsonify(payload).get_data(), headers)
+            response_cache.put(etag, *cached, tags=tags)
+        body, headers = cached
+        response = Response(body, mimetype='application/json', headers=headers)
+    response.set_etag(etag)
+    # Clients may keep the response but must revalidate it
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def _busy(error, status=429):
+    """Response for a Docker host that is busy (429) or unavailable (503)"""
+    response = jsonify({"error": str(error)})
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, status
+
+def _listing_error(error):
+    """Containers of the applications of a Docker host whose containers cannot be listed"""
+    return [{"error": f"Failed to list containers: {str(error)}"}]
+
+def _statuses(apps, listings):
+    """Status rows of applications from the container listings of their Docker hosts
+
+    A listing is a list of errors for a host that could not be read.
+    """
+    rows = []
+    for app in apps:
+        listing = listings[resolve_docker_host(app.docker_host)]
+        rows.append(_application_status(
+            app, listing if isinstance(listing, list) else containers_for_app(listing, app.name)
+        ))
+    return rows
+
+def _status_page(args):
+    """One page of the applications selected by the ids and namespace arguments of a status request
+
+    Pages are ordered by (created_at, id) as in list_applications(); the
+    cursor of the next page is None on the last one.
+    """
+    limit = _page_size(args)
+    query = Application.query.order_by(Application.created_at, Application.id)
+    
+    ids = [app_id for app_id in args.get('ids', '').split(',') if app_id]
+    if ids:
+        query = query.filter(Application.id.in_(ids))
+    if args.get('namespace'):
+        query = query.filter_by(namespace=args['namespace'])
+    query = _after_cursor(query, args)
+    
+    apps = query.limit(limit + 1).all()
+    return apps[:limit], _encode_cursor(apps[limit - 1]) if len(apps) > limit else None
+
+def _application_status(app, containers):
+    return {
+        "id": app.id,
+        "name": app.name,
+        "status": app.status,
+        "containers": containers
+    }
+
+def _compose_status(app):
+    """Services declared by the local compose file of an application, parsed once per change"""
+    if not app.compose_file or app.repository_url or not os.path.isfile(app.compose_file):
+        return {}
+    try:
+        return {"services": load_project(app.compose_file).summary()}
+    except ComposeError as e:
+        return {"compose_error": str(e)}
+
+def _format_event(event_type, data):
+    """Server-Sent Event carrying JSON data"""
+    return f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+def _filtered_applications(fields=None):
+    """Applications matching the namespace/status/name_prefix filters, in keyset order"""
+    query = Application.query
+    if request.args.get('namespace'):
+        query = query.filter(Application.namespace == request.args['namespace'])
+    if request.args.get('status'):
+        query = query.filter(Application.status == request.args['status'])
+    if request.args.get('name_prefix'):
+        query = query.filter(Application.name.startswith(request.args['name_prefix'], autoescape=True))
+    if fields is not None:
+        # The keyset columns are always needed to build the next cursor
+        columns = {'created_at', 'id'}.union(*(Application.FIELDS[f][0] for f in fields))
+        query = query.options(load_only(*(getattr(Application, c) for c in columns)))
+    return query.order_by(Application.created_at, Application.id)
 
 @bp.route('/applications', methods=['GET'])
+@read_replica
 def list_applications():
-    """List all applications"""
-    applications = Application.query.all()
-    return jsonify([app.to_dict() for app in applications])
+    """List applications one page at a time
+
+    Pages are ordered by (created_at, id); the Link header and
+    X-Next-Cursor carry the cursor of the next page.
+    """
+    try:
+        limit = _page_size(request.args)
+        fields = _requested_fields()
+        query = _after_cursor(_filtered_applications(), request.args)
+    except InvalidQuery as e:
+        return jsonify({"error": str(e)}), 400
+    
+    # Fetch one extra row to know whether there is a next page; only the
+    # versions of the rows are read until the page has to be serialized
+    versions = query.with_entities(Application.id, Application.created_at, Application.updated_at) \
+        .limit(limit + 1).all()
+    page_versions = versions[:limit]
+    # Whether a next page exists changes the Link and X-Next-Cursor headers
+    has_next = len(versions) > limit
+    etag = _etag('applications', sorted(request.args.items(multi=True)),
+                 [(row.id, row.updated_at) for row in page_versions], has_next)
+    
+    def build():
+        ids = [row.id for row in page_versions]
+        apps = {app.id: app for app in _filtered_applications(fields).filter(Application.id.in_(ids))}
+        headers = {}
+        if has_next:
+            cursor = _encode_cursor(page_versions[-1])
+            args = {**request.args.to_dict(), 'cursor': cursor}
+            headers['Link'] = f'<{url_for("applications.list_applications", **args)}>; rel="next"'
+            headers['X-Next-Cursor'] = cursor
+        return [apps[app_id].to_dict(fields) for app_id in ids if app_id in apps], headers
+    
+    tags = ['applications'] + [f'application:{row.id}' for row in page_versions]
+    return _conditional_json(etag, tags, build)
+
+@bp.route('/applications/export', methods=['GET'])
+@read_replica
+def export_applications():
+    """Stream every matching application as one JSON array, or as NDJSON, without loading them all"""
+    try:
+        fields = _requested_fields()
+        query = _filtered_applications(fields)
+    except InvalidQuery as e:
+        return jsonify({"error": str(e)}), 400
+    
+    if request.accept_mimetypes.best_match(['application/json', 'application/x-ndjson']) == 'application/x-ndjson':
+        def generate_lines():
+            for app in query.yield_per(EXPORT_BATCH_SIZE):
+                yield json.dumps(app.to_dict(fields)) + '\n'
+        
+        return Response(stream_with_context(generate_lines()), mimetype='application/x-ndjson')
+    
+    def generate():
+        yield '['
+        for index, app in enumerate(query.yield_per(EXPORT_BATCH_SIZE)):
+            yield (',' if index else '') + json.dumps(app.to_dict(fields))
+        yield ']'
+    
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+def _prepull(app_ids):
+    """Start pulling the images of new or changed applications before they are deployed"""
+    for start in range(0, len(app_ids), EXPORT_BATCH_SIZE):
+        rows = Application.query.with_entities(
+            Application.compose_file, Application.environments, Application.docker_host
+        ).filter(Application.id.in_(app_ids[start:start + EXPORT_BATCH_SIZE]))
+        for compose_file, environments, docker_host in rows:
+            environments = environments or [{'dockerHost': docker_host}]
+            deployment_service.prepull(compose_file, [env['dockerHost'] for env in environments])
+
+@bp.route('/images/pulls', methods=['GET'])
+def list_image_pulls():
+    """Timings of the latest image pre-pulls"""
+    return jsonify(image_prepuller.timings())
 
 @bp.route('/applications', methods=['POST'])
 def create_application():
     """Create a new application"""
-    data = request.get_json()
-    
-    # Validate required fields
-    if not data or not data.get('name'):
-        return jsonify({"error": "Application name is required"}), 400
-    
-    # Create application
-    app = Application(
-        name=data['name'],
-        namespace=data.get('namespace', 'default'),
-        repository_url=data.get('repository', {}).get('url'),
-        repository_branch=data.get('repository', {}).get('branch', 'main'),
-        compose_file=data.get('docker', {}).get('composeFile'),
-        context=data.get('docker', {}).get('context', '.'),
-        docker_host=data.get('environments', [{}])[0].get('dockerHost', 'localhost')
-    )
+    try:
+        app = Application(**application_values(request.get_json()))
+    except InvalidApplication as e:
+        return jsonify({"error": str(e)}), 400
     
     db.session.add(app)
     db.session.commit()
+    response_cache.invalidate('applications')
+    _prepull([app.id])
     
     return jsonify(app.to_dict()), 201
 
+@bp.route('/applications/bulk', methods=['POST'])
+def bulk_import_applications():
+    """Create or update many applications from an NDJSON or multi-document YAML body
+
+    Rows are validated as the body is read and written in batches; the
+    response streams one NDJSON result per row followed by a summary line.
+    """
+    mode = request.args.get('mode', 'create')
+    if mode not in ('create', 'upsert'):
+        return jsonify({"error": "mode must be create or upsert"}), 400
+    
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        rows = ndjson_rows(request.stream)
+    elif request.mimetype in ('application/yaml', 'application/x-yaml', 'text/yaml'):
+        rows = yaml_rows(request.stream)
+    else:
+        return jsonify({"error": "Send application/x-ndjson or application/yaml"}), 415
+    
+    def generate():
+        summary = {'created': 0, 'updated': 0, 'error': 0}
+        for results in import_applications(rows, upsert=mode == 'upsert'):
+            stored = []
+            for result in results:
+                summary[result['status']] += 1
+                if result['status'] != 'error':
+                    stored.append(result['id'])
+                if result['status'] == 'updated':
+                    response_cache.invalidate(f"application:{result['id']}")
+            # Each written batch is visible and pulling before the next one is read
+            if stored:
+                response_cache.invalidate('applications')
+                _prepull(stored)
+            yield ''.join(json.dumps(result) + '\n' for result in results)
+        yield json.dumps({'summary': summary}) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@bp.route('/applications/status', methods=['GET'])
+@read_replica
+def get_applications_status():
+    """Get deployment status of a page of applications with one container listing per Docker host
+
+    The Link header and X-Next-Cursor carry the cursor of the next page.
+    """
+    try:
+        apps, cursor = _status_page(request.args)
+    except InvalidQuery as e:
+        return jsonify({"error": str(e)}), 400
+    headers = {}
+    if cursor:
+        args = {**request.args.to_dict(), 'cursor': cursor}
+        headers['Link'] = f'<{url_for("applications.get_applications_status", **args)}>; rel="next"'
+        headers['X-Next-Cursor'] = cursor
+    
+    hosts = {resolve_docker_host(app.docker_host) for app in apps}
+    listings = {}
+    for docker_host in hosts:
+        try:
+            listings[docker_host] = get_docker_service(docker_host).list_containers_by_app()
+        except (DockerUnavailableError, DockerBusyError) as e:
+            # Applications of other hosts can still be reported
+            if len(hosts) == 1:
+                return _busy(e, 503 if isinstance(e, DockerUnavailableError) else 429)
+            listings[docker_host] = _listing_error(e)
+        except Exception as e:
+            listings[docker_host] = _listing_error(e)
+    rows = _statuses(apps, listings)
+    
+    # Clients can ask for one JSON document per line
+    if request.accept_mimetypes.best_match(['application/json', 'application/x-ndjson']) == 'application/x-ndjson':
+        lines = [json.dumps(row) + '\n' for row in rows]
+        return Response(lines, mimetype='application/x-ndjson', headers=headers)
+    
+    return jsonify(rows), 200, headers
+
 @bp.route('/applications/<app_id>', methods=['GET'])
+@read_replica
 def get_application(app_id):
     """Get application by ID"""
-    app = Application.query.get(app_id)
-    if not app:
+    updated_at = db.session.query(Application.updated_at).filter_by(id=app_id).first()
+    if not updated_at:
         return jsonify({"error": "Application not found"}), 404
     
-    return jsonify(app.to_dict())
+    def build():
+        return db.session.get(Application, app_id).to_dict(), {}
+    
+    return _conditional_json(_etag('application', app_id, updated_at[0]), [f'application:{app_id}'], build)
 
 @bp.route('/applications/<app_id>/deploy', methods=['POST'])
 def deploy_application(app_id):
-    """Deploy an application"""
+    """Queue a deployment of an application"""
     app = Application.query.get(app_id)
     if not app:
         return jsonify({"error": "Application not found"}), 404
     
+    # force=true redeploys every compose service even if nothing changed
+    data = request.get_json(silent=True) or {}
+    force = bool(data.get('force')) or request.args.get('force') == 'true'
+    
+    # Multi-host rollout settings, all environments are targeted by default
+    rollout_options = {}
     try:
-        # Update status to deploying
-        app.status = 'deploying'
-        db.session.commit()
-        
-        # Deploy using Docker Compose if compose file exists
-        if app.compose_file and os.path.exists(app.compose_file):
-            result = docker_service.deploy_compose(app.compose_file, app.name)
-            if result['success']:
-                app.status = 'running'
-            else:
-                app.status = 'failed'
-        else:
-            # Simple container deployment
-            result = docker_service.deploy_container(app.name, 'nginx:alpine')
-            if result['success']:
-                app.status = 'running'
-            else:
-                app.status = 'failed'
-        
-        db.session.commit()
-        
-        return jsonify({
-            "id": app.id,
-            "status": app.status,
-            "message": result.get('message', 'Deployment completed')
-        })
-        
-    except Exception as e:
-        app.status = 'failed'
-        db.session.commit()
-        return jsonify({"error": str(e)}), 500
+        if data.get('environments') is not None:
+            rollout_options['environments'] = [str(name) for name in data['environments']]
+        for option, key in (('parallelism', 'parallelism'), ('batch_size', 'batchSize'), ('canary', 'canary')):
+            if data.get(key) is not None:
+                rollout_options[option] = int(data[key])
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid rollout settings"}), 400
+    
+    # Replaces the application's deployment strategy for this deployment
+    if data.get('strategy') is not None:
+        if data['strategy'] not in STRATEGIES:
+            return jsonify({"error": f"strategy must be one of {', '.join(STRATEGIES)}"}), 400
+        rollout_options['strategy'] = data['strategy']
+    
+    # Turn the deployment away while its Docker hosts are down or already have a full queue
+    try:
+        for env in app.get_environments():
+            target = get_docker_service(env['dockerHost'])
+            target.circuit_breaker.check()
+            target.scheduler.admit('deploy')
+    except DockerUnavailableError as e:
+        return _busy(e, 503)
+    except DockerBusyError as e:
+        return _busy(e)
+    
+    try:
+        job = deployment_service.enqueue(app, force=force, **rollout_options)
+    except QueueFullError as e:
+        return jsonify({"error": str(e)}), 503
+    response_cache.invalidate(f'application:{app.id}')
+    
+    response = jsonify({
+        "id": app.id,
+        "status": app.status,
+        "job": job.to_dict(),
+        "message": f"Deployment of {app.name} queued"
+    })
+    response.headers['Location'] = url_for('applications.get_job', job_id=job.id)
+    return response, 202
+
+@bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Get deployment job status, from any API process"""
+    job = deployment_queue.get_job(job_id) or db.session.get(Job, job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    
+    return jsonify(job.to_dict())
+
+@bp.route('/applications/<app_id>/deployments', methods=['GET'])
+def list_deployments(app_id):
+    """List deployment attempts of an application, newest first"""
+    app = Application.query.get(app_id)
+    if not app:
+        return jsonify({"error": "Application not found"}), 404
+    
+    try:
+        limit = _page_size(request.args)
+    except InvalidQuery as e:
+        return jsonify({"error": str(e)}), 400
+    
+    # Make attempts still buffered by this process visible
+    deployment_recorder.flush()
+    
+    deployments = (
+        Deployment.query
+        .filter_by(application_id=app.id)
+        .order_by(Deployment.started_at.desc())
+        .limit(limit)
+    )
+    return jsonify([deployment.to_dict() for deployment in deployments])
 
 @bp.route('/applications/<app_id>/status', methods=['GET'])
+@read_replica
 def get_application_status(app_id):
     """Get application deployment status"""
     app = Application.query.get(app_id)
@@ -101,14 +480,115 @@ def get_application_status(app_id):
     
     try:
         # Get container status from Docker
-        containers = docker_service.get_container_status(app.name)
-        
-        return jsonify({
-            "id": app.id,
-            "name": app.name,
-            "status": app.status,
-            "containers": containers
-        })
+        containers = get_docker_service(app.docker_host).get_container_status(app.name)
+        return jsonify({**_application_status(app, containers), **_compose_status(app)})
         
+    except DockerUnavailableError as e:
+        return _busy(e, 503)
+    except DockerBusyError as e:
+        return _busy(e)
     except Exception as e:
-        return jsonify({"error": str(e)}), 500 
\ No newline at end of file
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/applications/<app_id>/logs', methods=['GET'])
+@read_replica
+def get_application_logs(app_id):
+    """Stream the logs of the containers of an application
+    
+    tail, since (a timestamp, RFC 3339 date or duration like 15m), follow
+    and timestamps are passed to Docker; service, repeated or comma-separated,
+    keeps these compose services; environment picks the Docker host.
+    """
+    app = Application.query.get(app_id)
+    if not app:
+        return jsonify({"error": "Application not found"}), 404
+    
+    try:
+        tail = parse_tail(request.args.get('tail'))
+        since = parse_since(request.args.get('since'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    follow = request.args.get('follow', '').lower() in ('1', 'true')
+    timestamps = request.args.get('timestamps', '').lower() in ('1', 'true')
+    services = [service for value in request.args.getlist('service') for service in value.split(',') if service]
+    
+    environments = app.get_environments()
+    if request.args.get('environment'):
+        environments = [env for env in environments if env['name'] == request.args['environment']]
+        if not environments:
+            return jsonify({"error": "Environment not found"}), 404
+    app_name, docker_host = app.name, environments[0]['dockerHost']
+    db.session.remove()
+    
+    target = get_docker_service(docker_host)
+    try:
+        containers = target.find_app_containers(app_name, services)
+        if not containers:
+            return jsonify({"error": "No containers found"}), 404
+        logs = log_streamer.open(target, containers, follow=follow, tail=tail, since=since, timestamps=timestamps)
+    except DockerUnavailableError as e:
+        return _busy(e, 503)
+    except DockerBusyError as e:
+        return _busy(e)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    
+    # Served through the ASGI bridge, a client leaving a silent followed
+    # stream would otherwise only be noticed with the next line
+    on_disconnect = request.environ.get('dockflow.on_disconnect')
+    if on_disconnect:
+        on_disconnect(logs.close)
+    
+    response = Response(logs, mimetype='text/plain')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@bp.route('/applications/<app_id>/events', methods=['GET'])
+def stream_application_events(app_id):
+    """Stream application status changes and deployment output as Server-Sent Events"""
+    # Subscribe before reading the status so no transition is missed
+    subscription = event_bus.subscribe(app_id)
+    app = Application.query.get(app_id)
+    if not app:
+        subscription.close()
+        return jsonify({"error": "Application not found"}), 404
+    
+    # With until=finished the stream ends once the next deployment settles
+    until_finished = request.args.get('until') == 'finished'
+    status = app.status
+    db.session.remove()
+    
+    def generate():
+        nonlocal status
+        with subscription:
+            yield _format_event('status', {"id": app_id, "status": status})
+            written = time.monotonic()
+            
+            while True:
+                event = subscription.get(timeout=EVENT_STREAM_POLL_INTERVAL)
+                if event is None:
+                    # Deployments run by other API processes are only seen in
+                    # the database
+                    current = Application.query.get(app_id)
+                    db.session.remove()
+                    if current is None:
+                        return
+                    if current.status == status:
+                        if time.monotonic() - written >= EVENT_STREAM_HEARTBEAT:
+                            yield ": keep-alive\n\n"
+                            written = time.monotonic()
+                        continue
+                    event = {'event': 'status', 'data': {"id": app_id, "status": current.status}}
+                
+                yield _format_event(event['event'], event['data'])
+                written = time.monotonic()
+                if event['event'] == 'status':
+                    status = event['data']['status']
+                    if until_finished and status != 'deploying':
+                        return
+    
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
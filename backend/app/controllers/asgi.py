@@ -0,0 +1,461 @@
+"""
+ASGI Controller for DockFlow POC
+
+Serves the API to an ASGI server, see asgi.py. Container status reads and
+event streams run on the event loop with the AsyncDockerService, so they
+hold no thread while waiting for Docker or for events. Every other route
+is handed to the Flask application on a worker thread; deployments queued
+that way still run on the DeploymentQueue workers.
+"""
+
+import asyncio
+import io
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+from flask import g
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.exceptions import ClientDisconnected
+from werkzeug.http import parse_accept_header
+
+from app import db
+from app.controllers import applications
+from app.core.metrics import REQUEST_SECONDS
+from app.models.application import Application
+from app.services.async_docker import get_async_docker_service
+from app.services.docker_resilience import DockerUnavailableError
+from app.services.docker_scheduler import DockerBusyError
+from app.services.docker_service import resolve_docker_host
+
+logger = logging.getLogger(__name__)
+
+# Response chunks of a Flask view waiting for a slow client
+WSGI_BUFFER_CHUNKS = 16
+# Request body chunks received ahead of the Flask view reading them
+WSGI_BODY_CHUNKS = 4
+# WSGI environ key of a function registering callbacks run once the client is
+# gone, for views that block on a stream between chunks (e.g. followed logs)
+ON_DISCONNECT = 'dockflow.on_disconnect'
+
+# Routes served on the event loop: method, path pattern, handler name
+ROUTES = [
+    ('GET', re.compile(r'^/api/v1/applications/status$'), 'get_applications_status'),
+    ('GET', re.compile(r'^/api/v1/applications/(?P<app_id>[^/]+)/status$'), 'get_application_status'),
+    ('GET', re.compile(r'^/api/v1/applications/(?P<app_id>[^/]+)/events$'), 'stream_application_events'),
+]
+
+
+class _RequestAbandoned(BaseException):
+    """Raised on the thread of a Flask view once the ASGI request it serves is gone
+
+    Not an Exception, so Flask lets it through instead of rendering an
+    error response for no one.
+    """
+
+
+class _RequestBody(io.RawIOBase):
+    """wsgi.input handing the request body to the view as the client sends it
+
+    next_chunk() returns the next chunk, b'' at the end of the body and None
+    if the client went away before sending all of it.
+    """
+
+    def __init__(self, next_chunk: Callable[[], Optional[bytes]]):
+        self._next_chunk = next_chunk
+        self._chunk = memoryview(b'')
+        self._ended = False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._chunk and not self._ended:
+            chunk = self._next_chunk()
+            if chunk is None:
+                raise ClientDisconnected()
+            self._ended = not chunk
+            self._chunk = memoryview(chunk)
+        size = min(len(buffer), len(self._chunk))
+        buffer[:size] = self._chunk[:size]
+        self._chunk = self._chunk[size:]
+        return size
+
+
+class ASGIApplication:
+    """ASGI application in front of the Flask application"""
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        # Flask views get threads of their own, so long-lived responses never
+        # starve the default executor the database work runs on
+        self.executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv('ASGI_WSGI_THREADS', 32)), thread_name_prefix='asgi-wsgi'
+        )
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        if scope['type'] != 'http':
+            return
+
+        for method, pattern, name in ROUTES:
+            match = pattern.match(scope['path'])
+            if match and scope['method'] == method:
+                started = time.perf_counter()
+                status = await getattr(self, name)(scope, receive, send, **match.groupdict())
+                REQUEST_SECONDS.observe(
+                    time.perf_counter() - started, method=method, endpoint=f'asgi.{name}', status=status
+                )
+                return
+        await self._wsgi(scope, receive, send)
+
+    async def _lifespan(self, receive: Callable, send: Callable):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _db(self, function: Callable, *args, replica: bool = False):
+        """Run database work on a worker thread inside an application context"""
+        def run():
+            with self.flask_app.app_context():
+                g.use_replica = replica
+                try:
+                    return function(*args)
+                finally:
+                    db.session.remove()
+        return await asyncio.to_thread(run)
+
+    @staticmethod
+    async def _send_json(send: Callable, status: int, payload: Any, headers: Optional[Dict[str, str]] = None) -> int:
+        body = json.dumps(payload).encode()
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(body)).encode()),
+                *((name.lower().encode(), value.encode()) for name, value in (headers or {}).items())
+            ]
+        })
+        await send({'type': 'http.response.body', 'body': body})
+        return status
+
+    async def _send_error(self, send: Callable, error: Exception) -> int:
+        """Same responses as the Flask views for Docker errors"""
+        if isinstance(error, (DockerUnavailableError, DockerBusyError)):
+            status = 503 if isinstance(error, DockerUnavailableError) else 429
+            return await self._send_json(send, status, {"error": str(error)}, {'Retry-After': str(error.retry_after)})
+        return await self._send_json(send, 500, {"error": str(error)})
+
+    @staticmethod
+    def _args(scope: Dict[str, Any]) -> Dict[str, str]:
+        return dict(parse_qsl(scope.get('query_string', b'').decode('latin-1'), keep_blank_values=True))
+
+    @staticmethod
+    def _header(scope: Dict[str, Any], name: bytes) -> str:
+        return b','.join(value for key, value in scope['headers'] if key.lower() == name).decode('latin-1')
+
+    async def get_applications_status(self, scope, receive, send) -> int:
+        """Get deployment status of a page of applications with one container listing per Docker host"""
+        args = self._args(scope)
+
+        try:
+            # Loaded rows stay readable once their session is closed
+            apps, cursor = await self._db(applications._status_page, args, replica=True)
+        except applications.InvalidQuery as e:
+            return await self._send_json(send, 400, {"error": str(e)})
+        headers = {}
+        if cursor:
+            headers['Link'] = f'<{scope["path"]}?{urlencode({**args, "cursor": cursor})}>; rel="next"'
+            headers['X-Next-Cursor'] = cursor
+        hosts = sorted({resolve_docker_host(app.docker_host) for app in apps})
+        results = await asyncio.gather(
+            *(get_async_docker_service(docker_host).list_containers_by_app() for docker_host in hosts),
+            return_exceptions=True
+        )
+        listings = {}
+        for docker_host, result in zip(hosts, results):
+            if isinstance(result, (DockerUnavailableError, DockerBusyError)) and len(hosts) == 1:
+                return await self._send_error(send, result)
+            listings[docker_host] = applications._listing_error(result) if isinstance(result, Exception) else result
+        rows = applications._statuses(apps, listings)
+
+        accept = parse_accept_header(self._header(scope, b'accept'), MIMEAccept)
+        if accept.best_match(['application/json', 'application/x-ndjson']) == 'application/x-ndjson':
+            body = ''.join(json.dumps(row) + '\n' for row in rows).encode()
+            await send({'type': 'http.response.start', 'status': 200, 'headers': [
+                (b'content-type', b'application/x-ndjson'),
+                *((name.lower().encode(), value.encode()) for name, value in headers.items())
+            ]})
+            await send({'type': 'http.response.body', 'body': body})
+            return 200
+        return await self._send_json(send, 200, rows, headers)
+
+    async def get_application_status(self, scope, receive, send, app_id: str) -> int:
+        """Get application deployment status"""
+        def load():
+            app = db.session.get(Application, app_id)
+            if app is None:
+                return None
+            return app.docker_host, applications._application_status(app, None), applications._compose_status(app)
+
+        found = await self._db(load, replica=True)
+        if found is None:
+            return await self._send_json(send, 404, {"error": "Application not found"})
+        docker_host, status, compose = found
+        try:
+            status['containers'] = await get_async_docker_service(docker_host).get_container_status(status['name'])
+        except Exception as e:
+            return await self._send_error(send, e)
+        return await self._send_json(send, 200, {**status, **compose})
+
+    async def stream_application_events(self, scope, receive, send, app_id: str) -> int:
+        """Stream application status changes and deployment output as Server-Sent Events"""
+        def current_status():
+            app = db.session.get(Application, app_id)
+            return app.status if app else None
+
+        # Subscribe before reading the status so no transition is missed
+        subscription = applications.event_bus.subscribe(app_id)
+        with subscription:
+            status = await self._db(current_status)
+            if status is None:
+                return await self._send_json(send, 404, {"error": "Application not found"})
+            until_finished = self._args(scope).get('until') == 'finished'
+
+            await send({'type': 'http.response.start', 'status': 200, 'headers': [
+                (b'content-type', b'text/event-stream; charset=utf-8'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no')
+            ]})
+
+            async def write(text: str):
+                await send({'type': 'http.response.body', 'body': text.encode(), 'more_body': True})
+
+            async def stream():
+                nonlocal status
+                await write(applications._format_event('status', {"id": app_id, "status": status}))
+                written = time.monotonic()
+                while True:
+                    event = await subscription.get_async(timeout=applications.EVENT_STREAM_POLL_INTERVAL)
+                    if event is None:
+                        # Deployments run by other API processes are only seen in
+                        # the database
+                        current = await self._db(current_status)
+                        if current is None:
+                            return
+                        if current == status:
+                            if time.monotonic() - written >= applications.EVENT_STREAM_HEARTBEAT:
+                                await write(": keep-alive\n\n")
+                                written = time.monotonic()
+                            continue
+                        event = {'event': 'status', 'data': {"id": app_id, "status": current}}
+
+                    await write(applications._format_event(event['event'], event['data']))
+                    written = time.monotonic()
+                    if event['event'] == 'status':
+                        status = event['data']['status']
+                        if until_finished and status != 'deploying':
+                            return
+
+            streaming = asyncio.ensure_future(stream())
+            disconnected = asyncio.ensure_future(self._disconnected(receive))
+            try:
+                await asyncio.wait({streaming, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                streaming.cancel()
+                disconnected.cancel()
+            if disconnected.done() and not disconnected.cancelled():
+                return 200
+            if not streaming.cancelled() and streaming.exception():
+                raise streaming.exception()
+            await send({'type': 'http.response.body', 'body': b''})
+            return 200
+
+    @staticmethod
+    async def _disconnected(receive: Callable):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    def _environ(self, scope: Dict[str, Any], body: io.BufferedIOBase) -> Dict[str, Any]:
+        """WSGI environ of an ASGI HTTP request"""
+        server = scope.get('server') or ('localhost', 80)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode().decode('latin-1'),
+            'PATH_INFO': scope['path'].encode().decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': str(server[0]),
+            'SERVER_PORT': str(server[1] or 80),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': body,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+        for name, value in scope['headers']:
+            name = name.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            if name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                environ[name] = value
+            else:
+                key = f'HTTP_{name}'
+                environ[key] = f'{environ[key]},{value}' if key in environ else value
+        # A body sent chunked is read until the client ends it
+        environ['wsgi.input_terminated'] = 'CONTENT_LENGTH' not in environ
+        return environ
+
+    async def _wsgi(self, scope: Dict[str, Any], receive: Callable, send: Callable):
+        """Run a request through the Flask application on a worker thread, streaming its body and response
+
+        The worker waits on the event loop for body chunks and for room in
+        the response buffer. If this coroutine is cancelled, waits of the
+        worker are cancelled too and it stops with _RequestAbandoned.
+        """
+        loop = asyncio.get_running_loop()
+        # Both bounded, so neither a fast client nor a slow one makes data pile up
+        body: 'asyncio.Queue[Optional[bytes]]' = asyncio.Queue(maxsize=WSGI_BODY_CHUNKS)
+        messages: 'asyncio.Queue[Tuple]' = asyncio.Queue(maxsize=WSGI_BUFFER_CHUNKS)
+        cancelled = threading.Event()
+        abandoned = threading.Event()
+        waits: Set[Future] = set()
+        callbacks: List[Callable[[], None]] = []
+        lock = threading.Lock()
+
+        def on_disconnect(callback: Callable[[], None]):
+            with lock:
+                if not cancelled.is_set():
+                    callbacks.append(callback)
+                    return
+            callback()
+
+        def disconnect(task: asyncio.Future):
+            with lock:
+                cancelled.set()
+            if task.cancelled():
+                return
+            # Wakes up a view waiting for a silent stream, see ON_DISCONNECT
+            for callback in callbacks:
+                try:
+                    callback()
+                except Exception as e:
+                    logger.warning('Disconnect callback failed: %s', e)
+
+        async def receive_request():
+            """Queue the body for the view, then wait for the client to go away"""
+            while True:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    # What is left of the body is of no use to the view
+                    while not body.empty():
+                        body.get_nowait()
+                    body.put_nowait(None)
+                    return
+                if message.get('body'):
+                    await body.put(message['body'])
+                if not message.get('more_body'):
+                    await body.put(b'')
+                    break
+            await self._disconnected(receive)
+
+        def wait_for(coroutine):
+            """Run a coroutine on the event loop from the worker thread and wait for it"""
+            with lock:
+                if abandoned.is_set():
+                    coroutine.close()
+                    raise _RequestAbandoned()
+                future = asyncio.run_coroutine_threadsafe(coroutine, loop)
+                waits.add(future)
+            try:
+                return future.result()
+            except CancelledError:
+                raise _RequestAbandoned()
+            finally:
+                with lock:
+                    waits.discard(future)
+
+        def put(*message):
+            wait_for(messages.put(message))
+
+        environ = self._environ(scope, io.BufferedReader(_RequestBody(lambda: wait_for(body.get()))))
+        environ[ON_DISCONNECT] = on_disconnect
+
+        def start_response(status: str, headers: List[Tuple[str, str]], exc_info=None):
+            put('start', int(status.split()[0]), headers)
+            return lambda data: put('body', data)
+
+        def run():
+            try:
+                result = self.flask_app(environ, start_response)
+                try:
+                    for chunk in result:
+                        if cancelled.is_set():
+                            break
+                        if chunk:
+                            put('body', chunk)
+                finally:
+                    if hasattr(result, 'close'):
+                        result.close()
+                put('end')
+            except _RequestAbandoned:
+                pass
+            except BaseException as e:
+                try:
+                    put('error', e)
+                except _RequestAbandoned:
+                    pass
+
+        worker = loop.run_in_executor(self.executor, run)
+        receiving = asyncio.ensure_future(receive_request())
+        receiving.add_done_callback(disconnect)
+        try:
+            while True:
+                message = await messages.get()
+                if message[0] == 'error':
+                    raise message[1]
+                if cancelled.is_set():
+                    # Drained until the view notices, at its next chunk
+                    if message[0] == 'end':
+                        break
+                    continue
+                try:
+                    if message[0] == 'start':
+                        await send({
+                            'type': 'http.response.start',
+                            'status': message[1],
+                            'headers': [
+                                (name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in message[2]
+                            ]
+                        })
+                    elif message[0] == 'body':
+                        await send({'type': 'http.response.body', 'body': message[1], 'more_body': True})
+                    else:
+                        await send({'type': 'http.response.body', 'body': b''})
+                        break
+                except OSError:
+                    cancelled.set()
+        finally:
+            receiving.cancel()
+            # Nothing reads the response or feeds the body anymore, let the worker go
+            with lock:
+                abandoned.set()
+                for future in waits:
+                    future.cancel()
+        await worker
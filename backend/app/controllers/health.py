@@ -2,11 +2,56 @@
 Health Check Controller for DockFlow POC
 """
 
-from flask import Blueprint, jsonify
+import os
+import threading
+from flask import Blueprint, current_app, jsonify
+from app.core.database import REPLICA_BIND, pool_stats
+from app.services.docker_service import resolve_docker_host
+from app.services.health_service import Probe, database_check, docker_check
 
 bp = Blueprint('health', __name__)
 
+# Seconds a probe result is reused, and how long a probe may take
+HEALTH_CHECK_TTL = float(os.getenv('HEALTH_CHECK_TTL', 5))
+HEALTH_CHECK_TIMEOUT = float(os.getenv('HEALTH_CHECK_TIMEOUT', 2))
+
+_probes = None
+_probes_lock = threading.Lock()
+
+def _readiness_probes():
+    """Probes of the dependencies needed to serve traffic, built on first use"""
+    global _probes
+    with _probes_lock:
+        if _probes is None:
+            flask_app = current_app._get_current_object()
+            checks = {'database': database_check(flask_app)}
+            if REPLICA_BIND in current_app.extensions['sqlalchemy'].engines:
+                checks['database_replica'] = database_check(flask_app, REPLICA_BIND)
+            checks['docker'] = docker_check(resolve_docker_host(), HEALTH_CHECK_TIMEOUT)
+            _probes = [
+                Probe(name, check, ttl=HEALTH_CHECK_TTL, timeout=HEALTH_CHECK_TIMEOUT)
+                for name, check in checks.items()
+            ]
+        return _probes
+
 @bp.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    return jsonify({"status": "healthy"}) 
\ No newline at end of file
+    return jsonify({"status": "healthy"})
+
+@bp.route('/health/live', methods=['GET'])
+def liveness():
+    """Liveness: the process answers requests, dependencies are not checked"""
+    return jsonify({"status": "alive"})
+
+@bp.route('/health/ready', methods=['GET'])
+def readiness():
+    """Readiness: the database and Docker daemon answer within the probe timeout"""
+    checks = {probe.name: probe.result() for probe in _readiness_probes()}
+    ready = all(check['status'] == 'up' for check in checks.values())
+    return jsonify({"status": "ready" if ready else "not ready", "checks": checks}), 200 if ready else 503
+
+@bp.route('/health/database', methods=['GET'])
+def database_pools():
+    """Connection pool usage and checkout wait times"""
+    return jsonify(pool_stats())
@@ -0,0 +1,46 @@
+"""
+Metrics Controller for DockFlow POC
+"""
+
+from flask import Blueprint, Response
+from app.core.database import pool_stats
+from app.core.metrics import REGISTRY
+
+bp = Blueprint('metrics', __name__)
+
+def _pool_metrics():
+    """Connection pool usage and checkout waits, read when scraped"""
+    checked_out = [
+        '# HELP dockflow_db_pool_checked_out Connections in use',
+        '# TYPE dockflow_db_pool_checked_out gauge'
+    ]
+    waits = [
+        '# HELP dockflow_db_pool_checkout_wait_seconds Time waited for a pooled connection',
+        '# TYPE dockflow_db_pool_checkout_wait_seconds histogram'
+    ]
+    timeouts = [
+        '# HELP dockflow_db_pool_checkout_timeouts_total Checkouts that gave up waiting',
+        '# TYPE dockflow_db_pool_checkout_timeouts_total counter'
+    ]
+    for database, stats in pool_stats().items():
+        label = f'database="{database}"'
+        if 'checked_out' in stats:
+            checked_out.append(f'dockflow_db_pool_checked_out{{{label}}} {stats["checked_out"]}')
+        checkout = stats.get('checkout')
+        if checkout:
+            for bound, count in checkout['wait_seconds_buckets'].items():
+                waits.append(f'dockflow_db_pool_checkout_wait_seconds_bucket{{{label},le="{bound}"}} {count}')
+            waits += [
+                f'dockflow_db_pool_checkout_wait_seconds_bucket{{{label},le="+Inf"}} {checkout["checkouts"]}',
+                f'dockflow_db_pool_checkout_wait_seconds_sum{{{label}}} {checkout["wait_seconds_total"]}',
+                f'dockflow_db_pool_checkout_wait_seconds_count{{{label}}} {checkout["checkouts"]}'
+            ]
+            timeouts.append(f'dockflow_db_pool_checkout_timeouts_total{{{label}}} {checkout["timeouts"]}')
+    return checked_out + waits + timeouts
+
+REGISTRY.add_collector(_pool_metrics)
+
+@bp.route('/metrics', methods=['GET'])
+def metrics():
+    """Metrics of this process in the Prometheus text format"""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
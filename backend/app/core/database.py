@@ -0,0 +1,227 @@
+"""
+Database Configuration for DockFlow POC
+"""
+
+import functools
+import hashlib
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+import sqlalchemy.exc as sa_exc
+from flask import current_app, g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import UpdateBase, text
+from sqlalchemy.pool import QueuePool
+
+# Name of the read replica in SQLALCHEMY_BINDS
+REPLICA_BIND = 'replica'
+# Seconds between attempts to take a busy advisory lock
+LOCK_POLL_INTERVAL = 0.25
+
+
+class LockTimeout(Exception):
+    """Raised when an advisory lock is not acquired in time"""
+
+
+class PoolMetrics:
+    """Time spent waiting for connections of one pool"""
+
+    # Upper bounds in seconds of the wait time histogram
+    BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.buckets = [0] * len(self.BUCKETS)
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+            for i, bound in enumerate(self.BUCKETS):
+                if seconds <= bound:
+                    self.buckets[i] += 1
+
+    def timed_out(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'wait_seconds_total': round(self.wait_seconds_total, 6),
+                'wait_seconds_max': round(self.wait_seconds_max, 6),
+                # Cumulative counts, like a Prometheus histogram
+                'wait_seconds_buckets': {str(bound): count for bound, count in zip(self.BUCKETS, self.buckets)}
+            }
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool recording how long checkouts wait for a connection
+
+    The wait includes opening a new connection when the pool has none idle.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except sa_exc.TimeoutError:
+            self.metrics.timed_out()
+            raise
+        finally:
+            self.metrics.observe(time.perf_counter() - started)
+
+
+def _is_memory_database(url: str) -> bool:
+    return url.startswith('sqlite') and (url in ('sqlite://', 'sqlite:///') or ':memory:' in url)
+
+
+def engine_options(url: Optional[str]) -> Dict[str, Any]:
+    """SQLAlchemy engine options configured from environment variables"""
+    if not url or _is_memory_database(url):
+        return {}
+
+    options = {
+        'poolclass': TimedQueuePool,
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': float(os.getenv('DB_POOL_TIMEOUT', 30)),
+        # Reconnect before servers or proxies drop idle connections
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true'),
+        # Keep reusing the same few connections so extra ones can expire
+        'pool_use_lifo': True
+    }
+
+    if url.startswith('postgresql'):
+        connect_args = {'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', 10))}
+        if os.getenv('DB_STATEMENT_TIMEOUT'):
+            connect_args['options'] = f"-c statement_timeout={int(os.getenv('DB_STATEMENT_TIMEOUT'))}"
+        options['connect_args'] = connect_args
+    return options
+
+
+def configure_database(app):
+    """Set engine options and the optional read replica of an application"""
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config.get('SQLALCHEMY_DATABASE_URI'))
+
+    replica_url = os.getenv('DATABASE_REPLICA_URL')
+    if replica_url:
+        app.config['SQLALCHEMY_BINDS'] = {REPLICA_BIND: {'url': replica_url, **engine_options(replica_url)}}
+
+
+class RoutingSession(Session):
+    """Session sending the queries of read_replica() views to the replica
+
+    Flushes and INSERT/UPDATE/DELETE statements always go to the primary,
+    as does everything when no replica is configured.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (
+            bind is None
+            and not self._flushing
+            and not isinstance(clause, UpdateBase)
+            and has_app_context()
+            and g.get('use_replica')
+        ):
+            engine = self._db.engines.get(REPLICA_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def read_replica(view):
+    """Run the database reads of a view on the read replica, if any
+
+    Replicas lag behind the primary; only use it for views that can show
+    slightly stale data.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        g.use_replica = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def pool_stats() -> Dict[str, Any]:
+    """Connection pool usage and checkout wait times of every database"""
+    stats = {}
+    for name, engine in current_app.extensions['sqlalchemy'].engines.items():
+        pool = engine.pool
+        entry = {'pool': type(pool).__name__}
+        if isinstance(pool, QueuePool):
+            entry.update({
+                'size': pool.size(),
+                'checked_out': pool.checkedout(),
+                'overflow': pool.overflow()
+            })
+        if isinstance(pool, TimedQueuePool):
+            entry['checkout'] = pool.metrics.to_dict()
+        stats[name or 'primary'] = entry
+    return stats
+
+
+_local_locks: Dict[str, threading.Lock] = {}
+_local_locks_guard = threading.Lock()
+
+
+def _lock_id(name: str) -> int:
+    """Signed 64-bit key of a PostgreSQL advisory lock"""
+    return int.from_bytes(hashlib.sha1(name.encode()).digest()[:8], 'big', signed=True)
+
+
+@contextmanager
+def advisory_lock(name: str, timeout: Optional[float] = None) -> Iterator[None]:
+    """Hold a named lock for the duration of a block, raising LockTimeout when busy
+
+    On PostgreSQL this is a session advisory lock taken on a connection of
+    its own, so it is shared by every process using the database. Other
+    databases only get a lock shared by the threads of this process.
+    """
+    engine = current_app.extensions['sqlalchemy'].engine
+    deadline = None if timeout is None else time.monotonic() + timeout
+
+    if engine.dialect.name != 'postgresql':
+        with _local_locks_guard:
+            lock = _local_locks.setdefault(name, threading.Lock())
+        if not lock.acquire(timeout=-1 if timeout is None else timeout):
+            raise LockTimeout(f'Lock {name} is held elsewhere')
+        try:
+            yield
+        finally:
+            lock.release()
+        return
+
+    key = _lock_id(name)
+    with engine.connect() as connection:
+        while not connection.execute(text('SELECT pg_try_advisory_lock(:key)'), {'key': key}).scalar():
+            connection.commit()
+            if deadline is not None and time.monotonic() >= deadline:
+                raise LockTimeout(f'Lock {name} is held elsewhere')
+            time.sleep(LOCK_POLL_INTERVAL)
+        # The lock belongs to the session, don't stay idle in a transaction
+        connection.commit()
+        try:
+            yield
+        finally:
+            try:
+                connection.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': key})
+                connection.commit()
+            except sa_exc.DBAPIError:
+                # Closing the session is what releases the lock then
+                connection.invalidate()
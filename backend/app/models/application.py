@@ -10,43 +10,68 @@ class Application(db.Model):
     """Application model for managing Docker applications"""
     
     __tablename__ = 'applications'
+    __table_args__ = (
+        # Keyset pagination on (created_at, id), optionally within a filter
+        db.Index('ix_applications_created_at_id', 'created_at', 'id'),
+        db.Index('ix_applications_namespace_created_at_id', 'namespace', 'created_at', 'id'),
+        db.Index('ix_applications_status_created_at_id', 'status', 'created_at', 'id'),
+        # Name prefix searches (LIKE 'prefix%')
+        db.Index('ix_applications_name', 'name', postgresql_ops={'name': 'varchar_pattern_ops'}),
+    )
     
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     name = db.Column(db.String(255), nullable=False)
     namespace = db.Column(db.String(255), nullable=False, default='default')
     repository_url = db.Column(db.String(500))
     repository_branch = db.Column(db.String(255), default='main')
+    # Commit of the branch last deployed by the GitOps reconciler
+    repository_revision = db.Column(db.String(40))
     compose_file = db.Column(db.String(500))
     context = db.Column(db.String(500), default='.')
+    # Ports published by container deployments and how they replace the
+    # running container, see DockerService.deploy_container()
+    ports = db.Column(db.JSON)
+    deploy_strategy = db.Column(db.String(20), default='recreate')
     docker_host = db.Column(db.String(255), default='localhost')
+    # All target environments, docker_host mirrors the first one
+    environments = db.Column(db.JSON)
     status = db.Column(db.String(50), default='created')
+    # Hash of the last deployed compose configuration, and per Docker host
+    # the hashes it was deployed with, see compose_hashes()
+    config_hash = db.Column(db.String(64))
+    compose_hashes = db.Column(db.JSON)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     def __repr__(self):
         return f'<Application {self.name}>'
     
-    def to_dict(self):
-        """Convert model to dictionary"""
-        return {
-            'id': self.id,
-            'name': self.name,
-            'namespace': self.namespace,
-            'repository': {
-                'url': self.repository_url,
-                'branch': self.repository_branch
-            },
-            'docker': {
-                'composeFile': self.compose_file,
-                'context': self.context
-            },
-            'environments': [
-                {
-                    'name': 'development',
-                    'dockerHost': self.docker_host
-                }
-            ],
-            'status': self.status,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        } 
\ No newline at end of file
+    def get_environments(self):
+        """Target environments of the application"""
+        return self.environments or [{'name': 'development', 'dockerHost': self.docker_host}]
+    
+    # Top-level fields of to_dict(): columns they need and how they render
+    FIELDS = {
+        'id': (('id',), lambda app: app.id),
+        'name': (('name',), lambda app: app.name),
+        'namespace': (('namespace',), lambda app: app.namespace),
+        'repository': (('repository_url', 'repository_branch', 'repository_revision'), lambda app: {
+            'url': app.repository_url,
+            'branch': app.repository_branch,
+            'revision': app.repository_revision
+        }),
+        'docker': (('compose_file', 'context', 'ports', 'deploy_strategy'), lambda app: {
+            'composeFile': app.compose_file,
+            'context': app.context,
+            'ports': app.ports,
+            'strategy': app.deploy_strategy
+        }),
+        'environments': (('environments', 'docker_host'), lambda app: app.get_environments()),
+        'status': (('status',), lambda app: app.status),
+        'created_at': (('created_at',), lambda app: app.created_at.isoformat() if app.created_at else None),
+        'updated_at': (('updated_at',), lambda app: app.updated_at.isoformat() if app.updated_at else None)
+    }
+    
+    def to_dict(self, fields=None):
+        """Convert model to dictionary, optionally keeping only some top-level fields"""
+        return {field: self.FIELDS[field][1](self) for field in fields or self.FIELDS}
@@ -0,0 +1,47 @@
+"""
+Deployment Model for DockFlow POC
+"""
+
+from app import db
+from datetime import datetime
+import uuid
+
+class Deployment(db.Model):
+    """One deployment attempt of an application on a Docker host"""
+
+    __tablename__ = 'deployments'
+    __table_args__ = (
+        db.Index('ix_deployments_application_id_started_at', 'application_id', 'started_at'),
+    )
+
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    application_id = db.Column(db.String(36), db.ForeignKey('applications.id', ondelete='CASCADE'), nullable=False)
+    environment = db.Column(db.String(255), nullable=False)
+    docker_host = db.Column(db.String(255), nullable=False)
+    status = db.Column(db.String(50), nullable=False)
+    message = db.Column(db.Text)
+    output_digest = db.Column(db.String(64))
+    updated_services = db.Column(db.JSON)
+    started_at = db.Column(db.DateTime, nullable=False)
+    finished_at = db.Column(db.DateTime, nullable=False)
+    duration_ms = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<Deployment {self.id} {self.status}>'
+
+    def to_dict(self):
+        """Convert model to dictionary"""
+        return {
+            'id': self.id,
+            'application_id': self.application_id,
+            'environment': self.environment,
+            'dockerHost': self.docker_host,
+            'status': self.status,
+            'message': self.message,
+            'output_digest': self.output_digest,
+            'updated_services': self.updated_services,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'duration_ms': self.duration_ms
+        }
@@ -0,0 +1,40 @@
+"""
+Job Model for DockFlow POC
+"""
+
+from app import db
+from datetime import datetime
+
+class Job(db.Model):
+    """A queued deployment request, readable from every API process"""
+
+    __tablename__ = 'jobs'
+
+    # Same id as the DeploymentJob of the process running it
+    id = db.Column(db.String(36), primary_key=True)
+    application_id = db.Column(db.String(36), db.ForeignKey('applications.id', ondelete='CASCADE'), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    # Later requests merged into this job
+    coalesced = db.Column(db.Integer, nullable=False, default=0)
+    result = db.Column(db.JSON)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<Job {self.id} {self.status}>'
+
+    def to_dict(self):
+        """Convert model to dictionary, as DeploymentJob.to_dict()"""
+        return {
+            'id': self.id,
+            'application_id': self.application_id,
+            'status': self.status,
+            'result': self.result,
+            'error': self.error,
+            'coalesced_requests': self.coalesced,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
@@ -0,0 +1,382 @@
+"""
+Async Docker Service for DockFlow POC
+"""
+
+import asyncio
+import functools
+import json
+import logging
+import os
+import time
+import weakref
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urlparse
+
+from app.services.container_state import COMPOSE_PROJECT_LABEL, ContainerStateCache, container_keys
+from app.services.docker_api import (
+    IDEMPOTENT_METHODS, DockerAPIClient, DockerAPIError, DockerConnectionError, format_container
+)
+from app.services.docker_resilience import (
+    CircuitBreaker, DockerUnavailableError, RetryPolicy, daemon_error, transient_error
+)
+from app.services.docker_scheduler import DockerBusyError
+from app.services.docker_service import (
+    DOCKER_OPERATION_FAILURES, DOCKER_OPERATION_SECONDS, DockerService, _failed, get_docker_service,
+    resolve_docker_host
+)
+
+logger = logging.getLogger(__name__)
+
+# Largest response header line or chunk size line accepted from the daemon
+MAX_LINE = 1 << 20
+
+
+class AsyncDockerAPIClient:
+    """Engine API client on asyncio streams, keeping idle keep-alive connections
+
+    Requests hold no thread while waiting for the daemon, see
+    DockerAPIClient for the blocking equivalent.
+    """
+
+    def __init__(self, docker_host: str, pool_size: int = 64, timeout: float = 60,
+                 api_version: Optional[str] = None):
+        url = urlparse(docker_host)
+        if url.scheme == 'unix':
+            self.socket_path = url.path
+            self.address = None
+        elif url.scheme in ('tcp', 'http'):
+            self.socket_path = None
+            self.address = (url.hostname, url.port or 2375)
+        else:
+            raise ValueError(f'Unsupported DOCKER_HOST for the Engine API: {docker_host}')
+
+        self.docker_host = docker_host
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.api_version = api_version or os.getenv('DOCKER_API_VERSION', '1.41')
+        self._idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+
+    @classmethod
+    def from_docker_host(cls, docker_host: str) -> Optional['AsyncDockerAPIClient']:
+        """Build a client for DOCKER_HOST, or None if it cannot be used"""
+        url = urlparse(docker_host)
+        if url.scheme == 'unix' and not os.path.exists(url.path):
+            return None
+        if url.scheme not in ('unix', 'tcp', 'http'):
+            return None
+        return cls(docker_host, pool_size=int(os.getenv('ASYNC_DOCKER_POOL_SIZE', 64)))
+
+    async def _connect(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        try:
+            if self.socket_path:
+                return await asyncio.open_unix_connection(self.socket_path, limit=MAX_LINE)
+            return await asyncio.open_connection(*self.address, limit=MAX_LINE)
+        except OSError as e:
+            raise DockerConnectionError(f'Cannot connect to Docker daemon at {self.docker_host}: {e}') from e
+
+    def _release(self, connection: Tuple[asyncio.StreamReader, asyncio.StreamWriter]):
+        if len(self._idle) < self.pool_size:
+            self._idle.append(connection)
+        else:
+            connection[1].close()
+
+    @staticmethod
+    async def _read_response(reader: asyncio.StreamReader) -> Tuple[int, bytes, bool]:
+        """Status, body and whether the daemon keeps the connection open"""
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError('connection closed by the daemon')
+        status = int(status_line.split()[1])
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    await reader.readline()
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+            body = b''.join(chunks)
+        elif 'content-length' in headers:
+            body = await reader.readexactly(int(headers['content-length']))
+        elif status in (204, 304):
+            body = b''
+        else:
+            body = await reader.read()
+            return status, body, False
+        return status, body, headers.get('connection', '').lower() != 'close'
+
+    async def request(self, method: str, path: str, params: Optional[Dict[str, Any]] = None,
+                      body: Optional[Any] = None, raw: bool = False, timeout: Optional[float] = -1) -> Any:
+        """Send a request and return the decoded JSON body (or the raw bytes)
+
+        timeout defaults to the client timeout, None waits as long as the
+        daemon takes (e.g. for image pulls).
+        """
+        url = f'/v{self.api_version}{path}'
+        if params:
+            url += '?' + urlencode({k: v for k, v in params.items() if v is not None})
+        payload = json.dumps(body).encode() if body is not None else b''
+        head = f'{method} {url} HTTP/1.1\r\nHost: docker\r\nContent-Length: {len(payload)}\r\n'
+        if body is not None:
+            head += 'Content-Type: application/json\r\n'
+        message = (head + '\r\n').encode('latin-1') + payload
+        timeout = self.timeout if timeout == -1 else timeout
+
+        # An idle connection may have been closed by the daemon, so a failure
+        # on a reused connection is retried once on a fresh one. Once a
+        # request was written only idempotent ones are, see DockerAPIClient.
+        for attempt in range(2):
+            while attempt == 0 and self._idle and self._idle[-1][0].at_eof():
+                self._idle.pop()[1].close()
+            reused = attempt == 0 and bool(self._idle)
+            reader, writer = self._idle.pop() if reused else await self._connect()
+            sent = False
+            try:
+                writer.write(message)
+                await writer.drain()
+                sent = True
+                status, data, keep_alive = await asyncio.wait_for(self._read_response(reader), timeout)
+            except (ConnectionError, asyncio.IncompleteReadError) as e:
+                writer.close()
+                if reused and (not sent or method in IDEMPOTENT_METHODS):
+                    continue
+                raise DockerConnectionError(f'Lost connection to Docker daemon: {e}') from e
+            except asyncio.TimeoutError as e:
+                writer.close()
+                raise DockerConnectionError(f'Docker daemon at {self.docker_host} did not answer in {timeout:g}s') from e
+            except BaseException:
+                # Cancelled mid-response: the connection state is unknown
+                writer.close()
+                raise
+
+            if keep_alive:
+                self._release((reader, writer))
+            else:
+                writer.close()
+            return DockerAPIClient._decode(status, data, raw)
+
+        raise DockerConnectionError(f'Lost connection to Docker daemon at {self.docker_host}')
+
+    async def close(self):
+        """Close all idle connections"""
+        while self._idle:
+            _, writer = self._idle.pop()
+            writer.close()
+
+    async def list_containers(self, all: bool = True,
+                              filters: Optional[Dict[str, List[str]]] = None) -> List[Dict[str, Any]]:
+        """List containers"""
+        params = {'all': '1' if all else '0'}
+        if filters:
+            params['filters'] = json.dumps(filters)
+        return await self.request('GET', '/containers/json', params=params)
+
+
+def operation(method):
+    """Run an AsyncDockerService operation in a slot, retrying transient errors
+
+    The async counterpart of scheduled(), resilient() and instrumented()
+    on DockerService, sharing their circuit breaker and metrics.
+    """
+    name = method.__name__
+
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        policy = self.retry_policy
+        for attempt in range(1, policy.max_attempts + 1):
+            if attempt == 1:
+                self.circuit_breaker.before_call()
+            else:
+                await asyncio.sleep(delay)
+                try:
+                    self.circuit_breaker.before_call()
+                except DockerUnavailableError:
+                    break
+
+            started = time.perf_counter()
+            try:
+                async with self._slot():
+                    outcome, raised = await method(self, *args, **kwargs), False
+            except DockerBusyError:
+                self.circuit_breaker.record(None)
+                raise
+            except Exception as e:
+                outcome, raised = e, True
+            DOCKER_OPERATION_SECONDS.observe(time.perf_counter() - started, operation=name)
+            if raised or _failed(outcome):
+                DOCKER_OPERATION_FAILURES.inc(operation=name)
+
+            error = transient_error(outcome)
+            self.circuit_breaker.record(bool(error))
+            if not error or attempt == policy.max_attempts:
+                break
+            delay = policy.delay(attempt)
+            logger.warning('%s on %s failed (%s), attempt %d of %d, retrying in %.1fs',
+                           name, self.docker_host, error, attempt, policy.max_attempts, delay)
+
+        if raised:
+            raise outcome
+        return outcome
+    return wrapper
+
+
+class AsyncDockerService:
+    """Docker status operations for asyncio callers
+
+    Operations wait on non-blocking sockets (or a `docker` subprocess when
+    the API is not usable) instead of holding a thread each, so one event
+    loop can keep thousands in flight. At most max_concurrency of them run
+    against the daemon at a time, and callers beyond max_queued waiting are
+    turned away with DockerBusyError.
+    """
+
+    def __init__(self, docker_host: Optional[str] = None,
+                 circuit_breaker: Optional[CircuitBreaker] = None,
+                 container_state: Optional[ContainerStateCache] = None,
+                 max_concurrency: int = 256, max_queued: int = 1024):
+        self.docker_host = resolve_docker_host(docker_host)
+        self.env = {**os.environ, 'DOCKER_HOST': self.docker_host}
+        self.api = None
+        if os.getenv('DOCKER_BACKEND', 'auto') != 'cli':
+            self.api = AsyncDockerAPIClient.from_docker_host(self.docker_host)
+        self.container_state = container_state
+        self.retry_policy = RetryPolicy.from_env()
+        self.circuit_breaker = circuit_breaker or CircuitBreaker.from_env(self.docker_host)
+        self.max_queued = max_queued
+        self._semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        self._waiting = 0
+
+    @classmethod
+    def for_docker_service(cls, docker_service: DockerService) -> 'AsyncDockerService':
+        """Async service of a host sharing the circuit and container cache of its DockerService"""
+        return cls(
+            docker_service.docker_host,
+            circuit_breaker=docker_service.circuit_breaker,
+            container_state=docker_service.container_state,
+            max_concurrency=int(os.getenv('ASYNC_DOCKER_MAX_CONCURRENCY', 256)),
+            max_queued=int(os.getenv('ASYNC_DOCKER_MAX_QUEUED', 1024))
+        )
+
+    @asynccontextmanager
+    async def _slot(self) -> AsyncIterator[None]:
+        if self._semaphore.locked() and self._waiting >= self.max_queued:
+            raise DockerBusyError(f'Docker host {self.docker_host} is busy: {self._waiting} operations are waiting', 1)
+        self._waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+        try:
+            yield
+        finally:
+            self._semaphore.release()
+
+    async def _docker(self, *args: str) -> Tuple[int, str, str]:
+        """Run the docker CLI without blocking, returning its status, stdout and stderr"""
+        process = await asyncio.create_subprocess_exec(
+            'docker', *args, env=self.env,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+        stdout, stderr = await process.communicate()
+        return process.returncode, stdout.decode(errors='replace'), stderr.decode(errors='replace')
+
+    async def get_container_status(self, app_name: str) -> List[Dict[str, Any]]:
+        """Get container status for an application"""
+        if self.container_state:
+            containers = self.container_state.get(app_name)
+            if containers is not None:
+                return containers
+        return await self._query_container_status(app_name)
+
+    @operation
+    async def _query_container_status(self, app_name: str) -> List[Dict[str, Any]]:
+        if self.api:
+            try:
+                containers = await self.api.list_containers(all=True, filters={'name': [app_name]})
+                return [format_container(container) for container in containers]
+            except DockerConnectionError as e:
+                logger.warning('Docker API unavailable, falling back to CLI: %s', e)
+            except DockerAPIError as e:
+                return [{'error': f'Failed to get container status: {e}', 'transient': bool(transient_error(e))}]
+
+        try:
+            returncode, stdout, stderr = await self._docker('ps', '-a', '--filter', f'name={app_name}', '--format', 'json')
+        except Exception as e:
+            return [{
+                'error': f'Unexpected error getting container status: {str(e)}',
+                'transient': bool(transient_error(e))
+            }]
+        if returncode != 0:
+            return [{
+                'error': f'Failed to get container status: {stderr}',
+                'transient': daemon_error(returncode, stderr)
+            }]
+        return [DockerService._format_cli_container(json.loads(line)) for line in stdout.splitlines() if line]
+
+    async def list_containers_by_app(self) -> Dict[str, List[Dict[str, Any]]]:
+        """List all containers once, grouped by container name and compose project"""
+        if self.container_state:
+            grouped = self.container_state.snapshot()
+            if grouped is not None:
+                return grouped
+        return await self._query_containers_by_app()
+
+    @operation
+    async def _query_containers_by_app(self) -> Dict[str, List[Dict[str, Any]]]:
+        grouped: Dict[str, List[Dict[str, Any]]] = {}
+        if self.api:
+            try:
+                for container in await self.api.list_containers(all=True):
+                    formatted = format_container(container)
+                    for key in container_keys(container):
+                        grouped.setdefault(key, []).append(formatted)
+                return grouped
+            except DockerConnectionError as e:
+                logger.warning('Docker API unavailable, falling back to CLI: %s', e)
+
+        returncode, stdout, stderr = await self._docker('ps', '-a', '--format', 'json')
+        if returncode != 0:
+            error = DockerConnectionError if daemon_error(returncode, stderr) else DockerAPIError
+            raise error(f'docker ps failed: {stderr}')
+        for line in stdout.splitlines():
+            if line:
+                container_info = json.loads(line)
+                labels = dict(
+                    label.split('=', 1) for label in container_info.get('Labels', '').split(',') if '=' in label
+                )
+                keys = set(container_info.get('Names', '').split(','))
+                if labels.get(COMPOSE_PROJECT_LABEL):
+                    keys.add(labels[COMPOSE_PROJECT_LABEL])
+                formatted = DockerService._format_cli_container(container_info)
+                for key in keys:
+                    grouped.setdefault(key, []).append(formatted)
+        return grouped
+
+    async def close(self):
+        if self.api:
+            await self.api.close()
+
+
+# Async services are bound to the event loop they were created in
+_services: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, AsyncDockerService]]' = \
+    weakref.WeakKeyDictionary()
+
+
+def get_async_docker_service(docker_host: Optional[str] = None) -> AsyncDockerService:
+    """Get the shared AsyncDockerService of a Docker host for the running event loop"""
+    services = _services.setdefault(asyncio.get_running_loop(), {})
+    docker_host = resolve_docker_host(docker_host)
+    if docker_host not in services:
+        services[docker_host] = AsyncDockerService.for_docker_service(get_docker_service(docker_host))
+    return services[docker_host]
@@ -0,0 +1,201 @@
+"""
+Bulk Import for DockFlow POC
+"""
+
+import io
+import json
+import logging
+import os
+import uuid
+from datetime import datetime
+from typing import Any, Dict, IO, Iterable, Iterator, List, Tuple, Union
+
+import yaml
+from sqlalchemy import insert, or_, tuple_, update
+from sqlalchemy.exc import SQLAlchemyError
+
+from app import db
+from app.models.application import Application
+from app.services.compose_service import ComposeError, load_project
+from app.services.docker_service import STRATEGIES, normalize_ports
+
+logger = logging.getLogger(__name__)
+
+# Rows written per INSERT/UPDATE statement and transaction
+BULK_BATCH_SIZE = int(os.getenv('BULK_BATCH_SIZE', 500))
+
+
+class InvalidApplication(ValueError):
+    """Raised for an application representation that cannot be stored"""
+
+
+def application_values(data: Any) -> Dict[str, Any]:
+    """Column values of an application from its API representation"""
+    if not isinstance(data, dict) or not data.get('name'):
+        raise InvalidApplication('Application name is required')
+    if not isinstance(data['name'], str) or not isinstance(data.get('namespace', ''), str):
+        raise InvalidApplication('name and namespace must be strings')
+
+    repository = data.get('repository') or {}
+    docker = data.get('docker') or {}
+    if not isinstance(repository, dict) or not isinstance(docker, dict):
+        raise InvalidApplication('repository and docker must be objects')
+    environments = data.get('environments') or [{}]
+    if not isinstance(environments, list) or not all(isinstance(env, dict) for env in environments):
+        raise InvalidApplication('environments must be a list of objects')
+
+    strategy = docker.get('strategy', 'recreate')
+    if strategy not in STRATEGIES:
+        raise InvalidApplication(f'strategy must be one of {", ".join(STRATEGIES)}')
+    try:
+        ports = normalize_ports(docker['ports']) if docker.get('ports') is not None else None
+    except ValueError as e:
+        raise InvalidApplication(str(e))
+    if strategy == 'blue_green' and ports and any(ports.values()):
+        raise InvalidApplication('blue_green deployments cannot publish fixed host ports')
+
+    # Compose files of a repository only exist once it is checked out, local
+    # ones are validated right away
+    compose_file = docker.get('composeFile')
+    if compose_file and not repository.get('url') and os.path.isfile(compose_file):
+        try:
+            load_project(compose_file)
+        except ComposeError as e:
+            raise InvalidApplication(str(e))
+
+    environments = [
+        {
+            'name': env.get('name', 'development'),
+            'dockerHost': env.get('dockerHost', 'localhost')
+        }
+        for env in environments
+    ]
+    return {
+        'name': data['name'],
+        'namespace': data.get('namespace', 'default'),
+        'repository_url': repository.get('url'),
+        'repository_branch': repository.get('branch', 'main'),
+        'compose_file': compose_file,
+        'context': docker.get('context', '.'),
+        'ports': ports,
+        'deploy_strategy': strategy,
+        'docker_host': environments[0]['dockerHost'],
+        'environments': environments
+    }
+
+
+Row = Tuple[int, Union[Any, Exception]]
+
+
+def ndjson_rows(stream: IO[bytes]) -> Iterator[Row]:
+    """Parse one JSON document per line as the body is read"""
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError as e:
+            yield number, InvalidApplication(f'Invalid JSON: {e}')
+
+
+def yaml_rows(stream: IO[bytes]) -> Iterator[Row]:
+    """Parse the documents of a multi-document YAML body as it is read"""
+    number = 0
+    try:
+        for number, document in enumerate(yaml.safe_load_all(io.TextIOWrapper(stream, encoding='utf-8')), 1):
+            if document is not None:
+                yield number, document
+    except yaml.YAMLError as e:
+        # The parser cannot resynchronize, the rest of the body is lost
+        yield number + 1, InvalidApplication(f'Invalid YAML: {e}')
+
+
+def import_applications(rows: Iterable[Row], upsert: bool = False,
+                        batch_size: int = BULK_BATCH_SIZE) -> Iterator[List[Dict[str, Any]]]:
+    """Validate rows one by one and store them in batches, with one result per row
+
+    Results come in lists: the result of an invalid row on its own as soon
+    as it is read, those of valid rows once their batch is written.
+    Without upsert every valid row creates an application. With upsert a
+    row updates the application with its `id`, or else the first one with
+    the same namespace and name, and creates it when there is none.
+    """
+    batch: List[Tuple[int, Dict[str, Any]]] = []
+    for number, data in rows:
+        try:
+            if isinstance(data, Exception):
+                raise data
+            values = application_values(data)
+            if data.get('id'):
+                values['id'] = str(data['id'])
+        except InvalidApplication as e:
+            yield [{'row': number, 'status': 'error', 'error': str(e)}]
+            continue
+
+        batch.append((number, values))
+        if len(batch) >= batch_size:
+            yield _write_batch(batch, upsert)
+            batch = []
+    if batch:
+        yield _write_batch(batch, upsert)
+
+
+def _existing_ids(batch: List[Tuple[int, Dict[str, Any]]], upsert: bool) -> Tuple[set, Dict[tuple, str]]:
+    """Ids of the batch already stored, and (namespace, name) of matching applications"""
+    ids = [values['id'] for _, values in batch if 'id' in values]
+    keys = [(values['namespace'], values['name']) for _, values in batch if 'id' not in values] if upsert else []
+    if not ids and not keys:
+        return set(), {}
+
+    conditions = []
+    if ids:
+        conditions.append(Application.id.in_(ids))
+    if keys:
+        conditions.append(tuple_(Application.namespace, Application.name).in_(keys))
+    rows = db.session.query(Application.id, Application.namespace, Application.name) \
+        .filter(or_(*conditions)).order_by(Application.created_at, Application.id)
+
+    by_id, by_key = set(), {}
+    for app_id, namespace, name in rows:
+        by_id.add(app_id)
+        by_key.setdefault((namespace, name), app_id)
+    return by_id, by_key
+
+
+def _write_batch(batch: List[Tuple[int, Dict[str, Any]]], upsert: bool) -> List[Dict[str, Any]]:
+    """Insert and update one batch with a multi-row statement each, in one transaction"""
+    now = datetime.utcnow()
+    results, inserts, updates = [], [], []
+    try:
+        by_id, by_key = _existing_ids(batch, upsert)
+        for number, values in batch:
+            app_id = values.get('id')
+            key = (values['namespace'], values['name'])
+            if upsert and (app_id in by_id or (app_id is None and key in by_key)):
+                app_id = app_id or by_key[key]
+                updates.append({**values, 'id': app_id, 'updated_at': now})
+                results.append({'row': number, 'status': 'updated', 'id': app_id})
+                continue
+            if app_id in by_id:
+                results.append({'row': number, 'status': 'error', 'id': app_id,
+                                'error': f'Application {app_id} already exists'})
+                continue
+
+            app_id = app_id or str(uuid.uuid4())
+            inserts.append({**values, 'id': app_id, 'status': 'created', 'created_at': now, 'updated_at': now})
+            # Later rows of the batch for the same application update this one
+            by_id.add(app_id)
+            by_key.setdefault(key, app_id)
+            results.append({'row': number, 'status': 'created', 'id': app_id})
+
+        if inserts:
+            db.session.execute(insert(Application), inserts)
+        if updates:
+            db.session.execute(update(Application), updates)
+        db.session.commit()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        logger.exception('Failed to import %d applications', len(batch))
+        return [{'row': number, 'status': 'error', 'error': f'Database error: {e.__class__.__name__}'}
+                for number, _ in batch]
+    return results
@@ -0,0 +1,361 @@
+"""
+Compose Service for DockFlow POC
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import yaml
+
+
+class ComposeError(Exception):
+    """Raised when a compose file cannot be used"""
+
+
+# Top-level sections of the compose specification
+TOP_LEVEL_KEYS = {'version', 'name', 'services', 'networks', 'volumes', 'configs', 'secrets', 'include'}
+
+# Variable names of $VAR references, and ${VAR...} with their modifiers
+_BARE = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+_BRACED = re.compile(r'^([A-Za-z_][A-Za-z0-9_]*)(?:(:?[-?+])(.*))?$', re.S)
+
+
+def read_env_file(path: str) -> Dict[str, str]:
+    """Variables of a .env file, an empty dict if there is none"""
+    variables = {}
+    try:
+        with open(path) as f:
+            lines = f.read().splitlines()
+    except FileNotFoundError:
+        return variables
+    except OSError as e:
+        raise ComposeError(f'Cannot read {path}: {e}') from e
+
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#') or '=' not in line:
+            continue
+        key, value = line.split('=', 1)
+        value = value.strip()
+        if len(value) >= 2 and value[0] == value[-1] and value[0] in '\'"':
+            value = value[1:-1]
+        variables[key.strip().removeprefix('export ').strip()] = value
+    return variables
+
+
+def interpolate(value: Any, variables: Dict[str, str]) -> Any:
+    """Substitute variables in every string of a parsed compose file, like `docker compose config`"""
+    if isinstance(value, dict):
+        return {key: interpolate(item, variables) for key, item in value.items()}
+    if isinstance(value, list):
+        return [interpolate(item, variables) for item in value]
+    if not isinstance(value, str):
+        return value
+
+    def substitute(braced):
+        parsed = _BRACED.match(braced)
+        if not parsed:
+            raise ComposeError(f'Invalid interpolation format ${{{braced}}}')
+        name, operator, argument = parsed.groups()
+        current = variables.get(name)
+        is_set = current is not None and (current != '' or not operator or not operator.startswith(':'))
+        if operator in ('-', ':-'):
+            return current if is_set else interpolate(argument, variables)
+        if operator in ('?', ':?'):
+            if not is_set:
+                raise ComposeError(f'Required variable {name} is missing: {argument}')
+            return current
+        if operator in ('+', ':+'):
+            return interpolate(argument, variables) if is_set else ''
+        return current or ''
+
+    result = []
+    position = 0
+    while True:
+        start = value.find('$', position)
+        if start < 0:
+            return ''.join(result) + value[position:]
+        result.append(value[position:start])
+        following = value[start + 1:start + 2]
+        if following == '$':
+            result.append('$')
+            position = start + 2
+        elif following == '{':
+            # Defaults may reference other variables, match nested braces
+            depth, end = 1, start + 2
+            while end < len(value) and depth:
+                depth += {'{': 1, '}': -1}.get(value[end], 0)
+                end += 1
+            if depth:
+                raise ComposeError(f'Invalid interpolation format {value[start:]}')
+            result.append(substitute(value[start + 2:end - 1]))
+            position = end
+        else:
+            bare = _BARE.match(value, start + 1)
+            result.append(variables.get(bare.group(), '') if bare else '$')
+            position = bare.end() if bare else start + 1
+
+
+def _parse_port(port: Any) -> Dict[str, Optional[str]]:
+    """Normalize one entry of a service `ports` list, short or long syntax"""
+    if isinstance(port, dict):
+        if 'target' not in port:
+            raise ComposeError(f'Port {port} has no target')
+        return {
+            'target': str(port['target']),
+            'published': None if port.get('published') is None else str(port['published']),
+            'protocol': port.get('protocol', 'tcp'),
+            'host_ip': port.get('host_ip')
+        }
+    if not isinstance(port, (str, int)):
+        raise ComposeError(f'Invalid port {port!r}')
+
+    spec, _, protocol = str(port).partition('/')
+    parts = spec.rsplit(':', 2) if spec.count(':') <= 2 else None
+    if not parts or not all(part.replace('-', '').isdigit() for part in parts[-2:] if part):
+        raise ComposeError(f'Invalid port {port!r}')
+    host_ip = parts[0] if len(parts) == 3 else None
+    published = parts[-2] if len(parts) >= 2 and parts[-2] else None
+    if not parts[-1]:
+        raise ComposeError(f'Invalid port {port!r}')
+    return {'target': parts[-1], 'published': published, 'protocol': protocol or 'tcp', 'host_ip': host_ip}
+
+
+def _parse_environment(environment: Any, service: str) -> Dict[str, Optional[str]]:
+    """Normalize a service `environment`, list or mapping syntax"""
+    if environment is None:
+        return {}
+    if isinstance(environment, dict):
+        return {str(key): None if value is None else str(value) for key, value in environment.items()}
+    if isinstance(environment, list):
+        variables = {}
+        for entry in environment:
+            key, sep, value = str(entry).partition('=')
+            variables[key] = value if sep else None
+        return variables
+    raise ComposeError(f'environment of service {service} must be a list or a mapping')
+
+
+class ComposeProject:
+    """Validated compose file with the services, images, ports and environment it declares"""
+
+    def __init__(self, compose: Dict[str, Any], digest: str):
+        self.compose = compose
+        self.digest = digest
+        self.services: Dict[str, Dict[str, Any]] = {}
+        for name, service in compose['services'].items():
+            if not isinstance(service, dict):
+                raise ComposeError(f'Service {name} must be a mapping')
+            if not service.get('image') and not service.get('build'):
+                raise ComposeError(f'Service {name} has neither an image nor a build')
+            ports = service.get('ports') or []
+            if not isinstance(ports, list):
+                raise ComposeError(f'ports of service {name} must be a list')
+            depends_on = service.get('depends_on') or []
+            unknown = [dependency for dependency in depends_on if dependency not in compose['services']]
+            if unknown:
+                raise ComposeError(f'Service {name} depends on undefined services {", ".join(map(str, unknown))}')
+
+            self.services[name] = {
+                # Services built locally have no image to pull or hash
+                'image': None if service.get('build') else service['image'],
+                'build': service.get('build') is not None,
+                'ports': [_parse_port(port) for port in ports],
+                'environment': _parse_environment(service.get('environment'), name)
+            }
+
+    def images(self) -> List[str]:
+        """Images to pull for the services, without the ones built locally"""
+        return sorted({service['image'] for service in self.services.values() if service['image']})
+
+    def summary(self) -> Dict[str, Any]:
+        """Services with their image and ports, without environment values"""
+        return {
+            name: {'image': service['image'], 'build': service['build'], 'ports': service['ports']}
+            for name, service in self.services.items()
+        }
+
+
+def parse_compose(content: bytes, variables: Dict[str, str], digest: str = '') -> ComposeProject:
+    """Parse, interpolate and validate the content of a compose file"""
+    try:
+        compose = yaml.safe_load(content)
+    except yaml.YAMLError as e:
+        raise ComposeError(f'Invalid YAML: {e}') from e
+
+    if not isinstance(compose, dict) or not isinstance(compose.get('services'), dict) or not compose['services']:
+        raise ComposeError('No services are defined')
+    unknown = [key for key in compose if key not in TOP_LEVEL_KEYS and not str(key).startswith('x-')]
+    if unknown:
+        raise ComposeError(f'Unknown top-level sections {", ".join(map(str, unknown))}')
+    return ComposeProject(interpolate(compose, variables), digest)
+
+
+class ComposeCache:
+    """Parsed compose files, keyed by path and file stats, and by content
+
+    A file whose modification time and size did not change is not read
+    again. A changed one is read and hashed, and is only parsed if no file
+    with the same content (e.g. the same revision in another checkout) is
+    in the cache. Parse failures are cached the same way. Variables are
+    read from the .env file next to the compose file and the environment
+    of the process, which is assumed not to change.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # path -> (stats of the file and its .env, content digest)
+        self._paths: 'OrderedDict[str, Tuple[tuple, str]]' = OrderedDict()
+        # content digest -> project, or the error parsing it raised
+        self._contents: 'OrderedDict[str, Any]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls) -> 'ComposeCache':
+        return cls(max_entries=int(os.getenv('COMPOSE_CACHE_SIZE', 256)))
+
+    @staticmethod
+    def _stats(path: str, env_path: str) -> tuple:
+        stats = []
+        for file in (path, env_path):
+            try:
+                stat = os.stat(file)
+                stats.append((stat.st_mtime_ns, stat.st_size, stat.st_ino))
+            except FileNotFoundError:
+                if file == path:
+                    raise ComposeError(f'Compose file {path} does not exist')
+                stats.append(None)
+            except OSError as e:
+                raise ComposeError(f'Cannot read compose file {path}: {e}') from e
+        return tuple(stats)
+
+    def load(self, path: str) -> ComposeProject:
+        """Parsed compose file at a path, raising ComposeError if it is not usable"""
+        path = os.path.abspath(path)
+        env_path = os.path.join(os.path.dirname(path), '.env')
+        stats = self._stats(path, env_path)
+
+        with self._lock:
+            entry = self._paths.get(path)
+            if entry and entry[0] == stats and entry[1] in self._contents:
+                self.hits += 1
+                self._paths.move_to_end(path)
+                self._contents.move_to_end(entry[1])
+                return self._result(path, self._contents[entry[1]])
+
+        try:
+            with open(path, 'rb') as f:
+                content = f.read()
+        except OSError as e:
+            raise ComposeError(f'Cannot read compose file {path}: {e}') from e
+        env_file = read_env_file(env_path)
+        digest = hashlib.sha256(content + b'\0' + json.dumps(env_file, sort_keys=True).encode()).hexdigest()
+
+        with self._lock:
+            result = self._contents.get(digest)
+        if result is None:
+            try:
+                result = parse_compose(content, {**env_file, **os.environ}, digest)
+            except ComposeError as e:
+                result = e
+
+        with self._lock:
+            self.misses += 1
+            self._paths[path] = (stats, digest)
+            self._paths.move_to_end(path)
+            self._contents[digest] = result
+            self._contents.move_to_end(digest)
+            while len(self._paths) > self.max_entries:
+                self._paths.popitem(last=False)
+            while len(self._contents) > self.max_entries:
+                self._contents.popitem(last=False)
+        return self._result(path, result)
+
+    @staticmethod
+    def _result(path: str, result: Any) -> ComposeProject:
+        if isinstance(result, ComposeError):
+            raise ComposeError(f'Invalid compose file {path}: {result}')
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._paths.clear()
+            self._contents.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'paths': len(self._paths),
+                'contents': len(self._contents),
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+compose_cache = ComposeCache.from_env()
+
+
+def load_project(compose_file: str) -> ComposeProject:
+    """Parsed and validated compose file, through the shared cache"""
+    return compose_cache.load(compose_file)
+
+
+def load_compose(compose_file: str) -> Dict[str, Any]:
+    """Load a compose file, with its variables substituted
+
+    The result is shared with other callers and must not be modified.
+    """
+    return load_project(compose_file).compose
+
+
+def default_project_name(compose_file: str) -> str:
+    """Project name Docker Compose picks without -p: the file's `name`, else its directory name"""
+    try:
+        name = load_compose(compose_file).get('name')
+    except ComposeError:
+        name = None
+    name = name or os.path.basename(os.path.dirname(os.path.abspath(compose_file)))
+    return re.sub(r'[^a-z0-9_-]', '', str(name).lower()).lstrip('-_')
+
+
+def service_images(compose: Dict[str, Any]) -> Dict[str, Optional[str]]:
+    """Image referenced by each service, None for services built locally"""
+    return {
+        name: None if service.get('build') else service.get('image')
+        for name, service in compose['services'].items()
+    }
+
+
+def _digest(value: Any) -> str:
+    """Hash of a normalized (key-sorted) JSON rendering"""
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def compose_hashes(compose: Dict[str, Any], image_ids: Dict[str, Optional[str]]) -> Dict[str, Any]:
+    """Content hashes of a compose file and the images its services run
+
+    Services that build their image have no stable content hash and are
+    always reported as changed.
+    """
+    images = service_images(compose)
+    services = {}
+    for name, service in compose['services'].items():
+        image = images[name]
+        if image is None:
+            services[name] = None
+        else:
+            services[name] = _digest({'service': service, 'image_id': image_ids.get(image)})
+
+    shared = _digest({key: value for key, value in compose.items() if key not in ('services', 'version')})
+    return {
+        'config': _digest({'shared': shared, 'services': services}),
+        'shared': shared,
+        'services': services
+    }
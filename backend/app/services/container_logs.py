@@ -0,0 +1,217 @@
+"""
+Container Logs for DockFlow POC
+"""
+
+import logging
+import os
+import queue
+import re
+import subprocess
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.core.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Relative since values, e.g. 90s, 15m, 2h or 1d
+_DURATION = re.compile(r'^(\d+(?:\.\d+)?)([smhd])$')
+_DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+LOG_STREAMS = REGISTRY.gauge('dockflow_log_streams', 'Container log responses being streamed')
+
+
+def parse_tail(value: Optional[str]) -> str:
+    """Number of trailing lines to send, 'all' by default"""
+    if value in (None, '', 'all'):
+        return 'all'
+    if not value.isdigit():
+        raise ValueError('tail must be a number of lines or "all"')
+    return str(int(value))
+
+
+def parse_since(value: Optional[str], now: Optional[float] = None) -> Optional[str]:
+    """Unix timestamp of a since argument: a timestamp, an RFC 3339 date or a duration like 15m"""
+    if not value:
+        return None
+    match = _DURATION.match(value)
+    if match:
+        seconds = float(match.group(1)) * _DURATION_UNITS[match.group(2)]
+        return str(int((time.time() if now is None else now) - seconds))
+    try:
+        return str(int(float(value)))
+    except ValueError:
+        pass
+    try:
+        date = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError('since must be a Unix timestamp, an RFC 3339 date or a duration like 15m') from None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return str(int(date.timestamp()))
+
+
+class CommandLogStream:
+    """`docker logs` output in chunks of at most chunk_size bytes"""
+
+    def __init__(self, command: List[str], env: Dict[str, str], chunk_size: int = 16384):
+        self.process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, env=env)
+        self.chunk_size = chunk_size
+
+    def __iter__(self) -> Iterator[bytes]:
+        while True:
+            data = self.process.stdout.read1(self.chunk_size)
+            if not data:
+                return
+            yield data
+
+    def close(self):
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+        self.process.stdout.close()
+
+
+class _LinePrefixer:
+    """Prefixes each line of a container's output, holding back at most max_pending bytes of a partial line"""
+
+    def __init__(self, prefix: bytes, max_pending: int):
+        self.prefix = prefix
+        self.max_pending = max_pending
+        self._pending = b''
+
+    def feed(self, data: bytes) -> bytes:
+        self._pending += data
+        # Whole lines only, so lines of other containers are not cut in two;
+        # longer lines are split as the json-file log driver does
+        end = self._pending.rfind(b'\n') + 1
+        if not end:
+            if len(self._pending) < self.max_pending:
+                return b''
+            end = len(self._pending)
+        data, self._pending = self._pending[:end], self._pending[end:]
+        return self._prefixed(data)
+
+    def flush(self) -> bytes:
+        data, self._pending = self._pending, b''
+        return self._prefixed(data)
+
+    def _prefixed(self, data: bytes) -> bytes:
+        return b''.join(self.prefix + line.rstrip(b'\n') + b'\n' for line in data.splitlines(keepends=True))
+
+
+class ApplicationLogs:
+    """Log output of the containers of an application, read through a fixed-size buffer
+
+    The output of a single container is passed on chunk by chunk. Output of
+    several containers is merged line by line by one reader thread each,
+    every line prefixed with its container name as in `docker compose logs`;
+    readers pause while buffer_chunks chunks wait for a slow client.
+    """
+
+    def __init__(self, streams: List[Tuple[str, Any]], chunk_size: int = 16384, buffer_chunks: int = 16):
+        self.streams = streams
+        self.chunk_size = chunk_size
+        self._buffer: 'queue.Queue[Any]' = queue.Queue(maxsize=max(1, buffer_chunks))
+        self._closed = threading.Event()
+
+    def __iter__(self) -> Iterator[bytes]:
+        LOG_STREAMS.inc()
+        try:
+            if len(self.streams) == 1:
+                yield from self.streams[0][1]
+                return
+
+            width = max(len(name) for name, _ in self.streams)
+            for name, stream in self.streams:
+                prefix = f'{name:<{width}} | '.encode()
+                threading.Thread(target=self._read, args=(prefix, stream), daemon=True).start()
+
+            remaining = len(self.streams)
+            while remaining:
+                try:
+                    item = self._buffer.get(timeout=0.1)
+                except queue.Empty:
+                    # Readers stop without a word once closed
+                    if self._closed.is_set():
+                        return
+                    continue
+                if item is None:
+                    remaining -= 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield item
+        finally:
+            LOG_STREAMS.dec()
+            self.close()
+
+    def _put(self, item: Any):
+        while not self._closed.is_set():
+            try:
+                self._buffer.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def _read(self, prefix: bytes, stream: Any):
+        prefixer = _LinePrefixer(prefix, self.chunk_size)
+        try:
+            for data in stream:
+                data = prefixer.feed(data)
+                if data:
+                    self._put(data)
+            data = prefixer.flush()
+            if data:
+                self._put(data)
+        except Exception as e:
+            if not self._closed.is_set():
+                logger.warning('Log stream of %s failed: %s', prefix.decode().split(' ')[0], e)
+                self._put(e)
+        finally:
+            self._put(None)
+
+    def close(self):
+        """Stop reading and close the Docker streams"""
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        for _, stream in self.streams:
+            try:
+                stream.close()
+            except Exception as e:
+                logger.debug('Closing a log stream failed: %s', e)
+
+
+class LogStreamer:
+    """Opens the log streams of application containers"""
+
+    def __init__(self, chunk_size: int = 16384, buffer_chunks: int = 16):
+        self.chunk_size = chunk_size
+        self.buffer_chunks = buffer_chunks
+
+    @classmethod
+    def from_env(cls) -> 'LogStreamer':
+        return cls(
+            chunk_size=int(os.getenv('LOG_CHUNK_SIZE', 16384)),
+            buffer_chunks=int(os.getenv('LOG_BUFFER_CHUNKS', 16))
+        )
+
+    def open(self, docker_service, containers: List[Dict[str, Any]], follow: bool = False,
+             tail: str = 'all', since: Optional[str] = None, timestamps: bool = False) -> ApplicationLogs:
+        """Open a log stream per container, closing them all if one fails"""
+        streams = []
+        try:
+            for container in containers:
+                stream = docker_service.open_container_logs(
+                    container, follow=follow, tail=tail, since=since, timestamps=timestamps,
+                    chunk_size=self.chunk_size
+                )
+                streams.append((container['name'], stream))
+        except Exception:
+            for _, stream in streams:
+                stream.close()
+            raise
+        return ApplicationLogs(streams, self.chunk_size, self.buffer_chunks)
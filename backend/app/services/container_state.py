@@ -0,0 +1,185 @@
+"""
+Container State Cache for DockFlow POC
+"""
+
+import logging
+import os
+import re
+import socket
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set
+
+from app.services.docker_api import DockerAPIClient, DockerAPIError, format_container
+
+logger = logging.getLogger(__name__)
+
+COMPOSE_PROJECT_LABEL = 'com.docker.compose.project'
+COMPOSE_SERVICE_LABEL = 'com.docker.compose.service'
+
+
+def compose_project_name(app_name: str) -> str:
+    """Compose project name used for an application"""
+    name = re.sub(r'[^a-z0-9_-]', '-', app_name.lower()).lstrip('-_')
+    return name or 'dockflow'
+
+
+def container_keys(container: Dict[str, Any]) -> Set[str]:
+    """Application keys an Engine API container summary is indexed under"""
+    keys = {name.lstrip('/') for name in container.get('Names') or []}
+    project = (container.get('Labels') or {}).get(COMPOSE_PROJECT_LABEL)
+    if project:
+        keys.add(project)
+    return keys
+
+
+def containers_for_app(grouped: Dict[str, Any], app_name: str) -> List[Dict[str, Any]]:
+    """Pick the containers of an application out of a grouped listing"""
+    containers = {c['id']: c for c in grouped.get(app_name, ())}
+    containers.update((c['id'], c) for c in grouped.get(compose_project_name(app_name), ()))
+    return list(containers.values())
+
+
+class ContainerStateCache:
+    """In-memory container index kept current from the Docker events stream"""
+
+    def __init__(self, api: DockerAPIClient, max_staleness: float = 30.0, resync_interval: float = 60.0):
+        self.api = api
+        self.max_staleness = max_staleness
+        self.resync_interval = resync_interval
+        self._lock = threading.Lock()
+        self._containers: Dict[str, Dict[str, Any]] = {}
+        self._keys: Dict[str, Set[str]] = {}
+        self._by_app: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._connected = False
+        self._synced_at: Optional[float] = None
+        self._disconnected_at: Optional[float] = None
+
+    @classmethod
+    def from_env(cls, api: DockerAPIClient) -> 'ContainerStateCache':
+        """Build a cache configured from environment variables"""
+        return cls(
+            api,
+            max_staleness=float(os.getenv('CONTAINER_STATE_MAX_STALENESS', 30)),
+            resync_interval=float(os.getenv('CONTAINER_STATE_RESYNC_INTERVAL', 60))
+        )
+
+    def start(self):
+        """Start following the events stream in the background"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._follow, name='container-state', daemon=True)
+                self._thread.start()
+
+    def is_fresh(self) -> bool:
+        """Whether cached state may be served"""
+        with self._lock:
+            if self._synced_at is None:
+                return False
+            if self._connected:
+                return True
+            if self._disconnected_at is None:
+                return False
+            return time.monotonic() - self._disconnected_at <= self.max_staleness
+
+    def get(self, app_name: str) -> Optional[List[Dict[str, Any]]]:
+        """Get the containers of an application, or None when the cache is not usable"""
+        self.start()
+        if not self.is_fresh():
+            return None
+
+        with self._lock:
+            grouped = {
+                key: list(self._by_app.get(key, {}).values())
+                for key in (app_name, compose_project_name(app_name))
+            }
+        return containers_for_app(grouped, app_name)
+
+    def snapshot(self) -> Optional[Dict[str, List[Dict[str, Any]]]]:
+        """Get all cached containers grouped by application key"""
+        self.start()
+        if not self.is_fresh():
+            return None
+
+        with self._lock:
+            return {key: list(containers.values()) for key, containers in self._by_app.items()}
+
+    def _put(self, container: Dict[str, Any]):
+        container_id = container['Id']
+        self._drop(container_id)
+
+        keys = container_keys(container)
+        self._containers[container_id] = format_container(container)
+        self._keys[container_id] = keys
+        for key in keys:
+            self._by_app.setdefault(key, {})[container_id] = self._containers[container_id]
+
+    def _drop(self, container_id: str):
+        self._containers.pop(container_id, None)
+        for key in self._keys.pop(container_id, ()):
+            containers = self._by_app.get(key)
+            if containers is not None:
+                containers.pop(container_id, None)
+                if not containers:
+                    del self._by_app[key]
+
+    def resync(self):
+        """Rebuild the index from a full container listing, with the events stream connected"""
+        containers = self.api.list_containers(all=True)
+        with self._lock:
+            self._containers.clear()
+            self._keys.clear()
+            self._by_app.clear()
+            for container in containers:
+                self._put(container)
+            self._synced_at = time.monotonic()
+            self._connected = True
+
+    def _refresh(self, container_id: str, action: str):
+        """Update a single container after an event"""
+        containers = []
+        if action != 'destroy':
+            containers = self.api.list_containers(all=True, filters={'id': [container_id]})
+
+        with self._lock:
+            if containers:
+                self._put(containers[0])
+            else:
+                self._drop(container_id)
+
+    def _follow(self):
+        """Follow the events stream, resyncing on every (re)connect"""
+        backoff = 1.0
+        while True:
+            try:
+                # Subscribe before listing so no event between the two is lost
+                events = self.api.stream_events(
+                    filters={'type': ['container']},
+                    timeout=self.resync_interval
+                )
+                with events:
+                    self.resync()
+                    backoff = 1.0
+                    for event in events:
+                        action = event.get('Action', '')
+                        if not action.startswith('exec_'):
+                            self._refresh(event.get('id') or event['Actor']['ID'], action)
+                        if time.monotonic() - self._synced_at > self.resync_interval:
+                            break
+            except socket.timeout:
+                # No events for a whole resync interval, reconnect and resync
+                pass
+            except (DockerAPIError, OSError, ValueError) as e:
+                logger.warning('Docker events stream failed, retrying in %.0fs: %s', backoff, e)
+                self._mark_disconnected()
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+                continue
+            self._mark_disconnected()
+
+    def _mark_disconnected(self):
+        with self._lock:
+            if self._connected:
+                self._connected = False
+                self._disconnected_at = time.monotonic()
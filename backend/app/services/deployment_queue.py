@@ -0,0 +1,205 @@
+"""
+Deployment Queue for DockFlow POC
+"""
+
+import logging
+import os
+import queue
+import threading
+import uuid
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, Hashable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Raised when the deployment queue cannot accept more jobs"""
+
+
+class DeploymentJob:
+    """A single queued deployment"""
+
+    def __init__(self, app_id: str, func: Callable[..., Dict[str, Any]], args: tuple, kwargs: dict,
+                 coalesce_key: Optional[Hashable] = None, job_id: Optional[str] = None):
+        self.id = job_id or str(uuid.uuid4())
+        self.app_id = app_id
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.coalesce_key = coalesce_key
+        # Later submissions merged into this job
+        self.coalesced = 0
+        self.status = 'queued'
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.created_at = datetime.utcnow()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self._done_lock = threading.Lock()
+        self._callbacks: Optional[List[Callable[['DeploymentJob'], None]]] = []
+
+    def add_done_callback(self, fn: Callable[['DeploymentJob'], None]):
+        """Call fn with the job once it has finished, right away if it has"""
+        with self._done_lock:
+            if self._callbacks is not None:
+                self._callbacks.append(fn)
+                return
+        fn(self)
+
+    def _finish(self):
+        with self._done_lock:
+            self.finished_at = datetime.utcnow()
+            callbacks, self._callbacks = self._callbacks, None
+        for fn in callbacks:
+            try:
+                fn(self)
+            except Exception:
+                logger.exception('Callback of deployment job %s failed', self.id)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert job to dictionary"""
+        return {
+            'id': self.id,
+            'application_id': self.app_id,
+            'status': self.status,
+            'result': self.result,
+            'error': self.error,
+            'coalesced_requests': self.coalesced,
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+class DeploymentQueue:
+    """Bounded worker pool running deployment jobs, one at a time per application"""
+
+    def __init__(self, max_workers: int = 4, max_pending: int = 1000, max_history: int = 1000):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.max_history = max_history
+        self._lock = threading.Lock()
+        # Application ids with at least one runnable job; an id is only ever
+        # present once, which is what serializes jobs per application
+        self._ready: 'queue.Queue[str]' = queue.Queue()
+        self._pending: Dict[str, Deque[DeploymentJob]] = {}
+        self._pending_count = 0
+        self._jobs: 'OrderedDict[str, DeploymentJob]' = OrderedDict()
+        self._workers = []
+
+    @classmethod
+    def from_env(cls) -> 'DeploymentQueue':
+        """Build a queue sized from environment variables"""
+        return cls(
+            max_workers=int(os.getenv('DEPLOY_WORKERS', 4)),
+            max_pending=int(os.getenv('DEPLOY_QUEUE_SIZE', 1000))
+        )
+
+    def submit(self, app_id: str, func: Callable[..., Dict[str, Any]], *args,
+               coalesce_key: Optional[Hashable] = None, job_id: Optional[str] = None,
+               **kwargs) -> DeploymentJob:
+        """Queue a deployment job for an application
+
+        When the last job of the application has not started yet and was
+        submitted with the same coalesce_key, it is returned instead of
+        queueing another one: duplicate requests made while a deployment
+        runs result in a single follow-up deployment. job_id sets the id
+        of a new job.
+        """
+        job = DeploymentJob(app_id, func, args, kwargs, coalesce_key, job_id)
+
+        with self._lock:
+            jobs = self._pending.get(app_id)
+            if (
+                coalesce_key is not None
+                and jobs
+                and jobs[-1].status == 'queued'
+                and jobs[-1].coalesce_key == coalesce_key
+            ):
+                jobs[-1].coalesced += 1
+                return jobs[-1]
+
+            if self._pending_count >= self.max_pending:
+                raise QueueFullError(f'Deployment queue is full ({self.max_pending} pending jobs)')
+
+            self._start_workers()
+            self._remember(job)
+            self._pending_count += 1
+
+            if jobs is None:
+                # No job queued or running for this application yet
+                self._pending[app_id] = deque([job])
+                self._ready.put(app_id)
+            else:
+                jobs.append(job)
+
+        return job
+
+    def has_queued(self, app_id: str) -> bool:
+        """Whether a deployment of an application waits to start"""
+        with self._lock:
+            return any(job.status == 'queued' for job in self._pending.get(app_id, ()))
+
+    def get_job(self, job_id: str) -> Optional[DeploymentJob]:
+        """Get a job by ID"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self) -> Dict[str, int]:
+        """Get queue statistics"""
+        with self._lock:
+            running = sum(1 for job in self._jobs.values() if job.status == 'running')
+            return {
+                'workers': len(self._workers),
+                'pending': self._pending_count - running,
+                'running': running
+            }
+
+    def _remember(self, job: DeploymentJob):
+        """Track a job, dropping the oldest finished ones past max_history"""
+        self._jobs[job.id] = job
+        while len(self._jobs) > self.max_history:
+            oldest_id, oldest = next(iter(self._jobs.items()))
+            if oldest.status in ('queued', 'running'):
+                break
+            del self._jobs[oldest_id]
+
+    def _start_workers(self):
+        """Start worker threads lazily so forked server processes get their own"""
+        while len(self._workers) < self.max_workers:
+            worker = threading.Thread(
+                target=self._work,
+                name=f'deploy-worker-{len(self._workers)}',
+                daemon=True
+            )
+            worker.start()
+            self._workers.append(worker)
+
+    def _work(self):
+        """Worker loop"""
+        while True:
+            app_id = self._ready.get()
+            with self._lock:
+                job = self._pending[app_id][0]
+                job.status = 'running'
+                job.started_at = datetime.utcnow()
+
+            try:
+                job.result = job.func(*job.args, **job.kwargs)
+                job.status = 'succeeded' if job.result.get('success') else 'failed'
+            except Exception as e:
+                logger.exception('Deployment job %s failed', job.id)
+                job.error = str(e)
+                job.status = 'failed'
+            finally:
+                job._finish()
+                with self._lock:
+                    self._pending_count -= 1
+                    jobs = self._pending[app_id]
+                    jobs.popleft()
+                    if jobs:
+                        self._ready.put(app_id)
+                    else:
+                        del self._pending[app_id]
@@ -0,0 +1,117 @@
+"""
+Deployment Recorder for DockFlow POC
+"""
+
+import logging
+import os
+import threading
+from typing import Any, Dict, List
+
+from sqlalchemy import insert, update
+
+from app import db
+from app.models.application import Application
+from app.models.deployment import Deployment
+
+logger = logging.getLogger(__name__)
+
+
+class DeploymentRecorder:
+    """Buffers deployment records and writes them with batched statements
+
+    Deployment rows are inserted with one multi-row INSERT per flush and
+    the denormalized Application columns (status, compose hashes) are
+    updated with one executemany UPDATE, in a single transaction.
+    """
+
+    def __init__(self, flush_size: int = 100, flush_interval: float = 0.5, max_buffer: int = 10000):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._deployments: List[Dict[str, Any]] = []
+        self._applications: Dict[str, Dict[str, Any]] = {}
+        self._flask_app = None
+        self._thread = None
+
+    @classmethod
+    def from_env(cls) -> 'DeploymentRecorder':
+        """Build a recorder configured from environment variables"""
+        return cls(
+            flush_size=int(os.getenv('DEPLOYMENT_RECORD_BATCH', 100)),
+            flush_interval=float(os.getenv('DEPLOYMENT_RECORD_INTERVAL', 0.5))
+        )
+
+    def record(self, flask_app, deployments: List[Dict[str, Any]], application: Dict[str, Any]):
+        """Queue deployment rows and the new values of their application row"""
+        with self._lock:
+            self._flask_app = flask_app
+            self._deployments.extend(deployments)
+            # Only the latest values of an application need to be written
+            if set(application) != {'id'}:
+                self._applications.setdefault(application['id'], {}).update(application)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='deployment-recorder', daemon=True)
+                self._thread.start()
+            if len(self._deployments) >= self.flush_size:
+                self._wakeup.set()
+
+    def discard(self, app_id: str, *columns: str) -> Dict[str, Any]:
+        """Drop buffered values of an application and return them
+
+        A flush already writing them is waited for, so they cannot land
+        after the caller's own write.
+        """
+        with self._flush_lock, self._lock:
+            values = self._applications.get(app_id)
+            if not values:
+                return {}
+            dropped = {column: values.pop(column) for column in columns if column in values}
+            if set(values) == {'id'}:
+                del self._applications[app_id]
+            return dropped
+
+    def flush(self):
+        """Write everything buffered so far; needs an application context"""
+        with self._flush_lock:
+            with self._lock:
+                deployments, self._deployments = self._deployments, []
+                applications, self._applications = self._applications, {}
+            if not deployments and not applications:
+                return
+
+            try:
+                if deployments:
+                    db.session.execute(insert(Deployment), deployments)
+                if applications:
+                    db.session.execute(update(Application), list(applications.values()))
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                logger.exception('Failed to record %d deployments', len(deployments))
+                self._requeue(deployments, applications)
+                raise
+
+    def _requeue(self, deployments: List[Dict[str, Any]], applications: Dict[str, Dict[str, Any]]):
+        """Put back records of a failed flush, unless the buffer is already full"""
+        with self._lock:
+            if len(self._deployments) + len(deployments) > self.max_buffer:
+                logger.error('Deployment buffer full, dropping %d records', len(deployments))
+                return
+            self._deployments[:0] = deployments
+            for app_id, values in applications.items():
+                self._applications[app_id] = {**values, **self._applications.get(app_id, {})}
+
+    def _run(self):
+        """Flush periodically, or early when a batch is full"""
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                with self._flask_app.app_context():
+                    self.flush()
+            except Exception:
+                # Already logged, records are retried on the next flush
+                pass
@@ -0,0 +1,351 @@
+"""
+Deployment Service for DockFlow POC
+"""
+
+import hashlib
+import json
+import logging
+import os
+import uuid
+from concurrent.futures import Future
+from datetime import datetime
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional
+
+from flask import current_app
+from sqlalchemy.exc import SQLAlchemyError
+
+from app import db
+from app.core.database import LockTimeout, advisory_lock
+from app.core.metrics import REGISTRY
+from app.models.application import Application
+from app.models.job import Job
+from app.services.compose_service import ComposeError, compose_hashes, load_compose, service_images
+from app.services.docker_service import DockerService, get_docker_service
+from app.services.deployment_queue import DeploymentQueue, DeploymentJob, QueueFullError
+from app.services.deployment_recorder import DeploymentRecorder
+from app.services.event_bus import EventBus
+from app.services.image_prepuller import ImagePrePuller
+from app.services.rollout import rollout
+
+DEPLOY_HOSTS_IN_FLIGHT = REGISTRY.gauge(
+    'dockflow_deploy_hosts_in_flight', 'Docker hosts an application is being deployed to right now'
+)
+DEPLOYMENTS = REGISTRY.counter(
+    'dockflow_deployments_total', 'Finished application deployments', ['status']
+)
+DEPLOYMENTS_COALESCED = REGISTRY.counter(
+    'dockflow_deployments_coalesced_total', 'Deployment requests merged into an already queued deployment'
+)
+
+logger = logging.getLogger(__name__)
+
+# Image run by applications without a compose file
+DEFAULT_IMAGE = 'nginx:alpine'
+
+
+class DeploymentService:
+    """Service running application deployments in the background"""
+
+    def __init__(self, deployment_queue: DeploymentQueue, event_bus: EventBus, recorder: DeploymentRecorder,
+                 docker_services: Callable[[Optional[str]], DockerService] = get_docker_service,
+                 prepuller: Optional[ImagePrePuller] = None):
+        self.queue = deployment_queue
+        self.events = event_bus
+        self.recorder = recorder
+        self.docker_services = docker_services
+        self.prepuller = prepuller
+        self.parallelism = int(os.getenv('DEPLOY_HOST_PARALLELISM', 4))
+        # Seconds to wait for a deployment of the same application run by another process
+        self.lock_timeout = float(os.getenv('DEPLOY_LOCK_TIMEOUT', 600))
+
+    def enqueue(self, app: Application, force: bool = False, **rollout_options) -> DeploymentJob:
+        """Mark an application as deploying and queue its deployment
+
+        A request identical to one still waiting in the queue joins it, see
+        DeploymentQueue.submit(). The job is stored as a Job row too, so any
+        API process can report on it.
+        """
+        # A buffered result of an earlier deployment must not overwrite 'deploying'
+        superseded = self.recorder.discard(app.id, 'status')
+
+        # The row exists before a worker can start on the job
+        record = Job(id=str(uuid.uuid4()), application_id=app.id, status='queued')
+        db.session.add(record)
+        previous_status = superseded.get('status', app.status)
+        app.status = 'deploying'
+        db.session.commit()
+
+        try:
+            job = self.queue.submit(
+                app.id, self._run, current_app._get_current_object(), record.id, app.id, force, rollout_options,
+                coalesce_key=json.dumps([force, rollout_options], sort_keys=True), job_id=record.id
+            )
+        except QueueFullError:
+            db.session.delete(record)
+            app.status = previous_status
+            db.session.commit()
+            raise
+        if job.id != record.id:
+            DEPLOYMENTS_COALESCED.inc()
+            db.session.delete(record)
+            db.session.query(Job).filter_by(id=job.id).update({'coalesced': job.coalesced})
+            db.session.commit()
+
+        self._publish_status(app.id, app.status, job_id=job.id)
+        return job
+
+    def _publish_status(self, app_id: str, status: str, **extra):
+        """Notify subscribers of an application status change"""
+        self.events.publish(app_id, 'status', {'id': app_id, 'status': status, **extra})
+
+    def _run(self, flask_app, job_id: str, app_id: str, force: bool,
+             rollout_options: Dict[str, Any]) -> Dict[str, Any]:
+        """Run a deployment inside an application context, keeping its Job row current
+
+        The queue runs one deployment of an application at a time in this
+        process; the advisory lock does the same across API processes.
+        """
+        with flask_app.app_context():
+            self._update_job(job_id, status='running', started_at=datetime.utcnow())
+            try:
+                with advisory_lock(f'deploy:{app_id}', timeout=self.lock_timeout):
+                    result = self.deploy(app_id, force, **rollout_options)
+            except LockTimeout:
+                logger.warning('Deployment of %s still running elsewhere after %ss', app_id, self.lock_timeout)
+                result = {
+                    'success': False,
+                    'message': f'Another deployment of application {app_id} is still running'
+                }
+            except Exception as e:
+                self._update_job(job_id, status='failed', error=str(e), finished_at=datetime.utcnow())
+                raise
+            self._update_job(
+                job_id,
+                status='succeeded' if result.get('success') else 'failed',
+                result=json.loads(json.dumps(result, default=str)),
+                finished_at=datetime.utcnow()
+            )
+            return result
+
+    @staticmethod
+    def _update_job(job_id: str, **values):
+        """Write the progress of a job; a failed write leaves the deployment running"""
+        try:
+            db.session.query(Job).filter_by(id=job_id).update(values)
+            db.session.commit()
+        except SQLAlchemyError:
+            db.session.rollback()
+            logger.exception('Failed to record job %s', job_id)
+
+    def deploy(self, app_id: str, force: bool = False, environments: Optional[List[str]] = None,
+               parallelism: Optional[int] = None, batch_size: int = 0, canary: int = 1,
+               compose_file: Optional[str] = None, strategy: Optional[str] = None,
+               revision: Optional[str] = None) -> Dict[str, Any]:
+        """Deploy an application to its environments and record the attempt
+
+        With several target environments the hosts are rolled out
+        concurrently, see rollout(). Deployment rows and the resulting
+        application status are written in batches by the recorder.
+        `compose_file` overrides the application's one, e.g. with the
+        file of a repository checkout. Images are pulled on every target
+        host up front, so hosts of later rollout batches have them by the
+        time their turn comes. `strategy` overrides the application's way
+        of replacing its container, see DockerService.deploy_container().
+        `revision` is the repository commit being deployed, recorded as the
+        application's one only if the deployment succeeds.
+        """
+        app = db.session.get(Application, app_id)
+        if not app:
+            return {'success': False, 'message': f'Application {app_id} not found'}
+
+        application = {'id': app.id}
+        hosts = []
+        targets = [
+            env for env in app.get_environments()
+            if environments is None or env['name'] in environments
+        ]
+        if not targets:
+            result = {'success': False, 'message': f'No matching environments for {app.name}'}
+        else:
+            # Worker threads must not touch the ORM session, so they get plain values
+            compose_file = compose_file or app.compose_file
+            compose_file = compose_file if compose_file and os.path.exists(compose_file) else None
+            deployed_hashes = dict(app.compose_hashes or {})
+            container = {'ports': app.ports, 'strategy': strategy or app.deploy_strategy or 'recreate'}
+            pulls = self.prepull(compose_file, [target['dockerHost'] for target in targets])
+            deploy_target = partial(
+                self._deploy_target, app.id, app.name, compose_file, container, deployed_hashes, force, pulls
+            )
+
+            if len(targets) == 1:
+                result = deploy_target(targets[0])
+                hosts = [{**targets[0], **result}]
+            else:
+                result = rollout(
+                    targets,
+                    deploy_target,
+                    parallelism=parallelism or self.parallelism,
+                    batch_size=batch_size,
+                    canary=canary
+                )
+                hosts = result['hosts']
+
+            for host in hosts:
+                hashes = host.pop('compose_hashes', None)
+                if hashes:
+                    deployed_hashes[host['dockerHost']] = hashes
+                    application['config_hash'] = hashes['config']
+            application['compose_hashes'] = deployed_hashes
+
+        status = 'running' if result['success'] else 'failed'
+        if revision and result['success']:
+            application['repository_revision'] = revision
+        DEPLOYMENTS.inc(status=status)
+        # The application stays 'deploying' while a newer deployment waits
+        superseded = self.queue.has_queued(app.id)
+        if not superseded:
+            application['status'] = status
+        deployments = [self._deployment_row(app.id, host) for host in hosts if not host.get('skipped')]
+        self.recorder.record(current_app._get_current_object(), deployments, application)
+        if not superseded:
+            self._publish_status(app.id, status, message=result.get('message'))
+
+        summary = {
+            'success': result['success'],
+            'status': status,
+            'message': result.get('message', 'Deployment completed'),
+            'deployments': [deployment['id'] for deployment in deployments]
+        }
+        for key in ('updated_services', 'skipped_services', 'image_pulls', 'hosts'):
+            if key in result:
+                summary[key] = result[key]
+        return summary
+
+    @staticmethod
+    def _deployment_row(app_id: str, host: Dict[str, Any]) -> Dict[str, Any]:
+        """Deployments table row for the result of one host"""
+        started_at = host.pop('started_at')
+        finished_at = host.pop('finished_at')
+        output_digest = host.get('output_digest') or hashlib.sha256(
+            (host.get('message') or '').encode()
+        ).hexdigest()
+        return {
+            'id': str(uuid.uuid4()),
+            'application_id': app_id,
+            'environment': host['name'],
+            'docker_host': host['dockerHost'],
+            'status': 'succeeded' if host['success'] else 'failed',
+            'message': host.get('message'),
+            'output_digest': output_digest,
+            'updated_services': host.get('updated_services'),
+            'started_at': started_at,
+            'finished_at': finished_at,
+            'duration_ms': round((finished_at - started_at).total_seconds() * 1000)
+        }
+
+    def prepull(self, compose_file: Optional[str], docker_hosts: List[str]) -> Dict[str, Dict[str, Future]]:
+        """Start pulling the images of a deployment on its Docker hosts"""
+        if not self.prepuller:
+            return {}
+        if compose_file and os.path.exists(compose_file):
+            return self.prepuller.schedule_compose(compose_file, docker_hosts)
+        return {docker_host: self.prepuller.schedule(docker_host, [DEFAULT_IMAGE]) for docker_host in docker_hosts}
+
+    def _deploy_target(self, app_id: str, app_name: str, compose_file: Optional[str], container: Dict[str, Any],
+                       deployed_hashes: Dict[str, Any], force: bool, pulls: Dict[str, Dict[str, Future]],
+                       target: Dict[str, str]) -> Dict[str, Any]:
+        """Deploy an application to one environment"""
+        started_at = datetime.utcnow()
+        DEPLOY_HOSTS_IN_FLIGHT.inc()
+        try:
+            image_pulls = self.prepuller.wait(pulls[target['dockerHost']]) if target['dockerHost'] in pulls else None
+            result = self._deploy_to_host(app_id, app_name, compose_file, container, deployed_hashes, force, target)
+        finally:
+            DEPLOY_HOSTS_IN_FLIGHT.dec()
+        if image_pulls is not None:
+            result['image_pulls'] = image_pulls
+        return {**result, 'started_at': started_at, 'finished_at': datetime.utcnow()}
+
+    def _deploy_to_host(self, app_id: str, app_name: str, compose_file: Optional[str], container: Dict[str, Any],
+                        deployed_hashes: Dict[str, Any], force: bool, target: Dict[str, str]) -> Dict[str, Any]:
+        docker_service = self.docker_services(target['dockerHost'])
+        try:
+            # Deploy using Docker Compose if compose file exists
+            if compose_file:
+                return self._deploy_compose(
+                    docker_service, app_id, app_name, compose_file,
+                    deployed_hashes.get(target['dockerHost']), force
+                )
+            # Simple container deployment
+            return docker_service.deploy_container(app_name, DEFAULT_IMAGE, **container)
+        except Exception as e:
+            return {
+                'success': False,
+                'message': f'Unexpected error deploying {app_name}: {str(e)}',
+                'error': str(e)
+            }
+
+    def _compose_hashes(self, docker_service: DockerService, compose: Dict[str, Any]) -> Dict[str, Any]:
+        images = {image for image in service_images(compose).values() if image}
+        return compose_hashes(compose, {image: docker_service.get_image_id(image) for image in images})
+
+    @staticmethod
+    def _has_containers(docker_service: DockerService, app_name: str) -> bool:
+        """Whether the application has containers, False when their status cannot be read"""
+        containers = docker_service.get_container_status(app_name)
+        return bool(containers) and not any('error' in container for container in containers)
+
+    def _deploy_compose(self, docker_service: DockerService, app_id: str, app_name: str, compose_file: str,
+                        previous: Optional[Dict[str, Any]], force: bool) -> Dict[str, Any]:
+        """Bring up only the compose services whose configuration or image changed"""
+        try:
+            compose = load_compose(compose_file)
+        except ComposeError as e:
+            return {'success': False, 'message': f'Failed to deploy {app_name}: {e}', 'error': str(e)}
+
+        hashes = self._compose_hashes(docker_service, compose)
+        services = sorted(hashes['services'])
+        previous = previous or {}
+
+        # A full deployment is needed when there is nothing to compare with,
+        # when shared sections (networks, volumes...) or the set of services
+        # changed, or when the project containers are gone or unknown
+        full = (
+            force
+            or not previous
+            or previous.get('shared') != hashes['shared']
+            or set(previous.get('services', {})) != set(services)
+            or not self._has_containers(docker_service, app_name)
+        )
+        if full:
+            changed = services
+        else:
+            changed = [
+                name for name in services
+                if hashes['services'][name] is None or previous['services'].get(name) != hashes['services'][name]
+            ]
+
+        if not changed:
+            return {
+                'success': True,
+                'message': f'Application {app_name} is up to date',
+                'updated_services': [],
+                'skipped_services': services
+            }
+
+        result = docker_service.deploy_compose(
+            compose_file,
+            app_name,
+            on_output=lambda line: self.events.publish(
+                app_id, 'log', {'line': line, 'dockerHost': docker_service.docker_host}
+            ),
+            services=None if full else changed
+        )
+        if result['success']:
+            # Images may only have been pulled by this deployment
+            result['compose_hashes'] = self._compose_hashes(docker_service, compose)
+
+        result['updated_services'] = changed
+        result['skipped_services'] = [name for name in services if name not in changed]
+        return result
@@ -0,0 +1,425 @@
+"""
+Docker Engine API Client for DockFlow POC
+"""
+
+import http.client
+import json
+import os
+import queue
+import select
+import socket
+import struct
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlencode, urlparse, quote
+
+# Requests the daemon can receive twice without doing anything twice
+IDEMPOTENT_METHODS = ('GET', 'HEAD')
+
+
+class DockerAPIError(Exception):
+    """Error returned by the Docker Engine API"""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+class DockerConnectionError(DockerAPIError):
+    """Raised when the Docker daemon cannot be reached"""
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTP connection over a unix domain socket"""
+
+    def __init__(self, socket_path: str, timeout: Optional[float] = None):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        self.sock = sock
+
+
+class DockerEventStream:
+    """Iterator over a long-lived /events response"""
+
+    def __init__(self, conn: http.client.HTTPConnection, response: http.client.HTTPResponse):
+        self.conn = conn
+        self.response = response
+
+    def __iter__(self):
+        while True:
+            try:
+                line = self.response.readline()
+            except http.client.HTTPException as e:
+                raise DockerConnectionError(f'Docker events stream interrupted: {e}') from e
+            if not line:
+                return
+            if line.strip():
+                yield json.loads(line)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class DockerLogStream:
+    """Iterator over a /containers/{id}/logs response, in chunks of at most chunk_size bytes
+
+    Output of containers without a TTY comes in frames of an 8 byte header
+    (stream, padding, big-endian payload size) and the payload; frames are
+    read piecewise so a large one is never held in memory whole.
+    """
+
+    def __init__(self, conn: http.client.HTTPConnection, response: http.client.HTTPResponse,
+                 sock: Optional[socket.socket], multiplexed: bool, chunk_size: int = 16384):
+        self.conn = conn
+        self.response = response
+        self.sock = sock
+        self.multiplexed = multiplexed
+        self.chunk_size = chunk_size
+        self._closed = False
+
+    def _read(self, size: int, partial: bool = False) -> bytes:
+        try:
+            return self.response.read1(size) if partial else self.response.read(size)
+        except Exception as e:
+            # Reads cut short by close() from another thread fail in many ways
+            if self._closed:
+                return b''
+            if isinstance(e, (http.client.HTTPException, OSError)):
+                raise DockerConnectionError(f'Docker logs stream interrupted: {e}') from e
+            raise
+
+    def __iter__(self):
+        if not self.multiplexed:
+            while True:
+                data = self._read(self.chunk_size, partial=True)
+                if not data:
+                    return
+                yield data
+
+        while True:
+            header = self._read(8)
+            if len(header) < 8:
+                return
+            remaining = struct.unpack('>I', header[4:])[0]
+            while remaining:
+                data = self._read(min(remaining, self.chunk_size))
+                if not data:
+                    return
+                remaining -= len(data)
+                yield data
+
+    def close(self):
+        """Close the stream, also waking up a thread waiting for followed output"""
+        self._closed = True
+        if self.sock:
+            try:
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self.response.close()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class DockerAPIClient:
+    """Minimal Docker Engine API client keeping a pool of keep-alive connections"""
+
+    def __init__(self, docker_host: str, pool_size: int = 8, timeout: float = 60,
+                 api_version: Optional[str] = None):
+        url = urlparse(docker_host)
+        if url.scheme == 'unix':
+            self.socket_path = url.path
+            self.address = None
+        elif url.scheme in ('tcp', 'http'):
+            self.socket_path = None
+            self.address = (url.hostname, url.port or 2375)
+        else:
+            raise ValueError(f'Unsupported DOCKER_HOST for the Engine API: {docker_host}')
+
+        self.docker_host = docker_host
+        self.timeout = timeout
+        self.api_version = api_version or os.getenv('DOCKER_API_VERSION', '1.41')
+        self._pool: 'queue.LifoQueue[http.client.HTTPConnection]' = queue.LifoQueue(maxsize=pool_size)
+
+    @classmethod
+    def from_docker_host(cls, docker_host: str) -> Optional['DockerAPIClient']:
+        """Build a client for DOCKER_HOST, or None if it cannot be used"""
+        url = urlparse(docker_host)
+        if url.scheme == 'unix' and not os.path.exists(url.path):
+            return None
+        if url.scheme not in ('unix', 'tcp', 'http'):
+            return None
+        return cls(docker_host, pool_size=int(os.getenv('DOCKER_API_POOL_SIZE', 8)))
+
+    def _new_connection(self, timeout: Optional[float]) -> http.client.HTTPConnection:
+        if self.socket_path:
+            return UnixHTTPConnection(self.socket_path, timeout=timeout)
+        return http.client.HTTPConnection(*self.address, timeout=timeout)
+
+    def _get_connection(self) -> http.client.HTTPConnection:
+        while True:
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                return self._new_connection(self.timeout)
+            if self._idle_connection_open(conn):
+                return conn
+            conn.close()
+
+    @staticmethod
+    def _idle_connection_open(conn: http.client.HTTPConnection) -> bool:
+        """Whether the daemon kept a pooled connection open
+
+        An idle connection has nothing to read; when it is readable the
+        daemon closed it (or sent something unexpected), either way it
+        cannot carry a request.
+        """
+        if conn.sock is None:
+            return True
+        try:
+            readable, _, _ = select.select([conn.sock], [], [], 0)
+        except (OSError, ValueError):
+            return False
+        return not readable
+
+    def _release_connection(self, conn: http.client.HTTPConnection):
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def _path(self, path: str, params: Optional[Dict[str, Any]] = None) -> str:
+        url = f'/v{self.api_version}{path}'
+        if params:
+            url += '?' + urlencode({k: v for k, v in params.items() if v is not None})
+        return url
+
+    def request(self, method: str, path: str, params: Optional[Dict[str, Any]] = None,
+                body: Optional[Any] = None, raw: bool = False) -> Any:
+        """Send a request and return the decoded JSON body (or the raw bytes)"""
+        url = self._path(path, params)
+        payload = json.dumps(body).encode() if body is not None else None
+        headers = {'Content-Type': 'application/json'} if payload is not None else {}
+
+        # A pooled connection may have been closed by the daemon while idle,
+        # so a failure on a reused connection is retried once on a fresh one.
+        # Once a request was written the daemon may have acted on it, only
+        # idempotent ones are sent again then.
+        for attempt in range(2):
+            conn = self._get_connection() if attempt == 0 else self._new_connection(self.timeout)
+            reused = conn.sock is not None
+            sent = False
+            try:
+                conn.request(method, url, body=payload, headers=headers)
+                sent = True
+                response = conn.getresponse()
+                data = response.read()
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError) as e:
+                conn.close()
+                if reused and (not sent or method in IDEMPOTENT_METHODS):
+                    continue
+                raise DockerConnectionError(f'Lost connection to Docker daemon: {e}') from e
+            except OSError as e:
+                conn.close()
+                raise DockerConnectionError(f'Cannot connect to Docker daemon at {self.docker_host}: {e}') from e
+
+            if response.will_close:
+                conn.close()
+            else:
+                self._release_connection(conn)
+            return self._decode(response.status, data, raw)
+
+        raise DockerConnectionError(f'Lost connection to Docker daemon at {self.docker_host}')
+
+    @staticmethod
+    def _decode(status: int, data: bytes, raw: bool = False) -> Any:
+        if raw and status < 400:
+            return data
+
+        content = None
+        if data:
+            try:
+                content = json.loads(data)
+            except ValueError:
+                content = data.decode(errors='replace')
+
+        if status >= 400:
+            message = content.get('message') if isinstance(content, dict) else content
+            raise DockerAPIError(message or f'Docker API returned HTTP {status}', status=status)
+        return content
+
+    def close(self):
+        """Close all pooled connections"""
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def stream_events(self, filters: Optional[Dict[str, List[str]]] = None,
+                      timeout: Optional[float] = None) -> DockerEventStream:
+        """Subscribe to the events stream on a dedicated connection"""
+        params = {'filters': json.dumps(filters)} if filters else None
+        conn = self._new_connection(timeout)
+        try:
+            conn.request('GET', self._path('/events', params))
+            response = conn.getresponse()
+        except OSError as e:
+            conn.close()
+            raise DockerConnectionError(f'Cannot connect to Docker daemon at {self.docker_host}: {e}') from e
+
+        if response.status >= 400:
+            data = response.read()
+            conn.close()
+            self._decode(response.status, data)
+        return DockerEventStream(conn, response)
+
+    def stream_logs(self, container: str, multiplexed: bool = True, follow: bool = False,
+                    tail: str = 'all', since: Optional[str] = None, timestamps: bool = False,
+                    chunk_size: int = 16384) -> DockerLogStream:
+        """Stream the stdout and stderr of a container on a dedicated connection
+
+        multiplexed is False for containers with a TTY, whose output is sent as is.
+        """
+        params = {
+            'stdout': '1',
+            'stderr': '1',
+            'follow': '1' if follow else '0',
+            'tail': tail,
+            'since': since,
+            'timestamps': '1' if timestamps else '0'
+        }
+        # Followed containers may stay silent for any time
+        conn = self._new_connection(None if follow else self.timeout)
+        try:
+            conn.request('GET', self._path(f'/containers/{quote(container)}/logs', params))
+            # The connection drops its socket when the response is not kept alive
+            sock = conn.sock
+            response = conn.getresponse()
+        except OSError as e:
+            conn.close()
+            raise DockerConnectionError(f'Cannot connect to Docker daemon at {self.docker_host}: {e}') from e
+
+        if response.status >= 400:
+            data = response.read()
+            conn.close()
+            self._decode(response.status, data)
+        return DockerLogStream(conn, response, sock, multiplexed, chunk_size)
+
+    def ping(self) -> bool:
+        """Check that the daemon answers"""
+        return self.request('GET', '/_ping') == 'OK'
+
+    def list_containers(self, all: bool = True, filters: Optional[Dict[str, List[str]]] = None) -> List[Dict[str, Any]]:
+        """List containers"""
+        params = {'all': '1' if all else '0'}
+        if filters:
+            params['filters'] = json.dumps(filters)
+        return self.request('GET', '/containers/json', params=params)
+
+    def create_container(self, name: str, config: Dict[str, Any]) -> str:
+        """Create a container and return its ID"""
+        return self.request('POST', '/containers/create', params={'name': name}, body=config)['Id']
+
+    def start_container(self, container: str):
+        """Start a container"""
+        self.request('POST', f'/containers/{quote(container)}/start')
+
+    def stop_container(self, container: str):
+        """Stop a container"""
+        self.request('POST', f'/containers/{quote(container)}/stop')
+
+    def remove_container(self, container: str, force: bool = False):
+        """Remove a container"""
+        self.request('DELETE', f'/containers/{quote(container)}', params={'force': '1' if force else None})
+
+    def inspect_container(self, container: str) -> Dict[str, Any]:
+        """Inspect a container"""
+        return self.request('GET', f'/containers/{quote(container)}/json')
+
+    def rename_container(self, container: str, name: str):
+        """Rename a container"""
+        self.request('POST', f'/containers/{quote(container)}/rename', params={'name': name})
+
+    def ensure_network(self, network: str):
+        """Create a bridge network unless it exists"""
+        try:
+            self.request('GET', f'/networks/{quote(network)}')
+        except DockerAPIError as e:
+            if e.status != 404:
+                raise
+            self.request('POST', '/networks/create', body={'Name': network, 'CheckDuplicate': True})
+
+    def connect_network(self, network: str, container: str, aliases: Optional[List[str]] = None):
+        """Attach a container to a network, reachable there under aliases"""
+        self.request('POST', f'/networks/{quote(network)}/connect', body={
+            'Container': container,
+            'EndpointConfig': {'Aliases': aliases or []}
+        })
+
+    def disconnect_network(self, network: str, container: str):
+        """Detach a container from a network"""
+        self.request('POST', f'/networks/{quote(network)}/disconnect', body={'Container': container})
+
+    def inspect_image(self, image: str) -> Dict[str, Any]:
+        """Inspect a local image"""
+        return self.request('GET', f'/images/{quote(image, safe="/:@")}/json')
+
+    def pull_image(self, image: str):
+        """Pull an image, waiting for the pull to complete"""
+        name, tag = split_image_reference(image)
+        progress = self.request('POST', '/images/create', params={'fromImage': name, 'tag': tag}, raw=True)
+
+        # Pull failures are reported inside the progress stream with HTTP 200
+        for line in progress.splitlines():
+            if line.strip():
+                message = json.loads(line)
+                if message.get('error'):
+                    raise DockerAPIError(message['error'])
+
+
+def split_image_reference(image: str):
+    """Split an image reference into repository and tag"""
+    if '@' in image:
+        return image, None
+    name, sep, tag = image.rpartition(':')
+    if not sep or '/' in tag:
+        return image, 'latest'
+    return name, tag
+
+
+def format_container(container: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert an Engine API container summary to the `docker ps` shape"""
+    ports = []
+    for port in container.get('Ports') or []:
+        if port.get('PublicPort'):
+            ports.append(f"{port.get('IP', '0.0.0.0')}:{port['PublicPort']}->{port['PrivatePort']}/{port['Type']}")
+        else:
+            ports.append(f"{port['PrivatePort']}/{port['Type']}")
+
+    return {
+        'id': container.get('Id', '')[:12],
+        'name': ','.join(name.lstrip('/') for name in container.get('Names') or []),
+        'status': container.get('Status', ''),
+        'ports': ', '.join(ports),
+        'image': container.get('Image', '')
+    }
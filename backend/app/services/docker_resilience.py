@@ -0,0 +1,270 @@
+"""
+Docker Resilience for DockFlow POC
+"""
+
+import functools
+import logging
+import math
+import os
+import random
+import subprocess
+import threading
+import time
+from typing import Any, Optional
+
+from app.core.metrics import REGISTRY
+from app.services.docker_api import DockerAPIError, DockerConnectionError
+from app.services.docker_scheduler import DockerBusyError
+
+logger = logging.getLogger(__name__)
+
+# How the delay between attempts grows, as in the RetryConfig of the design
+BACKOFF_STRATEGIES = ('exponential', 'linear', 'constant')
+
+# Errors the docker CLI prints on stderr when the daemon is down, restarting
+# or overloaded, as opposed to errors of the request itself (bad image...)
+TRANSIENT_ERRORS = (
+    'cannot connect to the docker daemon',
+    'cannot connect to docker daemon',
+    'lost connection to docker daemon',
+    'is the docker daemon running',
+    'connection refused',
+    'connection reset',
+    'broken pipe',
+    'i/o timeout',
+    'tls handshake timeout',
+    'context deadline exceeded',
+    'unexpected eof',
+    'service unavailable',
+    'bad gateway',
+    'gateway timeout',
+    'too many requests',
+    'toomanyrequests',
+)
+# Engine API statuses of a daemon or registry that is overloaded or restarting
+TRANSIENT_STATUSES = (429, 502, 503, 504)
+
+# Values of the circuit state gauge
+CLOSED, HALF_OPEN, OPEN = 'closed', 'half_open', 'open'
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+DOCKER_OPERATION_RETRIES = REGISTRY.counter(
+    'dockflow_docker_operation_retries_total', 'DockerService operations retried after a transient error', ['operation']
+)
+DOCKER_CIRCUIT_STATE = REGISTRY.gauge(
+    'dockflow_docker_circuit_state', 'Circuit breaker of a Docker host: 0 closed, 1 half-open, 2 open', ['docker_host']
+)
+DOCKER_CIRCUIT_REJECTIONS = REGISTRY.counter(
+    'dockflow_docker_circuit_rejections_total', 'DockerService operations failed fast by an open circuit',
+    ['docker_host']
+)
+
+
+class DockerUnavailableError(Exception):
+    """Raised without calling a Docker host whose circuit is open"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def daemon_error(returncode: int, stderr: Optional[str]) -> bool:
+    """Whether a docker command failed because the daemon could not be reached
+
+    Only the CLI's own stderr is looked at, never what it printed of the
+    containers or builds it ran.
+    """
+    lowered = (stderr or '').lower()
+    return returncode != 0 and any(pattern in lowered for pattern in TRANSIENT_ERRORS)
+
+
+def transient_error(error: Any) -> Optional[str]:
+    """Text of an exception or failed operation result if it is a transient daemon error
+
+    Operations returning their failures mark the transient ones with a
+    'transient' key, telling them apart when they catch the exception.
+    """
+    if isinstance(error, (DockerConnectionError, subprocess.TimeoutExpired)):
+        return str(error)
+    if isinstance(error, DockerAPIError):
+        return str(error) if error.status in TRANSIENT_STATUSES else None
+    if isinstance(error, subprocess.CalledProcessError):
+        return error.stderr.strip() if daemon_error(error.returncode, error.stderr) else None
+    if isinstance(error, dict) and error.get('success') is False and error.get('transient'):
+        return error.get('message') or error.get('error')
+    if isinstance(error, list) and len(error) == 1 and error[0].get('transient'):
+        return error[0].get('error')
+    return None
+
+
+class RetryPolicy:
+    """Number of attempts and delays between them, with full jitter"""
+
+    def __init__(self, max_attempts: int = 3, backoff_strategy: str = 'exponential',
+                 initial_delay: float = 0.5, max_delay: float = 10.0):
+        if backoff_strategy not in BACKOFF_STRATEGIES:
+            raise ValueError(f'backoff strategy must be one of {", ".join(BACKOFF_STRATEGIES)}')
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_strategy = backoff_strategy
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+
+    @classmethod
+    def from_env(cls) -> 'RetryPolicy':
+        return cls(
+            max_attempts=int(os.getenv('DOCKER_RETRY_MAX_ATTEMPTS', 3)),
+            backoff_strategy=os.getenv('DOCKER_RETRY_BACKOFF', 'exponential'),
+            initial_delay=float(os.getenv('DOCKER_RETRY_INITIAL_DELAY', 0.5)),
+            max_delay=float(os.getenv('DOCKER_RETRY_MAX_DELAY', 10))
+        )
+
+    def delay(self, attempt: int) -> float:
+        """Seconds to wait after a failed attempt (1-based)"""
+        if self.backoff_strategy == 'exponential':
+            ceiling = self.initial_delay * 2 ** (attempt - 1)
+        elif self.backoff_strategy == 'linear':
+            ceiling = self.initial_delay * attempt
+        else:
+            ceiling = self.initial_delay
+        # Spread the retries of operations that failed together
+        return random.uniform(0, min(ceiling, self.max_delay))
+
+
+class CircuitBreaker:
+    """Fails operations on a Docker host fast while its daemon is down
+
+    After failure_threshold transient errors in a row the circuit opens and
+    operations fail without calling the daemon. After reset_timeout one
+    operation is let through to probe it: success closes the circuit, a
+    transient error opens it again.
+    """
+
+    def __init__(self, docker_host: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.docker_host = docker_host
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    @classmethod
+    def from_env(cls, docker_host: str) -> 'CircuitBreaker':
+        return cls(
+            docker_host,
+            failure_threshold=int(os.getenv('DOCKER_CIRCUIT_THRESHOLD', 5)),
+            reset_timeout=float(os.getenv('DOCKER_CIRCUIT_RESET_TIMEOUT', 30))
+        )
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def _set_state(self, state: str):
+        if state != self._state:
+            log = logger.warning if state == OPEN else logger.info
+            log('Circuit of Docker host %s is now %s', self.docker_host, state)
+        self._state = state
+        DOCKER_CIRCUIT_STATE.set(_STATE_VALUES[state], docker_host=self.docker_host)
+
+    def check(self):
+        """Raise DockerUnavailableError while the circuit is open, without probing"""
+        with self._lock:
+            remaining = self._opened_at + self.reset_timeout - time.monotonic()
+            if self._state != OPEN or remaining <= 0:
+                return
+        raise DockerUnavailableError(
+            f'Docker host {self.docker_host} is unavailable, not calling it for {remaining:.0f}s',
+            max(1, math.ceil(remaining))
+        )
+
+    def before_call(self):
+        """Raise DockerUnavailableError unless an operation may call the daemon"""
+        with self._lock:
+            if self._state == CLOSED:
+                return
+            remaining = self._opened_at + self.reset_timeout - time.monotonic()
+            if self._state == OPEN and remaining <= 0:
+                self._set_state(HALF_OPEN)
+            if self._state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+        DOCKER_CIRCUIT_REJECTIONS.inc(docker_host=self.docker_host)
+        raise DockerUnavailableError(
+            f'Docker host {self.docker_host} is unavailable, not calling it for {max(remaining, 0):.0f}s',
+            max(1, math.ceil(remaining))
+        )
+
+    def record(self, transient: Optional[bool]):
+        """Record the outcome of an operation let through by before_call()
+
+        None is for operations that did not reach the daemon.
+        """
+        with self._lock:
+            self._probing = False
+            if transient is None:
+                return
+            if not transient:
+                self._failures = 0
+                self._set_state(CLOSED)
+                return
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                self._set_state(OPEN)
+
+
+_attempts = threading.local()
+
+
+def resilient(method):
+    """Retry a DockerService operation failing with a transient daemon error
+
+    Calls go through the circuit breaker of the host. Operations nested in
+    another one run once and unchecked, the outer operation retries them.
+    """
+    operation = method.__name__.lstrip('_')
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if getattr(_attempts, 'active', False):
+            return method(self, *args, **kwargs)
+
+        policy = self.retry_policy
+        for attempt in range(1, policy.max_attempts + 1):
+            if attempt == 1:
+                self.circuit_breaker.before_call()
+            else:
+                time.sleep(delay)
+                try:
+                    self.circuit_breaker.before_call()
+                except DockerUnavailableError:
+                    # Opened by other operations meanwhile, report the last failure
+                    break
+
+            _attempts.active = True
+            try:
+                outcome, raised = method(self, *args, **kwargs), False
+            except DockerBusyError:
+                self.circuit_breaker.record(None)
+                raise
+            except Exception as e:
+                outcome, raised = e, True
+            finally:
+                _attempts.active = False
+
+            error = transient_error(outcome)
+            self.circuit_breaker.record(bool(error))
+            if not error or attempt == policy.max_attempts:
+                break
+            delay = policy.delay(attempt)
+            DOCKER_OPERATION_RETRIES.inc(operation=operation)
+            logger.warning('%s on %s failed (%s), attempt %d of %d, retrying in %.1fs',
+                           operation, self.docker_host, error, attempt, policy.max_attempts, delay)
+
+        if raised:
+            raise outcome
+        return outcome
+    return wrapper
@@ -0,0 +1,187 @@
+"""
+Docker Scheduler for DockFlow POC
+"""
+
+import functools
+import itertools
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from flask import has_request_context
+
+from app.core.metrics import REGISTRY
+
+# Priority classes of Docker operations, most urgent first
+PRIORITIES = ('read', 'deploy', 'pull')
+
+DOCKER_QUEUE_DEPTH = REGISTRY.gauge(
+    'dockflow_docker_queue_depth', 'Docker operations waiting for a slot', ['docker_host', 'priority']
+)
+DOCKER_OPERATIONS_RUNNING = REGISTRY.gauge(
+    'dockflow_docker_operations_running', 'Docker operations holding a slot', ['docker_host']
+)
+DOCKER_QUEUE_WAIT_SECONDS = REGISTRY.histogram(
+    'dockflow_docker_queue_wait_seconds', 'Time Docker operations waited for a slot', ['priority']
+)
+DOCKER_OPERATIONS_REJECTED = REGISTRY.counter(
+    'dockflow_docker_operations_rejected_total', 'Docker operations rejected because the host was busy',
+    ['docker_host', 'priority']
+)
+
+
+class DockerBusyError(Exception):
+    """Raised when a Docker host has too many operations waiting"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class DockerScheduler:
+    """Admission control and priority queueing of the operations on one Docker host
+
+    At most max_concurrent operations run against the daemon at a time, and
+    reserved_reads of those slots are kept for reads so status requests stay
+    fast while deployments queue. Waiting operations get slots by priority
+    class, then in arrival order.
+
+    Operations made while serving an API request are rejected right away
+    with a DockerBusyError when max_queued operations of their class are
+    already waiting, or when they wait longer than queue_timeout. Background
+    operations (deployment jobs, pre-pulls) wait as long as it takes.
+    Operations nested in one holding a slot on the same thread run in it.
+    """
+
+    def __init__(self, docker_host: str, max_concurrent: int = 8, reserved_reads: int = 2,
+                 max_queued: int = 32, queue_timeout: float = 5.0):
+        self.docker_host = docker_host
+        self.max_concurrent = max(1, max_concurrent)
+        self.reserved_reads = min(max(0, reserved_reads), self.max_concurrent - 1)
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        # Reentrant so rejections can compute Retry-After with the lock held
+        self._condition = threading.Condition(threading.RLock())
+        self._sequence = itertools.count()
+        self._waiting: Dict[tuple, str] = {}
+        self._running = {priority: 0 for priority in PRIORITIES}
+        self._held = threading.local()
+        # Moving average of the time operations hold a slot, for Retry-After
+        self._hold_seconds = 1.0
+
+    @classmethod
+    def from_env(cls, docker_host: str) -> 'DockerScheduler':
+        return cls(
+            docker_host,
+            max_concurrent=int(os.getenv('DOCKER_MAX_CONCURRENCY', 8)),
+            reserved_reads=int(os.getenv('DOCKER_RESERVED_READS', 2)),
+            max_queued=int(os.getenv('DOCKER_MAX_QUEUED', 32)),
+            queue_timeout=float(os.getenv('DOCKER_QUEUE_TIMEOUT', 5))
+        )
+
+    def _has_capacity(self, priority: str) -> bool:
+        running = sum(self._running.values())
+        if priority == 'read':
+            return running < self.max_concurrent
+        return running - self._running['read'] < self.max_concurrent - self.reserved_reads and \
+            running < self.max_concurrent
+
+    def _next(self) -> Optional[tuple]:
+        """First waiting operation that a free slot can be given to"""
+        for key in sorted(self._waiting):
+            if self._has_capacity(self._waiting[key]):
+                return key
+        return None
+
+    def _depth(self, priority: str) -> int:
+        return sum(1 for waiting in self._waiting.values() if waiting == priority)
+
+    def retry_after(self, priority: str) -> int:
+        """Seconds after which an operation of a class is likely to get a slot"""
+        with self._condition:
+            rank = PRIORITIES.index(priority)
+            ahead = sum(1 for waiting in self._waiting.values() if PRIORITIES.index(waiting) <= rank)
+            slots = self.max_concurrent if priority == 'read' else self.max_concurrent - self.reserved_reads
+            return max(1, math.ceil(self._hold_seconds * (ahead + 1) / slots))
+
+    def _reject(self, priority: str, reason: str):
+        DOCKER_OPERATIONS_REJECTED.inc(docker_host=self.docker_host, priority=priority)
+        raise DockerBusyError(f'Docker host {self.docker_host} is busy: {reason}', self.retry_after(priority))
+
+    def admit(self, priority: str):
+        """Reject new work of a class early when its queue on the host is full"""
+        with self._condition:
+            if self.max_queued and self._depth(priority) >= self.max_queued:
+                self._reject(priority, f'{self.max_queued} {priority} operations are waiting')
+
+    @contextmanager
+    def slot(self, priority: str) -> Iterator[None]:
+        """Hold a slot of the Docker host while running an operation"""
+        if getattr(self._held, 'depth', 0):
+            self._held.depth += 1
+            try:
+                yield
+            finally:
+                self._held.depth -= 1
+            return
+
+        interactive = has_request_context()
+        started = time.perf_counter()
+        with self._condition:
+            if self._waiting or not self._has_capacity(priority):
+                if interactive and self.max_queued and self._depth(priority) >= self.max_queued:
+                    self._reject(priority, f'{self.max_queued} {priority} operations are waiting')
+                key = (PRIORITIES.index(priority), next(self._sequence))
+                self._waiting[key] = priority
+                DOCKER_QUEUE_DEPTH.set(self._depth(priority), docker_host=self.docker_host, priority=priority)
+                try:
+                    deadline = started + self.queue_timeout if interactive else None
+                    while self._next() != key:
+                        remaining = None if deadline is None else deadline - time.perf_counter()
+                        if remaining is not None and remaining <= 0:
+                            break
+                        self._condition.wait(remaining)
+                    admitted = self._next() == key
+                finally:
+                    del self._waiting[key]
+                    DOCKER_QUEUE_DEPTH.set(self._depth(priority), docker_host=self.docker_host, priority=priority)
+                    # Someone else may be able to run with the slot not taken
+                    self._condition.notify_all()
+                if not admitted:
+                    self._reject(priority, f'no slot within {self.queue_timeout:g}s')
+            self._running[priority] += 1
+            DOCKER_OPERATIONS_RUNNING.set(sum(self._running.values()), docker_host=self.docker_host)
+
+        acquired = time.perf_counter()
+        DOCKER_QUEUE_WAIT_SECONDS.observe(acquired - started, priority=priority)
+        self._held.depth = 1
+        try:
+            yield
+        finally:
+            self._held.depth = 0
+            with self._condition:
+                self._running[priority] -= 1
+                self._hold_seconds = 0.8 * self._hold_seconds + 0.2 * (time.perf_counter() - acquired)
+                DOCKER_OPERATIONS_RUNNING.set(sum(self._running.values()), docker_host=self.docker_host)
+                self._condition.notify_all()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._condition:
+            return {
+                'running': dict(self._running),
+                'waiting': {priority: self._depth(priority) for priority in PRIORITIES}
+            }
+
+
+def scheduled(priority: str):
+    """Run a DockerService operation in a slot of its host's scheduler"""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.scheduler.slot(priority):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
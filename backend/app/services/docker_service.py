@@ -3,95 +3,622 @@ Docker Service for DockFlow POC
 """
 
 import subprocess
+import functools
+import hashlib
 import json
+import logging
 import os
-from typing import Dict, List, Any
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Any, Optional
+
+from app.core.metrics import REGISTRY
+from app.services.docker_api import DockerAPIClient, DockerAPIError, DockerConnectionError, format_container
+from app.services.compose_service import default_project_name
+from app.services.container_logs import CommandLogStream
+from app.services.container_state import (
+    ContainerStateCache, COMPOSE_PROJECT_LABEL, COMPOSE_SERVICE_LABEL, compose_project_name, container_keys
+)
+from app.services.docker_resilience import CircuitBreaker, RetryPolicy, resilient, transient_error
+from app.services.docker_scheduler import DockerScheduler, scheduled
+
+logger = logging.getLogger(__name__)
+
+# Lines of command output kept in deployment results
+OUTPUT_TAIL_LINES = 200
+
+# Ports published by deploy_container, container port -> host port
+DEFAULT_PORTS = {'80/tcp': '8080'}
+# How deploy_container replaces a running container
+STRATEGIES = ('recreate', 'blue_green')
+# Compose label listing the files a container's project was brought up from
+COMPOSE_CONFIG_FILES_LABEL = 'com.docker.compose.project.config_files'
+# Name suffix of the container started next to the running one by a swap
+NEXT_SUFFIX = '-next'
+# Seconds between state checks of a container starting up
+HEALTH_POLL_INTERVAL = 0.5
+
+DOCKER_OPERATION_SECONDS = REGISTRY.histogram(
+    'dockflow_docker_operation_duration_seconds', 'Duration of DockerService operations', ['operation']
+)
+DOCKER_OPERATION_FAILURES = REGISTRY.counter(
+    'dockflow_docker_operation_failures_total', 'Failed DockerService operations', ['operation']
+)
+
+def _failed(result: Any) -> bool:
+    """Whether an operation result reports an error instead of raising it"""
+    if isinstance(result, dict):
+        return result.get('success') is False
+    if isinstance(result, list):
+        return len(result) == 1 and 'error' in result[0]
+    return False
+
+def instrumented(method):
+    """Time a DockerService operation and count its failures"""
+    operation = method.__name__
+    
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = method(*args, **kwargs)
+            failed = _failed(result)
+            return result
+        finally:
+            DOCKER_OPERATION_SECONDS.observe(time.perf_counter() - started, operation=operation)
+            if failed:
+                DOCKER_OPERATION_FAILURES.inc(operation=operation)
+    return wrapper
+
+def normalize_ports(ports: Dict[Any, Any]) -> Dict[str, Optional[str]]:
+    """Validate published ports, e.g. {80: 8080} becomes {'80/tcp': '8080'}
+
+    A host port of None publishes the container port on a free host port.
+    """
+    if not isinstance(ports, dict):
+        raise ValueError('ports must map container ports to host ports')
+    normalized = {}
+    for container_port, host_port in ports.items():
+        number, _, protocol = str(container_port).partition('/')
+        if not number.isdigit() or protocol not in ('', 'tcp', 'udp', 'sctp'):
+            raise ValueError(f'Invalid container port {container_port}')
+        if host_port is not None and not str(host_port).isdigit():
+            raise ValueError(f'Invalid host port {host_port} for {container_port}')
+        normalized[f'{number}/{protocol or "tcp"}'] = None if host_port is None else str(host_port)
+    return normalized
+
+def _published_ports(ports: Dict[str, Any]) -> Dict[str, Optional[str]]:
+    """Host ports of a container from its inspected NetworkSettings.Ports"""
+    return {
+        port: bindings[0]['HostPort'] if bindings else None
+        for port, bindings in (ports or {}).items()
+    }
+
+def resolve_docker_host(docker_host: Optional[str] = None) -> str:
+    """Turn an application dockerHost setting into a DOCKER_HOST value"""
+    if not docker_host or docker_host == 'localhost':
+        return os.getenv('DOCKER_HOST', 'unix:///var/run/docker.sock')
+    if '://' in docker_host:
+        return docker_host
+    # Bare host names refer to a daemon listening on the default TCP port
+    return f'tcp://{docker_host}' if ':' in docker_host else f'tcp://{docker_host}:2375'
+
+_services: Dict[str, 'DockerService'] = {}
+_services_lock = threading.Lock()
+
+def get_docker_service(docker_host: Optional[str] = None) -> 'DockerService':
+    """Get the shared DockerService of a Docker host"""
+    docker_host = resolve_docker_host(docker_host)
+    with _services_lock:
+        if docker_host not in _services:
+            _services[docker_host] = DockerService(docker_host)
+        return _services[docker_host]
 
 class DockerService:
     """Service for Docker operations"""
     
-    def __init__(self):
-        self.docker_host = os.getenv('DOCKER_HOST', 'unix:///var/run/docker.sock')
+    def __init__(self, docker_host: Optional[str] = None):
+        self.docker_host = resolve_docker_host(docker_host)
+        # docker CLI calls target the same daemon as the API client
+        self.env = {**os.environ, 'DOCKER_HOST': self.docker_host}
+        
+        # Talk to the Engine API directly unless told to use the CLI;
+        # the docker CLI stays as a fallback when the daemon socket is unusable
+        self.api = None
+        if os.getenv('DOCKER_BACKEND', 'auto') != 'cli':
+            self.api = DockerAPIClient.from_docker_host(self.docker_host)
+        
+        # Status reads are served from memory while the events stream is healthy
+        self.container_state = None
+        if self.api and os.getenv('CONTAINER_STATE_CACHE', 'true') == 'true':
+            self.container_state = ContainerStateCache.from_env(self.api)
+        
+        # Network on which blue/green swaps move the container name alias
+        self.network = os.getenv('DEPLOY_NETWORK', 'dockflow')
+        self.health_timeout = float(os.getenv('DEPLOY_HEALTH_TIMEOUT', 60))
+        
+        # Bounds the operations running against the daemon, reads first
+        self.scheduler = DockerScheduler.from_env(self.docker_host)
+        # Transient daemon errors are retried, a daemon that keeps failing is not called
+        self.retry_policy = RetryPolicy.from_env()
+        self.circuit_breaker = CircuitBreaker.from_env(self.docker_host)
     
-    def deploy_compose(self, compose_file: str, app_name: str) -> Dict[str, Any]:
-        """Deploy application using Docker Compose"""
+    @resilient
+    @scheduled('deploy')
+    @instrumented
+    def deploy_compose(self, compose_file: str, app_name: str,
+                       on_output: Optional[Callable[[str], None]] = None,
+                       services: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Deploy application using Docker Compose, reporting output lines as they arrive
+
+        When services are given only those are recreated, otherwise the whole
+        project is brought up and containers of removed services are dropped.
+        The project is named after the application, see _compose_project().
+        """
         try:
+            project = self._compose_project(compose_file, app_name)
+            command = ['docker', 'compose', '-p', project, '-f', compose_file, 'up', '-d']
+            if services:
+                command += ['--no-deps', *services]
+            else:
+                command.append('--remove-orphans')
+            
             # Run docker compose up
-            result = subprocess.run(
-                ['docker', 'compose', '-f', compose_file, 'up', '-d'],
-                capture_output=True,
-                text=True,
-                check=True
-            )
+            returncode, output, output_digest = self._stream_command(command, on_output)
+            
+            if returncode != 0:
+                # Never transient: up may have created containers already, and
+                # its output includes that of builds and containers
+                return {
+                    'success': False,
+                    'message': f'Failed to deploy {app_name}: {output}',
+                    'error': f'docker compose exited with status {returncode}',
+                    'output_digest': output_digest
+                }
             
             return {
                 'success': True,
                 'message': f'Application {app_name} deployed successfully',
-                'output': result.stdout
+                'output': output,
+                'output_digest': output_digest
             }
             
-        except subprocess.CalledProcessError as e:
-            return {
-                'success': False,
-                'message': f'Failed to deploy {app_name}: {e.stderr}',
-                'error': str(e)
-            }
         except Exception as e:
             return {
                 'success': False,
                 'message': f'Unexpected error deploying {app_name}: {str(e)}',
-                'error': str(e)
+                'error': str(e),
+                'transient': bool(transient_error(e))
             }
     
-    def deploy_container(self, container_name: str, image: str) -> Dict[str, Any]:
-        """Deploy a simple container"""
+    def _compose_project(self, compose_file: str, app_name: str) -> str:
+        """Compose project to bring an application up under
+
+        Projects are named after their application. Stacks deployed from the
+        same file before that run under Compose's default project name; they
+        keep it, so a redeploy updates them instead of starting a second copy
+        next to them (see "Compose project names" in the README to move them).
+        """
+        project = compose_project_name(app_name)
+        legacy = default_project_name(compose_file)
+        if not legacy or legacy == project:
+            return project
+        
+        config_file = os.path.abspath(compose_file)
+        label = f'{COMPOSE_PROJECT_LABEL}={legacy}'
+        if self.api:
+            config_files = [
+                (container.get('Labels') or {}).get(COMPOSE_CONFIG_FILES_LABEL, '')
+                for container in self.api.list_containers(all=True, filters={'label': [label]})
+            ]
+        else:
+            config_files = subprocess.run(
+                ['docker', 'ps', '-a', '--filter', f'label={label}',
+                 '--format', f'{{{{.Label "{COMPOSE_CONFIG_FILES_LABEL}"}}}}'],
+                capture_output=True, env=self.env, text=True, check=True
+            ).stdout.splitlines()
+        
+        if any(config_file in files.split(',') for files in config_files):
+            logger.warning('%s runs under the %s compose project, deploying it there instead of %s',
+                           app_name, legacy, project)
+            return legacy
+        return project
+    
+    def _stream_command(self, command: List[str], on_output: Optional[Callable[[str], None]] = None):
+        """Run a command line by line, keeping only the tail and a digest of its output"""
+        tail = deque(maxlen=OUTPUT_TAIL_LINES)
+        digest = hashlib.sha256()
+        process = subprocess.Popen(
+            command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            env=self.env,
+            text=True,
+            bufsize=1
+        )
+        with process:
+            for line in process.stdout:
+                digest.update(line.encode())
+                line = line.rstrip('\n')
+                tail.append(line)
+                if on_output:
+                    on_output(line)
+        
+        return process.returncode, '\n'.join(tail), digest.hexdigest()
+    
+    @resilient
+    @scheduled('deploy')
+    @instrumented
+    def deploy_container(self, container_name: str, image: str,
+                         ports: Optional[Dict[str, Optional[str]]] = None,
+                         strategy: str = 'recreate') -> Dict[str, Any]:
+        """Deploy a simple container
+
+        The recreate strategy stops the running container before starting
+        the new one. blue_green starts the new container next to it, waits
+        for it to be healthy and then moves the container name alias on the
+        deploy network over to it, see _swap_container_api(). Either way the
+        container answers under its name on the deploy network.
+        """
+        if strategy not in STRATEGIES:
+            return {
+                'success': False,
+                'message': f'Unknown deployment strategy {strategy}',
+                'error': f'strategy must be one of {", ".join(STRATEGIES)}'
+            }
+        if strategy == 'blue_green':
+            # Both containers run during the swap, they cannot share a host port
+            ports = normalize_ports({'80/tcp': None} if ports is None else ports)
+            fixed = [port for port, host_port in ports.items() if host_port]
+            if fixed:
+                return {
+                    'success': False,
+                    'message': f'Cannot swap {container_name} with fixed host ports for {", ".join(fixed)}',
+                    'error': 'blue_green deployments publish ports on free host ports'
+                }
+        else:
+            ports = normalize_ports(DEFAULT_PORTS if ports is None else ports)
+        
+        if self.api:
+            try:
+                if strategy == 'blue_green':
+                    return self._swap_container_api(container_name, image, ports)
+                return self._deploy_container_api(container_name, image, ports)
+            except DockerConnectionError as e:
+                logger.warning('Docker API unavailable, falling back to CLI: %s', e)
+        
+        if strategy == 'blue_green':
+            return self._swap_container_cli(container_name, image, ports)
+        
+        def docker(*args, check=True):
+            return subprocess.run(['docker', *args], capture_output=True, env=self.env, text=True, check=check)
+        
         try:
             # Stop and remove existing container
             subprocess.run(
                 ['docker', 'stop', container_name],
                 capture_output=True,
+                env=self.env,
                 text=True
             )
             subprocess.run(
                 ['docker', 'rm', container_name],
                 capture_output=True,
+                env=self.env,
                 text=True
             )
             
             # Run new container
-            result = subprocess.run(
-                [
-                    'docker', 'run', '-d',
-                    '--name', container_name,
-                    '-p', '8080:80',
-                    image
-                ],
-                capture_output=True,
-                text=True,
-                check=True
-            )
+            if docker('network', 'inspect', self.network, check=False).returncode != 0:
+                docker('network', 'create', self.network)
+            container_id = docker(
+                'create', '--name', container_name, *self._publish_args(ports), image
+            ).stdout.strip()
+            docker('network', 'connect', '--alias', container_name, self.network, container_id)
+            docker('start', container_id)
             
             return {
                 'success': True,
                 'message': f'Container {container_name} deployed successfully',
-                'container_id': result.stdout.strip()
+                'container_id': container_id
             }
             
         except subprocess.CalledProcessError as e:
             return {
                 'success': False,
                 'message': f'Failed to deploy container {container_name}: {e.stderr}',
-                'error': str(e)
+                'error': str(e),
+                'transient': bool(transient_error(e))
             }
         except Exception as e:
             return {
                 'success': False,
                 'message': f'Unexpected error deploying container {container_name}: {str(e)}',
-                'error': str(e)
+                'error': str(e),
+                'transient': bool(transient_error(e))
+            }
+    
+    @staticmethod
+    def _container_config(image: str, ports: Dict[str, Optional[str]]) -> Dict[str, Any]:
+        """Engine API create config of a container publishing ports"""
+        return {
+            'Image': image,
+            'ExposedPorts': {port: {} for port in ports},
+            'HostConfig': {
+                'PortBindings': {port: [{'HostPort': host_port or ''}] for port, host_port in ports.items()}
+            }
+        }
+    
+    @staticmethod
+    def _publish_args(ports: Dict[str, Optional[str]]) -> List[str]:
+        """docker run arguments publishing ports"""
+        args = []
+        for port, host_port in ports.items():
+            args += ['-p', f'{host_port}:{port}' if host_port else port]
+        return args
+    
+    def _create_container_api(self, container_name: str, image: str, ports: Dict[str, Optional[str]]) -> str:
+        """Create a container, pulling its image when it is not present like `docker run`"""
+        config = self._container_config(image, ports)
+        try:
+            return self.api.create_container(container_name, config)
+        except DockerAPIError as e:
+            if e.status != 404:
+                raise
+            self.api.pull_image(image)
+            return self.api.create_container(container_name, config)
+    
+    def _deploy_container_api(self, container_name: str, image: str,
+                              ports: Dict[str, Optional[str]]) -> Dict[str, Any]:
+        """Deploy a simple container through the Engine API"""
+        try:
+            # Stop and remove existing container
+            for remove in (self.api.stop_container, self.api.remove_container):
+                try:
+                    remove(container_name)
+                except DockerAPIError as e:
+                    if e.status != 404:
+                        raise
+            
+            self.api.ensure_network(self.network)
+            container_id = self._create_container_api(container_name, image, ports)
+            # Reachable under its name on the deploy network, as after a blue/green swap
+            self.api.connect_network(self.network, container_id, aliases=[container_name])
+            self.api.start_container(container_id)
+            
+            return {
+                'success': True,
+                'message': f'Container {container_name} deployed successfully',
+                'container_id': container_id
+            }
+            
+        except DockerConnectionError:
+            raise
+        except DockerAPIError as e:
+            return {
+                'success': False,
+                'message': f'Failed to deploy container {container_name}: {e}',
+                'error': str(e),
+                'transient': bool(transient_error(e))
+            }
+    
+    def _wait_healthy(self, inspect: Callable[[], Dict[str, Any]]) -> Optional[str]:
+        """Wait for a started container to be healthy, returning why it is not
+
+        Without a health check in its image a running container is healthy.
+        """
+        deadline = time.monotonic() + self.health_timeout
+        while True:
+            state = inspect()
+            health = (state.get('Health') or {}).get('Status')
+            if not state.get('Running'):
+                return f"container exited with status {state.get('ExitCode')}"
+            if health in (None, 'healthy'):
+                return None
+            if health == 'unhealthy':
+                return 'health check failed'
+            if time.monotonic() >= deadline:
+                return f'not healthy after {self.health_timeout:g}s'
+            time.sleep(HEALTH_POLL_INTERVAL)
+    
+    def _swap_container_api(self, container_name: str, image: str,
+                            ports: Dict[str, Optional[str]]) -> Dict[str, Any]:
+        """Replace a container without downtime through the Engine API
+
+        The new container answers under the container name alias on the
+        deploy network before the old one is taken off it, so clients going
+        through that network (e.g. a reverse proxy) always reach one of
+        them. If the new container is not healthy, or taking the alias over
+        fails, it is removed and the old one keeps running.
+        """
+        next_name = f'{container_name}{NEXT_SUFFIX}'
+        try:
+            # Leftover of an interrupted swap
+            try:
+                self.api.remove_container(next_name, force=True)
+            except DockerAPIError as e:
+                if e.status != 404:
+                    raise
+            
+            self.api.ensure_network(self.network)
+            container_id = self._create_container_api(next_name, image, ports)
+            self.api.start_container(container_id)
+            
+            started = time.perf_counter()
+            problem = self._wait_healthy(lambda: self.api.inspect_container(container_id)['State'])
+            health_wait = time.perf_counter() - started
+            if problem:
+                self.api.remove_container(container_id, force=True)
+                return {
+                    'success': False,
+                    'message': f'New container of {container_name} is not healthy ({problem}), kept the running one',
+                    'error': problem
+                }
+            
+            started = time.perf_counter()
+            disconnected = False
+            try:
+                self.api.connect_network(self.network, container_id, aliases=[container_name])
+                try:
+                    self.api.disconnect_network(self.network, container_name)
+                    disconnected = True
+                except DockerAPIError as e:
+                    # Not on the network (or gone): nothing routes to it there
+                    if isinstance(e, DockerConnectionError):
+                        raise
+                    logger.debug('Could not disconnect %s from %s: %s', container_name, self.network, e)
+                cutover = time.perf_counter() - started
+                
+                for remove in (self.api.stop_container, self.api.remove_container):
+                    try:
+                        remove(container_name)
+                    except DockerAPIError as e:
+                        if e.status != 404:
+                            raise
+                self.api.rename_container(container_id, container_name)
+            except DockerAPIError:
+                self._abandon_swap_api(container_id, container_name, disconnected)
+                raise
+            
+            published = self.api.inspect_container(container_id).get('NetworkSettings', {}).get('Ports')
+            return {
+                'success': True,
+                'message': f'Container {container_name} swapped successfully',
+                'container_id': container_id,
+                'strategy': 'blue_green',
+                'ports': _published_ports(published),
+                'health_wait_ms': round(health_wait * 1000, 1),
+                'cutover_ms': round(cutover * 1000, 1)
+            }
+            
+        except DockerConnectionError:
+            raise
+        except DockerAPIError as e:
+            return {
+                'success': False,
+                'message': f'Failed to swap container {container_name}: {e}',
+                'error': str(e),
+                'transient': bool(transient_error(e))
             }
     
+    def _abandon_swap_api(self, container_id: str, container_name: str, disconnected: bool):
+        """Take the new container of a failed swap off the alias and remove it
+
+        The old container gets the alias back if it was taken off the network.
+        Each step is attempted even if the previous one failed.
+        """
+        steps = [
+            lambda: self.api.disconnect_network(self.network, container_id),
+            lambda: self.api.remove_container(container_id, force=True)
+        ]
+        if disconnected:
+            steps.append(lambda: self.api.connect_network(self.network, container_name, aliases=[container_name]))
+        for step in steps:
+            try:
+                step()
+            except DockerAPIError as e:
+                logger.warning('Could not clean up the failed swap of %s: %s', container_name, e)
+    
+    def _swap_container_cli(self, container_name: str, image: str,
+                            ports: Dict[str, Optional[str]]) -> Dict[str, Any]:
+        """Replace a container without downtime with the docker CLI, see _swap_container_api()"""
+        def docker(*args, check=True):
+            return subprocess.run(['docker', *args], capture_output=True, env=self.env, text=True, check=check)
+        
+        next_name = f'{container_name}{NEXT_SUFFIX}'
+        try:
+            docker('rm', '-f', next_name, check=False)
+            if docker('network', 'inspect', self.network, check=False).returncode != 0:
+                docker('network', 'create', self.network)
+            container_id = docker(
+                'run', '-d', '--name', next_name, *self._publish_args(ports), image
+            ).stdout.strip()
+            
+            started = time.perf_counter()
+            problem = self._wait_healthy(
+                lambda: json.loads(docker('inspect', '--format', '{{json .State}}', container_id).stdout)
+            )
+            health_wait = time.perf_counter() - started
+            if problem:
+                docker('rm', '-f', container_id, check=False)
+                return {
+                    'success': False,
+                    'message': f'New container of {container_name} is not healthy ({problem}), kept the running one',
+                    'error': problem
+                }
+            
+            started = time.perf_counter()
+            disconnected = False
+            try:
+                docker('network', 'connect', '--alias', container_name, self.network, container_id)
+                disconnect = docker('network', 'disconnect', self.network, container_name, check=False)
+                disconnected = disconnect.returncode == 0
+                cutover = time.perf_counter() - started
+                
+                docker('stop', container_name, check=False)
+                docker('rm', container_name, check=False)
+                docker('rename', container_id, container_name)
+            except subprocess.CalledProcessError:
+                # Take the new container off the alias, giving it back to the old one
+                docker('network', 'disconnect', self.network, container_id, check=False)
+                docker('rm', '-f', container_id, check=False)
+                if disconnected:
+                    docker('network', 'connect', '--alias', container_name, self.network, container_name, check=False)
+                raise
+            
+            published = docker('inspect', '--format', '{{json .NetworkSettings.Ports}}', container_id).stdout
+            return {
+                'success': True,
+                'message': f'Container {container_name} swapped successfully',
+                'container_id': container_id,
+                'strategy': 'blue_green',
+                'ports': _published_ports(json.loads(published or 'null')),
+                'health_wait_ms': round(health_wait * 1000, 1),
+                'cutover_ms': round(cutover * 1000, 1)
+            }
+            
+        except subprocess.CalledProcessError as e:
+            return {
+                'success': False,
+                'message': f'Failed to swap container {container_name}: {e.stderr}',
+                'error': str(e),
+                'transient': bool(transient_error(e))
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'message': f'Unexpected error swapping container {container_name}: {str(e)}',
+                'error': str(e),
+                'transient': bool(transient_error(e))
+            }
+    
+    @instrumented
     def get_container_status(self, app_name: str) -> List[Dict[str, Any]]:
         """Get container status for an application"""
+        if self.container_state:
+            containers = self.container_state.get(app_name)
+            if containers is not None:
+                return containers
+        return self._query_container_status(app_name)
+    
+    @resilient
+    @scheduled('read')
+    def _query_container_status(self, app_name: str) -> List[Dict[str, Any]]:
+        """Ask the daemon for the containers of an application"""
+        if self.api:
+            try:
+                containers = self.api.list_containers(all=True, filters={'name': [app_name]})
+                return [format_container(container) for container in containers]
+            except DockerConnectionError as e:
+                logger.warning('Docker API unavailable, falling back to CLI: %s', e)
+            except DockerAPIError as e:
+                return [{
+                    'error': f'Failed to get container status: {e}',
+                    'transient': bool(transient_error(e))
+                }]
+        
         try:
             # Get containers by name pattern
             result = subprocess.run(
@@ -101,6 +628,7 @@ class DockerService:
                     '--format', 'json'
                 ],
                 capture_output=True,
+                env=self.env,
                 text=True,
                 check=True
             )
@@ -108,28 +636,271 @@ class DockerService:
             containers = []
             for line in result.stdout.strip().split('\n'):
                 if line:
-                    container_info = json.loads(line)
-                    containers.append({
-                        'id': container_info.get('ID', ''),
-                        'name': container_info.get('Names', ''),
-                        'status': container_info.get('Status', ''),
-                        'ports': container_info.get('Ports', ''),
-                        'image': container_info.get('Image', '')
-                    })
+                    containers.append(self._format_cli_container(json.loads(line)))
             
             return containers
             
         except subprocess.CalledProcessError as e:
-            return [{'error': f'Failed to get container status: {e.stderr}'}]
+            return [{
+                'error': f'Failed to get container status: {e.stderr}',
+                'transient': bool(transient_error(e))
+            }]
         except Exception as e:
-            return [{'error': f'Unexpected error getting container status: {str(e)}'}]
+            return [{
+                'error': f'Unexpected error getting container status: {str(e)}',
+                'transient': bool(transient_error(e))
+            }]
+    
+    @instrumented
+    def list_containers_by_app(self) -> Dict[str, List[Dict[str, Any]]]:
+        """List all containers once, grouped by container name and compose project"""
+        if self.container_state:
+            grouped = self.container_state.snapshot()
+            if grouped is not None:
+                return grouped
+        return self._query_containers_by_app()
+    
+    @resilient
+    @scheduled('read')
+    def _query_containers_by_app(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Ask the daemon for all containers, grouped by name and compose project"""
+        grouped: Dict[str, List[Dict[str, Any]]] = {}
+        if self.api:
+            try:
+                for container in self.api.list_containers(all=True):
+                    formatted = format_container(container)
+                    for key in container_keys(container):
+                        grouped.setdefault(key, []).append(formatted)
+                return grouped
+            except DockerConnectionError as e:
+                logger.warning('Docker API unavailable, falling back to CLI: %s', e)
+        
+        result = subprocess.run(
+            ['docker', 'ps', '-a', '--format', 'json'],
+            capture_output=True,
+            env=self.env,
+            text=True,
+            check=True
+        )
+        
+        for line in result.stdout.strip().split('\n'):
+            if line:
+                container_info = json.loads(line)
+                labels = dict(
+                    label.split('=', 1) for label in container_info.get('Labels', '').split(',') if '=' in label
+                )
+                keys = set(container_info.get('Names', '').split(','))
+                if labels.get(COMPOSE_PROJECT_LABEL):
+                    keys.add(labels[COMPOSE_PROJECT_LABEL])
+                formatted = self._format_cli_container(container_info)
+                for key in keys:
+                    grouped.setdefault(key, []).append(formatted)
+        
+        return grouped
+    
+    @resilient
+    @scheduled('read')
+    @instrumented
+    def find_app_containers(self, app_name: str, services: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Containers of an application: the one named after it and those of its compose project
+        
+        Each has an id, name, compose service (None outside compose) and tty
+        (None when unknown). services keeps the containers of these compose
+        services only.
+        """
+        project = compose_project_name(app_name)
+        found: Dict[str, Dict[str, Any]] = {}
+        
+        def add(container_id: str, name: str, labels: Dict[str, str], tty: Optional[bool]):
+            # The name filter of the daemon matches substrings
+            if name == app_name or labels.get(COMPOSE_PROJECT_LABEL) == project:
+                found[container_id] = {
+                    'id': container_id,
+                    'name': name,
+                    'service': labels.get(COMPOSE_SERVICE_LABEL),
+                    'tty': tty
+                }
+        
+        if self.api:
+            try:
+                for container_filter in ({'name': [app_name]}, {'label': [f'{COMPOSE_PROJECT_LABEL}={project}']}):
+                    for container in self.api.list_containers(all=True, filters=container_filter):
+                        if container['Id'] not in found:
+                            # Output of containers with a TTY is not multiplexed
+                            config = self.api.inspect_container(container['Id']).get('Config') or {}
+                            name = (container.get('Names') or ['/'])[0].lstrip('/')
+                            add(container['Id'], name, container.get('Labels') or {}, bool(config.get('Tty')))
+                return self._select_services(found, services)
+            except DockerConnectionError as e:
+                logger.warning('Docker API unavailable, falling back to CLI: %s', e)
+                found.clear()
+        
+        for container_filter in (f'name={app_name}', f'label={COMPOSE_PROJECT_LABEL}={project}'):
+            result = subprocess.run(
+                ['docker', 'ps', '-a', '--filter', container_filter, '--format', 'json'],
+                capture_output=True,
+                env=self.env,
+                text=True,
+                check=True
+            )
+            for line in result.stdout.strip().split('\n'):
+                if line:
+                    container_info = json.loads(line)
+                    labels = dict(
+                        label.split('=', 1) for label in container_info.get('Labels', '').split(',') if '=' in label
+                    )
+                    add(container_info.get('ID', ''), container_info.get('Names', ''), labels, None)
+        
+        return self._select_services(found, services)
+    
+    @staticmethod
+    def _select_services(found: Dict[str, Dict[str, Any]], services: Optional[List[str]]) -> List[Dict[str, Any]]:
+        containers = sorted(found.values(), key=lambda container: container['name'])
+        if services:
+            containers = [container for container in containers if container['service'] in services]
+        return containers
+    
+    def open_container_logs(self, container: Dict[str, Any], follow: bool = False, tail: str = 'all',
+                            since: Optional[str] = None, timestamps: bool = False, chunk_size: int = 16384):
+        """Open the log stream of a container found by find_app_containers
+        
+        Followed logs stay open for as long as the client reads them, so like
+        the events stream they take no scheduler slot.
+        """
+        self.circuit_breaker.check()
+        if self.api:
+            try:
+                tty = container.get('tty')
+                if tty is None:
+                    tty = bool((self.api.inspect_container(container['id']).get('Config') or {}).get('Tty'))
+                return self.api.stream_logs(
+                    container['id'], multiplexed=not tty, follow=follow, tail=tail, since=since,
+                    timestamps=timestamps, chunk_size=chunk_size
+                )
+            except DockerConnectionError as e:
+                logger.warning('Docker API unavailable, falling back to CLI: %s', e)
+        
+        command = ['docker', 'logs', '--tail', tail]
+        if follow:
+            command.append('--follow')
+        if since:
+            command += ['--since', since]
+        if timestamps:
+            command.append('--timestamps')
+        return CommandLogStream(command + [container['id']], self.env, chunk_size)
     
+    @staticmethod
+    def _format_cli_container(container_info: Dict[str, Any]) -> Dict[str, Any]:
+        """Convert a `docker ps --format json` line to a container status"""
+        return {
+            'id': container_info.get('ID', '')[:12],
+            'name': container_info.get('Names', ''),
+            'status': container_info.get('Status', ''),
+            'ports': container_info.get('Ports', ''),
+            'image': container_info.get('Image', '')
+        }
+    
+    @resilient
+    @scheduled('read')
+    @instrumented
+    def get_image_id(self, image: str) -> Optional[str]:
+        """Get the ID of a local image, or None if it is not present"""
+        if self.api:
+            try:
+                return self.api.inspect_image(image)['Id']
+            except DockerConnectionError as e:
+                logger.warning('Docker API unavailable, falling back to CLI: %s', e)
+            except DockerAPIError:
+                return None
+        
+        try:
+            result = subprocess.run(
+                ['docker', 'image', 'inspect', '--format', '{{.Id}}', image],
+                capture_output=True,
+                env=self.env,
+                text=True
+            )
+        except OSError:
+            return None
+        return result.stdout.strip() if result.returncode == 0 else None
+    
+    @resilient
+    @scheduled('pull')
+    @instrumented
+    def pull_image(self, image: str) -> Dict[str, Any]:
+        """Pull an image from its registry"""
+        if self.api:
+            try:
+                self.api.pull_image(image)
+                return {
+                    'success': True,
+                    'message': f'Image {image} pulled successfully'
+                }
+            except DockerConnectionError as e:
+                logger.warning('Docker API unavailable, falling back to CLI: %s', e)
+            except DockerAPIError as e:
+                return {
+                    'success': False,
+                    'message': f'Failed to pull image {image}: {e}',
+                    'error': str(e),
+                    'transient': bool(transient_error(e))
+                }
+        
+        try:
+            subprocess.run(
+                ['docker', 'pull', '--quiet', image],
+                capture_output=True,
+                env=self.env,
+                text=True,
+                check=True
+            )
+            
+            return {
+                'success': True,
+                'message': f'Image {image} pulled successfully'
+            }
+            
+        except subprocess.CalledProcessError as e:
+            return {
+                'success': False,
+                'message': f'Failed to pull image {image}: {e.stderr}',
+                'error': str(e),
+                'transient': bool(transient_error(e))
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'message': f'Unexpected error pulling image {image}: {str(e)}',
+                'error': str(e),
+                'transient': bool(transient_error(e))
+            }
+    
+    @resilient
+    @scheduled('deploy')
+    @instrumented
     def stop_container(self, container_name: str) -> Dict[str, Any]:
         """Stop a container"""
+        if self.api:
+            try:
+                self.api.stop_container(container_name)
+                return {
+                    'success': True,
+                    'message': f'Container {container_name} stopped successfully'
+                }
+            except DockerConnectionError as e:
+                logger.warning('Docker API unavailable, falling back to CLI: %s', e)
+            except DockerAPIError as e:
+                return {
+                    'success': False,
+                    'message': f'Failed to stop container {container_name}: {e}',
+                    'transient': bool(transient_error(e))
+                }
+        
         try:
             result = subprocess.run(
                 ['docker', 'stop', container_name],
                 capture_output=True,
+                env=self.env,
                 text=True,
                 check=True
             )
@@ -142,15 +913,43 @@ class DockerService:
         except subprocess.CalledProcessError as e:
             return {
                 'success': False,
-                'message': f'Failed to stop container {container_name}: {e.stderr}'
+                'message': f'Failed to stop container {container_name}: {e.stderr}',
+                'transient': bool(transient_error(e))
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'message': f'Unexpected error stopping container {container_name}: {str(e)}',
+                'error': str(e),
+                'transient': bool(transient_error(e))
             }
     
+    @resilient
+    @scheduled('deploy')
+    @instrumented
     def remove_container(self, container_name: str) -> Dict[str, Any]:
         """Remove a container"""
+        if self.api:
+            try:
+                self.api.remove_container(container_name)
+                return {
+                    'success': True,
+                    'message': f'Container {container_name} removed successfully'
+                }
+            except DockerConnectionError as e:
+                logger.warning('Docker API unavailable, falling back to CLI: %s', e)
+            except DockerAPIError as e:
+                return {
+                    'success': False,
+                    'message': f'Failed to remove container {container_name}: {e}',
+                    'transient': bool(transient_error(e))
+                }
+        
         try:
             result = subprocess.run(
                 ['docker', 'rm', container_name],
                 capture_output=True,
+                env=self.env,
                 text=True,
                 check=True
             )
@@ -163,5 +962,13 @@ class DockerService:
         except subprocess.CalledProcessError as e:
             return {
                 'success': False,
-                'message': f'Failed to remove container {container_name}: {e.stderr}'
-            } 
\ No newline at end of file
+                'message': f'Failed to remove container {container_name}: {e.stderr}',
+                'transient': bool(transient_error(e))
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'message': f'Unexpected error removing container {container_name}: {str(e)}',
+                'error': str(e),
+                'transient': bool(transient_error(e))
+            }
@@ -0,0 +1,116 @@
+"""
+Event Bus for DockFlow POC
+"""
+
+import asyncio
+import queue
+import threading
+from typing import Any, Callable, Dict, Optional, Set
+
+
+class Subscription:
+    """Bounded queue of events for one subscriber"""
+
+    def __init__(self, bus: 'EventBus', key: str, max_events: int):
+        self.bus = bus
+        self.key = key
+        self._events: 'queue.Queue[Dict[str, Any]]' = queue.Queue(maxsize=max_events)
+        # Wakes up an event loop waiting in get_async()
+        self._wake: Optional[Callable[[], None]] = None
+
+    def put(self, event: Dict[str, Any]):
+        # A slow subscriber loses its oldest events rather than blocking publishers
+        while True:
+            try:
+                self._events.put_nowait(event)
+                break
+            except queue.Full:
+                try:
+                    self._events.get_nowait()
+                except queue.Empty:
+                    pass
+        wake = self._wake
+        if wake:
+            wake()
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Wait for the next event, or None on timeout"""
+        try:
+            return self._events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    async def get_async(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Wait for the next event without blocking the event loop, or None on timeout"""
+        loop = asyncio.get_running_loop()
+        ready = asyncio.Event()
+
+        def wake():
+            try:
+                loop.call_soon_threadsafe(ready.set)
+            except RuntimeError:
+                # The loop was closed while the subscription stayed open
+                pass
+
+        self._wake = wake
+        deadline = None if timeout is None else loop.time() + timeout
+        try:
+            while True:
+                try:
+                    return self._events.get_nowait()
+                except queue.Empty:
+                    pass
+                remaining = None if deadline is None else deadline - loop.time()
+                if remaining is not None and remaining <= 0:
+                    return None
+                try:
+                    await asyncio.wait_for(ready.wait(), remaining)
+                except asyncio.TimeoutError:
+                    return None
+                ready.clear()
+        finally:
+            self._wake = None
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class EventBus:
+    """In-process publish/subscribe of application events"""
+
+    def __init__(self, max_events: int = 1000):
+        self.max_events = max_events
+        self._lock = threading.Lock()
+        self._subscriptions: Dict[str, Set[Subscription]] = {}
+
+    def subscribe(self, key: str) -> Subscription:
+        """Subscribe to the events of an application"""
+        subscription = Subscription(self, key, self.max_events)
+        with self._lock:
+            self._subscriptions.setdefault(key, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.key)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.key]
+
+    def publish(self, key: str, event_type: str, data: Dict[str, Any]):
+        """Publish an event to every subscriber of an application"""
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(key, ()))
+        if not subscriptions:
+            return
+
+        event = {'event': event_type, 'data': data}
+        for subscription in subscriptions:
+            subscription.put(event)
@@ -0,0 +1,347 @@
+"""
+GitOps Service for DockFlow POC
+"""
+
+import hashlib
+import logging
+import os
+import random
+import shutil
+import subprocess
+import tarfile
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class GitError(Exception):
+    """Raised when a git command fails"""
+
+
+class RateLimiter:
+    """Token bucket shared by the threads talking to git remotes"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Wait until a call is allowed"""
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return
+            time.sleep(wait)
+
+    def try_acquire(self) -> float:
+        """Take a call if one is allowed now, else return the seconds until one is"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+
+# Checkouts used by queued or running deployments, by path
+_checkout_holds: Dict[str, int] = {}
+_checkout_holds_lock = threading.Lock()
+
+
+def hold_checkout(path: str):
+    """Keep a checkout from being pruned until release_checkout() is called as often"""
+    with _checkout_holds_lock:
+        _checkout_holds[path] = _checkout_holds.get(path, 0) + 1
+
+
+def release_checkout(path: str):
+    with _checkout_holds_lock:
+        if _checkout_holds.get(path, 0) > 1:
+            _checkout_holds[path] -= 1
+        else:
+            _checkout_holds.pop(path, None)
+
+
+def _checkout_held(path: str) -> bool:
+    with _checkout_holds_lock:
+        return path in _checkout_holds
+
+
+class RepositoryCache:
+    """Local bare repositories holding the heads of remote branches
+
+    Only the tip commit of a branch is fetched (shallow) and without file
+    contents (partial, where the remote supports filters); blobs are
+    downloaded on demand when a revision is checked out.
+    """
+
+    def __init__(self, cache_dir: str, timeout: int = 120, keep_checkouts: int = 2):
+        self.cache_dir = cache_dir
+        self.timeout = timeout
+        self.keep_checkouts = keep_checkouts
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> 'RepositoryCache':
+        """Build a cache configured from environment variables"""
+        return cls(
+            os.getenv('GITOPS_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'dockflow-gitops')),
+            timeout=int(os.getenv('GITOPS_GIT_TIMEOUT', 120))
+        )
+
+    def _git(self, *args: str, git_dir: Optional[str] = None) -> str:
+        command = ['git']
+        if git_dir:
+            command += ['--git-dir', git_dir]
+        command += list(args)
+        try:
+            result = subprocess.run(
+                command,
+                capture_output=True,
+                text=True,
+                timeout=self.timeout,
+                # Never wait for credentials on a terminal
+                env={**os.environ, 'GIT_TERMINAL_PROMPT': '0'}
+            )
+        except (OSError, subprocess.TimeoutExpired) as e:
+            raise GitError(f"git {args[0]} failed: {e}") from e
+        if result.returncode != 0:
+            raise GitError(f"git {args[0]} failed: {result.stderr.strip()}")
+        return result.stdout
+
+    @staticmethod
+    def _key(url: str) -> str:
+        return hashlib.sha1(url.encode()).hexdigest()
+
+    def _lock(self, url: str) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault(url, threading.Lock())
+
+    def repository_path(self, url: str) -> str:
+        """Path of the bare repository caching a remote"""
+        return os.path.join(self.cache_dir, 'repositories', f'{self._key(url)}.git')
+
+    def remote_head(self, url: str, branch: str) -> Optional[str]:
+        """Commit a remote branch points to, without fetching anything"""
+        output = self._git('ls-remote', url, f'refs/heads/{branch}')
+        for line in output.splitlines():
+            revision, _, ref = line.partition('\t')
+            if ref == f'refs/heads/{branch}':
+                return revision
+        return None
+
+    def fetch(self, url: str, branch: str) -> str:
+        """Fetch the tip of a branch into the cache and return its commit"""
+        git_dir = self.repository_path(url)
+        ref = f'refs/heads/{branch}'
+        with self._lock(url):
+            if not os.path.isdir(git_dir):
+                os.makedirs(os.path.dirname(git_dir), exist_ok=True)
+                self._git('init', '--quiet', '--bare', git_dir)
+                self._git('config', 'remote.origin.url', url, git_dir=git_dir)
+                self._git('config', 'remote.origin.promisor', 'true', git_dir=git_dir)
+                self._git('config', 'remote.origin.partialclonefilter', 'blob:none', git_dir=git_dir)
+
+            self._git(
+                'fetch', '--quiet', '--depth=1', '--filter=blob:none', '--no-tags',
+                'origin', f'+{ref}:{ref}',
+                git_dir=git_dir
+            )
+            return self._git('rev-parse', ref, git_dir=git_dir).strip()
+
+    def checkout(self, url: str, revision: str) -> str:
+        """Directory holding the files of a fetched revision
+
+        The checkout is held, see hold_checkout(): the caller releases it
+        with release_checkout() once done with it.
+        """
+        checkouts = os.path.join(self.cache_dir, 'checkouts', self._key(url))
+        path = os.path.join(checkouts, revision)
+        with self._lock(url):
+            if os.path.isdir(path):
+                hold_checkout(path)
+                return path
+
+            os.makedirs(checkouts, exist_ok=True)
+            staging = tempfile.mkdtemp(prefix='.', dir=checkouts)
+            try:
+                self._extract(self.repository_path(url), revision, staging)
+                os.rename(staging, path)
+            except Exception:
+                shutil.rmtree(staging, ignore_errors=True)
+                raise
+
+            hold_checkout(path)
+            self._prune(checkouts)
+        return path
+
+    def _extract(self, git_dir: str, revision: str, target: str):
+        """Write the tree of a revision to a directory, without an index"""
+        process = subprocess.Popen(
+            ['git', '--git-dir', git_dir, 'archive', '--format=tar', revision],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env={**os.environ, 'GIT_TERMINAL_PROMPT': '0'}
+        )
+        try:
+            with tarfile.open(fileobj=process.stdout, mode='r|') as archive:
+                archive.extractall(target, filter='data')
+        except tarfile.TarError as e:
+            process.kill()
+            raise GitError(f'git archive failed: {e}') from e
+        finally:
+            process.stdout.close()
+            stderr = process.stderr.read().decode(errors='replace')
+            process.stderr.close()
+            returncode = process.wait()
+        if returncode != 0:
+            raise GitError(f'git archive failed: {stderr.strip()}')
+
+    def _prune(self, checkouts: str):
+        """Drop the oldest checkouts no deployment holds"""
+        paths = [
+            os.path.join(checkouts, name) for name in os.listdir(checkouts)
+            if not name.startswith('.')
+        ]
+        paths.sort(key=os.path.getmtime, reverse=True)
+        for path in paths[self.keep_checkouts:]:
+            if not _checkout_held(path):
+                shutil.rmtree(path, ignore_errors=True)
+
+
+class GitOpsReconciler:
+    """Polls the branches of registered repositories and reports new heads
+
+    `list_targets` returns one dict per application with `id`, `url`,
+    `branch` and the deployed `revision`. Every repository and branch is
+    polled once per round however many applications use it, concurrently
+    and at most `max_polls_per_second` times a second, each on its own
+    jittered schedule. `on_change(target, revision, checkout)` is called
+    from the polling thread for each application whose branch moved; it
+    holds the checkout (see hold_checkout()) if it uses it after returning.
+    """
+
+    def __init__(self, cache: RepositoryCache,
+                 list_targets: Callable[[], List[Dict[str, Any]]],
+                 on_change: Callable[[Dict[str, Any], str, str], None],
+                 interval: float = 60, jitter: float = 0.2,
+                 max_workers: int = 8, max_polls_per_second: float = 5):
+        self.cache = cache
+        self.list_targets = list_targets
+        self.on_change = on_change
+        self.interval = interval
+        self.jitter = jitter
+        self.limiter = RateLimiter(max_polls_per_second, burst=max_workers)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='gitops')
+        self._next_poll: Dict[Tuple[str, str], float] = {}
+
+    @classmethod
+    def from_env(cls, list_targets: Callable[[], List[Dict[str, Any]]],
+                 on_change: Callable[[Dict[str, Any], str, str], None]) -> 'GitOpsReconciler':
+        """Build a reconciler configured from environment variables"""
+        return cls(
+            RepositoryCache.from_env(),
+            list_targets,
+            on_change,
+            interval=float(os.getenv('GITOPS_POLL_INTERVAL', 60)),
+            jitter=float(os.getenv('GITOPS_POLL_JITTER', 0.2)),
+            max_workers=int(os.getenv('GITOPS_WORKERS', 8)),
+            max_polls_per_second=float(os.getenv('GITOPS_MAX_POLLS_PER_SECOND', 5))
+        )
+
+    def _schedule(self, repository: Tuple[str, str]):
+        """Set the next poll of a repository, jittered so polls don't line up"""
+        delay = self.interval * (1 + random.uniform(-self.jitter, self.jitter))
+        self._next_poll[repository] = time.monotonic() + max(0, delay)
+
+    def _check(self, url: str, branch: str, revisions: set) -> Optional[Tuple[str, str]]:
+        """New head of a branch and its checkout, None if all revisions are current"""
+        self.limiter.acquire()
+        head = self.cache.remote_head(url, branch)
+        if head is None:
+            raise GitError(f'Branch {branch} not found in {url}')
+        if revisions == {head}:
+            return None
+
+        self.limiter.acquire()
+        # The branch may have moved again since ls-remote, deploy what was fetched
+        revision = self.cache.fetch(url, branch)
+        return revision, self.cache.checkout(url, revision)
+
+    def poll(self) -> List[Dict[str, Any]]:
+        """Poll the repositories that are due and return the changed targets"""
+        repositories: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        for target in self.list_targets():
+            repositories.setdefault((target['url'], target['branch'] or 'main'), []).append(target)
+
+        # Forget repositories no longer used by any application
+        for repository in set(self._next_poll) - set(repositories):
+            del self._next_poll[repository]
+
+        now = time.monotonic()
+        futures = {}
+        for repository, targets in repositories.items():
+            if self._next_poll.get(repository, 0) > now:
+                continue
+            url, branch = repository
+            revisions = {target.get('revision') for target in targets}
+            futures[repository] = self._executor.submit(self._check, url, branch, revisions)
+
+        changed = []
+        for repository, future in futures.items():
+            self._schedule(repository)
+            try:
+                head = future.result()
+            except GitError as e:
+                logger.warning('Cannot poll %s (%s): %s', repository[0], repository[1], e)
+                continue
+            if head is None:
+                continue
+
+            revision, checkout = head
+            try:
+                for target in repositories[repository]:
+                    if target.get('revision') == revision:
+                        continue
+                    try:
+                        self.on_change(target, revision, checkout)
+                    except Exception:
+                        logger.exception('Cannot redeploy %s at %s', target['id'], revision)
+                        continue
+                    changed.append({**target, 'revision': revision})
+            finally:
+                # on_change holds the checkout for as long as it needs it
+                release_checkout(checkout)
+        return changed
+
+    def seconds_until_due(self) -> float:
+        """Time until the next repository has to be polled"""
+        if not self._next_poll:
+            return self.interval
+        return max(0.0, min(self._next_poll.values()) - time.monotonic())
+
+    def run(self, stop: Optional[threading.Event] = None):
+        """Poll until stopped"""
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            try:
+                self.poll()
+            except Exception:
+                logger.exception('GitOps poll failed')
+            # New applications are picked up at the latest one interval later
+            stop.wait(min(max(self.seconds_until_due(), 0.1), self.interval))
+
+    def close(self):
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,97 @@
+"""
+Health Service for DockFlow POC
+"""
+
+import os
+import subprocess
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+from urllib.parse import urlparse
+
+from sqlalchemy import text
+
+from app import db
+from app.services.docker_api import DockerAPIClient
+
+
+class Probe:
+    """Dependency check with a timeout, whose result is cached for a short time
+
+    A check still running past its timeout is reported as down and is not
+    started again until it returns, so a hung dependency cannot pile up
+    threads.
+    """
+
+    def __init__(self, name: str, check: Callable[[], None], ttl: float = 5.0, timeout: float = 2.0):
+        self.name = name
+        self.check = check
+        self.ttl = ttl
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'probe-{name}')
+        self._running: Optional[Future] = None
+        self._result: Optional[Dict[str, Any]] = None
+        self._checked = 0.0
+
+    def result(self) -> Dict[str, Any]:
+        """Latest result, probing the dependency again once it is older than the TTL"""
+        with self._lock:
+            if self._result is None or time.monotonic() - self._checked >= self.ttl:
+                self._result = self._probe()
+                self._checked = time.monotonic()
+            return self._result
+
+    def _probe(self) -> Dict[str, Any]:
+        started = time.perf_counter()
+        result = {'status': 'up', 'checked_at': datetime.utcnow().isoformat()}
+
+        if self._running is not None and not self._running.done():
+            result.update(status='down', error='Previous check has not returned yet')
+            return result
+
+        self._running = self._executor.submit(self.check)
+        try:
+            self._running.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            result.update(status='down', error=f'Timed out after {self.timeout}s')
+        except Exception as e:
+            result.update(status='down', error=str(e))
+        result['latency_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        return result
+
+
+def database_check(flask_app, bind: Optional[str] = None) -> Callable[[], None]:
+    """Check running SELECT 1 on a database of the application"""
+    def check():
+        with flask_app.app_context():
+            with db.engines[bind].connect() as connection:
+                connection.execute(text('SELECT 1'))
+    return check
+
+
+def docker_check(docker_host: str, timeout: float) -> Callable[[], None]:
+    """Check pinging the Docker daemon, over the Engine API when possible"""
+    scheme = urlparse(docker_host).scheme
+    if os.getenv('DOCKER_BACKEND', 'auto') != 'cli' and scheme in ('unix', 'tcp', 'http'):
+        # A client of its own, so probes don't wait behind deployments for connections
+        client = DockerAPIClient(docker_host, pool_size=1, timeout=timeout)
+
+        def check():
+            if not client.ping():
+                raise RuntimeError('Docker daemon did not answer the ping')
+        return check
+
+    def check():
+        result = subprocess.run(
+            ['docker', 'version', '--format', '{{.Server.Version}}'],
+            capture_output=True,
+            env={**os.environ, 'DOCKER_HOST': docker_host},
+            text=True,
+            timeout=timeout
+        )
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip() or 'docker version failed')
+    return check
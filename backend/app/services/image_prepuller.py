@@ -0,0 +1,237 @@
+"""
+Image Pre-puller for DockFlow POC
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+from app.core.metrics import REGISTRY
+from app.services.compose_service import ComposeError, load_project
+from app.services.docker_service import DockerService, get_docker_service, resolve_docker_host
+from app.services.gitops_service import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+# Registry of image references without a registry host
+DEFAULT_REGISTRY = 'docker.io'
+
+IMAGE_PULL_SECONDS = REGISTRY.histogram(
+    'dockflow_image_pull_duration_seconds', 'Time to pull an image ahead of its deployment', ['registry', 'status'],
+    buckets=(0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+)
+IMAGE_PULLS_IN_FLIGHT = REGISTRY.gauge(
+    'dockflow_image_pulls_in_flight', 'Image pulls running right now'
+)
+
+
+def registry_of(image: str) -> str:
+    """Registry host an image reference is pulled from"""
+    first, sep, _ = image.partition('/')
+    if sep and ('.' in first or ':' in first or first == 'localhost'):
+        return first
+    return DEFAULT_REGISTRY
+
+
+def compose_images(compose_file: str) -> List[str]:
+    """Images run by the services of a compose file, without the ones built locally"""
+    return load_project(compose_file).images()
+
+
+class _RegistryQueue:
+    """Pulls from one registry waiting for a slot, and how many are running"""
+
+    def __init__(self, limiter: RateLimiter):
+        self.limiter = limiter
+        self.waiting: Deque[Tuple[DockerService, Dict[str, Any], float, Future]] = deque()
+        self.running = 0
+        self.timer: Optional[threading.Timer] = None
+
+
+class ImagePrePuller:
+    """Pulls the images of applications ahead of their deployments
+
+    A pull of an image on a Docker host is shared by everyone asking for it
+    while it runs, so applications using the same image only pull it once.
+    Pulls run on a bounded pool, and each registry has its own limit of
+    concurrent pulls and of pulls started per second. Pulls over the limits
+    of their registry wait in its queue, not on a thread of the pool, so a
+    slow registry does not hold up the others. Images already on the host
+    are not pulled again, like the default pull policy of compose.
+    """
+
+    def __init__(self, docker_services: Callable[[Optional[str]], DockerService] = get_docker_service,
+                 max_workers: int = 4, per_registry: int = 2, registry_rate: float = 0.0,
+                 timeout: float = 600.0, history: int = 200):
+        self.docker_services = docker_services
+        self.per_registry = max(1, per_registry)
+        self.registry_rate = registry_rate
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix='prepull')
+        self._lock = threading.RLock()
+        self._closed = False
+        self._pulls: Dict[Tuple[str, str], Future] = {}
+        self._registries: Dict[str, _RegistryQueue] = {}
+        self._timings = deque(maxlen=history)
+
+    @classmethod
+    def from_env(cls) -> 'ImagePrePuller':
+        return cls(
+            max_workers=int(os.getenv('PREPULL_WORKERS', 4)),
+            per_registry=int(os.getenv('PREPULL_PER_REGISTRY', 2)),
+            registry_rate=float(os.getenv('PREPULL_REGISTRY_RATE', 0)),
+            timeout=float(os.getenv('PREPULL_TIMEOUT', 600))
+        )
+
+    def schedule(self, docker_host: str, images: Iterable[str]) -> Dict[str, Future]:
+        """Start pulling images on a Docker host, joining pulls already running"""
+        docker_host = resolve_docker_host(docker_host)
+        futures = {}
+        with self._lock:
+            for image in sorted(set(images)):
+                key = (docker_host, image)
+                future = self._pulls.get(key)
+                if future is None:
+                    future = self._pulls[key] = Future()
+                    future.add_done_callback(lambda done, key=key: self._forget(key, done))
+                    self._executor.submit(self._check, docker_host, image, future)
+                futures[image] = future
+        return futures
+
+    def schedule_compose(self, compose_file: str, docker_hosts: Iterable[str]) -> Dict[str, Dict[str, Future]]:
+        """Start pulling the images of a compose file on each Docker host"""
+        try:
+            images = compose_images(compose_file)
+        except ComposeError as e:
+            # The deployment reports the broken file, nothing to pull
+            logger.debug('Not pre-pulling images of %s: %s', compose_file, e)
+            return {}
+        return {docker_host: self.schedule(docker_host, images) for docker_host in set(docker_hosts)}
+
+    def wait(self, futures: Dict[str, Future]) -> List[Dict[str, Any]]:
+        """Wait for pulls to finish and return their timings
+
+        Pulls still running after the timeout are reported as pending, the
+        deployment then pulls whatever is missing itself.
+        """
+        wait(futures.values(), timeout=self.timeout)
+        timings = []
+        for image, future in sorted(futures.items()):
+            if future.done():
+                timings.append(future.result())
+            else:
+                timings.append({'image': image, 'status': 'pending'})
+        return timings
+
+    def timings(self) -> List[Dict[str, Any]]:
+        """Timings of the latest pulls, most recent first"""
+        with self._lock:
+            return list(reversed(self._timings))
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            for queue in self._registries.values():
+                if queue.timer:
+                    queue.timer.cancel()
+                while queue.waiting:
+                    queue.waiting.popleft()[3].cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _forget(self, key: Tuple[str, str], future: Future):
+        with self._lock:
+            if self._pulls.get(key) is future:
+                del self._pulls[key]
+
+    def _registry(self, registry: str) -> _RegistryQueue:
+        with self._lock:
+            if registry not in self._registries:
+                self._registries[registry] = _RegistryQueue(RateLimiter(self.registry_rate, burst=self.per_registry))
+            return self._registries[registry]
+
+    def _check(self, docker_host: str, image: str, future: Future):
+        """Queue the pull of an image with its registry unless the host has it"""
+        registry = registry_of(image)
+        timing = {
+            'image': image,
+            'dockerHost': docker_host,
+            'registry': registry,
+            'started_at': datetime.utcnow().isoformat()
+        }
+        started = time.perf_counter()
+        try:
+            docker_service = self.docker_services(docker_host)
+            if docker_service.get_image_id(image):
+                timing['status'] = 'present'
+                self._finish(future, timing, started)
+                return
+        except Exception as e:
+            logger.exception('Failed to pull %s on %s', image, docker_host)
+            timing.update(status='failed', error=str(e))
+            self._finish(future, timing, started)
+            return
+
+        with self._lock:
+            if self._closed:
+                future.cancel()
+                return
+            self._registry(registry).waiting.append((docker_service, timing, started, future))
+        self._dispatch(registry)
+
+    def _dispatch(self, registry: str):
+        """Start the waiting pulls of a registry its limits allow"""
+        with self._lock:
+            queue = self._registry(registry)
+            while queue.waiting and queue.running < self.per_registry and not self._closed:
+                delay = queue.limiter.try_acquire()
+                if delay:
+                    if queue.timer is None:
+                        queue.timer = threading.Timer(delay, self._dispatch_later, args=(registry,))
+                        queue.timer.daemon = True
+                        queue.timer.start()
+                    return
+                queue.running += 1
+                self._executor.submit(self._pull, registry, *queue.waiting.popleft())
+
+    def _dispatch_later(self, registry: str):
+        with self._lock:
+            self._registry(registry).timer = None
+            self._dispatch(registry)
+
+    def _pull(self, registry: str, docker_service: DockerService, timing: Dict[str, Any],
+              started: float, future: Future):
+        """Pull one image in a slot of its registry, timing the pull"""
+        image, docker_host = timing['image'], timing['dockerHost']
+        timing['queued_seconds'] = round(time.perf_counter() - started, 3)
+        IMAGE_PULLS_IN_FLIGHT.inc()
+        try:
+            result = docker_service.pull_image(image)
+            timing['status'] = 'pulled' if result['success'] else 'failed'
+            if not result['success']:
+                timing['error'] = result.get('error') or result['message']
+        except Exception as e:
+            logger.exception('Failed to pull %s on %s', image, docker_host)
+            timing.update(status='failed', error=str(e))
+        finally:
+            IMAGE_PULLS_IN_FLIGHT.dec()
+            with self._lock:
+                self._registry(registry).running -= 1
+            self._dispatch(registry)
+        self._finish(future, timing, started)
+
+    def _finish(self, future: Future, timing: Dict[str, Any], started: float):
+        elapsed = time.perf_counter() - started
+        timing['seconds'] = round(elapsed, 3)
+        image, docker_host = timing['image'], timing['dockerHost']
+        if timing['status'] != 'present':
+            IMAGE_PULL_SECONDS.observe(elapsed, registry=timing['registry'], status=timing['status'])
+            log = logger.info if timing['status'] == 'pulled' else logger.warning
+            log('Pre-pull of %s on %s %s in %.1fs', image, docker_host, timing['status'], elapsed)
+        with self._lock:
+            self._timings.append(timing)
+        future.set_result(timing)
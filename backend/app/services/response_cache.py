@@ -0,0 +1,88 @@
+"""
+Response Cache for DockFlow POC
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+
+class ResponseCache:
+    """Bounded LRU cache of serialized responses
+
+    Entries are keyed by ETag, so a changed resource is never served from
+    the cache; tags let writers drop entries that became useless early.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[str, Tuple[bytes, Dict[str, str], Tuple[str, ...]]]' = OrderedDict()
+        self._tags: Dict[str, Set[str]] = {}
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls) -> 'ResponseCache':
+        """Build a cache sized from environment variables"""
+        return cls(
+            max_entries=int(os.getenv('RESPONSE_CACHE_SIZE', 1024)),
+            max_bytes=int(os.getenv('RESPONSE_CACHE_BYTES', 32 * 1024 * 1024))
+        )
+
+    def get(self, key: str) -> Optional[Tuple[bytes, Dict[str, str]]]:
+        """Cached body and headers, marking the entry as recently used"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], entry[1]
+
+    def put(self, key: str, body: bytes, headers: Dict[str, str], tags: Iterable[str] = ()):
+        """Cache a response body, evicting the least recently used ones"""
+        if len(body) > self.max_bytes:
+            return
+        tags = tuple(tags)
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (body, headers, tags)
+            self._bytes += len(body)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, tag: str):
+        """Drop every entry carrying a tag"""
+        with self._lock:
+            for key in list(self._tags.get(tag, ())):
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Get cache statistics"""
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes, 'hits': self.hits, 'misses': self.misses}
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= len(entry[0])
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
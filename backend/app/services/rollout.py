@@ -0,0 +1,60 @@
+"""
+Multi-host Rollout for DockFlow POC
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+
+
+def _deploy_target(deploy: Callable[[Dict[str, Any]], Dict[str, Any]], target: Dict[str, Any]) -> Dict[str, Any]:
+    """Deploy one target, timing it and turning exceptions into failures"""
+    started = time.monotonic()
+    try:
+        result = deploy(target)
+    except Exception as e:
+        result = {'success': False, 'message': f'Unexpected error: {str(e)}', 'error': str(e)}
+    return {
+        **target,
+        **result,
+        'duration_ms': round((time.monotonic() - started) * 1000)
+    }
+
+
+def rollout(targets: List[Dict[str, Any]], deploy: Callable[[Dict[str, Any]], Dict[str, Any]],
+            parallelism: int = 4, batch_size: int = 0, canary: int = 1) -> Dict[str, Any]:
+    """Deploy to many targets, canaries first and then the rest in batches
+
+    Up to `parallelism` targets of a batch are deployed at the same time.
+    A failure stops the rollout after the batch it happened in; the
+    remaining targets are reported as skipped.
+    """
+    parallelism = max(1, parallelism)
+    batch_size = batch_size if batch_size > 0 else parallelism
+    canary = min(max(0, canary), len(targets)) if len(targets) > 1 else 0
+
+    batches = []
+    if canary:
+        batches.append(targets[:canary])
+    rest = targets[canary:]
+    batches += [rest[i:i + batch_size] for i in range(0, len(rest), batch_size)]
+
+    results = []
+    failed = False
+    with ThreadPoolExecutor(max_workers=min(parallelism, max(len(targets), 1))) as executor:
+        for batch in batches:
+            if failed:
+                results += [{**target, 'success': False, 'skipped': True, 'message': 'Skipped after a failed batch'}
+                            for target in batch]
+                continue
+
+            batch_results = list(executor.map(lambda target: _deploy_target(deploy, target), batch))
+            results += batch_results
+            failed = not all(result['success'] for result in batch_results)
+
+    succeeded = sum(1 for result in results if result['success'])
+    return {
+        'success': succeeded == len(results),
+        'message': f'Deployed to {succeeded} of {len(results)} hosts',
+        'hosts': results
+    }
@@ -0,0 +1,115 @@
+"""
+GitOps Worker for DockFlow POC
+"""
+
+import logging
+import os
+import time
+from typing import Any, Dict, List, Tuple
+
+import click
+from flask.cli import AppGroup
+
+from app import db
+from app.controllers.applications import deployment_queue, deployment_recorder, deployment_service
+from app.models.application import Application
+from app.services.deployment_queue import DeploymentJob, QueueFullError
+from app.services.gitops_service import GitOpsReconciler, hold_checkout, release_checkout
+
+logger = logging.getLogger(__name__)
+
+gitops_cli = AppGroup('gitops', help='Redeploy applications when their repository branch moves.')
+
+# Per application, the revision being deployed and its job
+_deploying: Dict[str, Tuple[str, DeploymentJob]] = {}
+
+
+def list_targets() -> List[Dict[str, Any]]:
+    """Applications tracking a repository, with the revision they run"""
+    rows = db.session.query(
+        Application.id,
+        Application.repository_url,
+        Application.repository_branch,
+        Application.repository_revision
+    ).filter(Application.repository_url.isnot(None), Application.repository_url != '')
+    targets = [
+        {'id': app_id, 'url': url, 'branch': branch, 'revision': revision}
+        for app_id, url, branch, revision in rows
+    ]
+    # Only reads were made, don't keep a transaction open between polls
+    db.session.rollback()
+    return targets
+
+
+def redeploy(target: Dict[str, Any], revision: str, checkout: str):
+    """Queue the deployment of an application at a new revision
+
+    The deployment records the revision once it succeeds, until then
+    every poll sees the branch as moved: a revision still being deployed
+    is left alone, a failed one is deployed again.
+    """
+    deploying = _deploying.get(target['id'])
+    if deploying and deploying[0] == revision and deploying[1].status in ('queued', 'running'):
+        return
+
+    app = db.session.get(Application, target['id'])
+    if not app:
+        return
+
+    compose_file = os.path.normpath(os.path.join(checkout, app.compose_file or 'docker-compose.yml'))
+    if os.path.commonpath([checkout, compose_file]) != checkout:
+        logger.warning('Compose file %s of %s is outside its repository', app.compose_file, app.name)
+        return
+
+    # Pulls run while the deployment waits in the queue
+    deployment_service.prepull(compose_file, [env['dockerHost'] for env in app.get_environments()])
+    # The checkout is not pruned before the deployment is done with it
+    hold_checkout(checkout)
+    try:
+        job = deployment_service.enqueue(app, compose_file=compose_file, revision=revision)
+    except QueueFullError:
+        release_checkout(checkout)
+        # The revision is not recorded, so the next poll tries again
+        logger.warning('Deployment queue full, %s stays at %s', app.name, app.repository_revision)
+        return
+    except Exception:
+        release_checkout(checkout)
+        raise
+    job.add_done_callback(lambda job: release_checkout(checkout))
+
+    _deploying[app.id] = (revision, job)
+    logger.info('Deploying %s at %s (job %s)', app.name, revision[:12], job.id)
+
+
+def _wait_for_deployments():
+    """Block until queued deployments have finished and been recorded"""
+    while True:
+        stats = deployment_queue.stats()
+        if not stats['pending'] and not stats['running']:
+            break
+        time.sleep(0.2)
+    deployment_recorder.flush()
+
+
+@gitops_cli.command('run')
+def run():
+    """Poll repositories and redeploy changed applications until interrupted"""
+    reconciler = GitOpsReconciler.from_env(list_targets, redeploy)
+    try:
+        reconciler.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        reconciler.close()
+
+
+@gitops_cli.command('once')
+def once():
+    """Poll every repository once and wait for the resulting deployments"""
+    reconciler = GitOpsReconciler.from_env(list_targets, redeploy)
+    try:
+        changed = reconciler.poll()
+    finally:
+        reconciler.close()
+    _wait_for_deployments()
+    click.echo(f'Redeployed {len(changed)} applications')
@@ -0,0 +1,12 @@
+"""
+DockFlow POC - ASGI Entry Point
+"""
+
+import os
+
+from app import create_app
+from app.controllers.asgi import ASGIApplication
+
+# Served by an ASGI server, e.g. `uvicorn asgi:application`; status reads and
+# event streams run on its event loop, other routes on worker threads
+application = ASGIApplication(create_app(os.getenv('FLASK_ENV', 'production')))
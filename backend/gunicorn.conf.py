@@ -0,0 +1,37 @@
+"""
+Gunicorn Configuration for DockFlow POC
+"""
+
+import multiprocessing
+import os
+
+bind = os.getenv('GUNICORN_BIND', f"0.0.0.0:{os.getenv('PORT', 8000)}")
+
+# Jobs are stored in the database and event streams poll it, so any worker
+# can answer for a deployment queued by another one
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gthread'
+# Event streams hold a thread for as long as the client stays connected
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+
+# Import the application once in the master, workers are forked from it
+preload_app = os.getenv('GUNICORN_PRELOAD', 'true').lower() in ('1', 'true')
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+# An empty GUNICORN_ACCESS_LOG turns access logging off
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-') or None
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+
+def post_fork(server, worker):
+    """Don't share database connections opened by the master with workers"""
+    from app import db
+
+    with server.app.wsgi().app_context():
+        # The primary and the read replica bind, if any
+        for engine in db.engines.values():
+            engine.dispose(close=False)
@@ -0,0 +1,11 @@
+"""
+DockFlow POC - WSGI Entry Point
+"""
+
+import os
+
+from app import create_app
+
+# Served by gunicorn, see gunicorn.conf.py; the schema is created with
+# `flask db upgrade` beforehand
+app = create_app(os.getenv('FLASK_ENV', 'production'))
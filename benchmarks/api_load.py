@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+API Load Benchmark for DockFlow POC
+
+Starts the API on SQLite (default) or the given database, with a fake
+Docker backend standing in for the docker CLI or the daemon socket (see
+fake_docker.py). It seeds applications, then drives the list, get,
+status and deploy endpoints for a fixed time at each concurrency level.
+It reports throughput, p50/p90/p99 latency, errors and server memory,
+and writes the results as JSON named after the commit, so runs of
+different commits can be compared:
+
+    python benchmarks/api_load.py --concurrency 1,8,32 --duration 10
+    python benchmarks/api_load.py --docker socket --database-url postgresql://localhost/dockflow_bench
+    python benchmarks/api_load.py --compare benchmarks/results/20260101T000000Z-abc1234.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import requests
+
+from cold_start import BACKEND, SERVERS, wait_until_ready
+from fake_docker import FakeEngine, install_cli
+
+RESULTS = Path(__file__).resolve().parent / "results"
+
+ENDPOINTS = {
+    "list": lambda session, url, app_id: session.get(f"{url}/api/v1/applications?limit=50", timeout=30),
+    "get": lambda session, url, app_id: session.get(f"{url}/api/v1/applications/{app_id}", timeout=30),
+    "status": lambda session, url, app_id: session.get(f"{url}/api/v1/applications/{app_id}/status", timeout=30),
+    "deploy": lambda session, url, app_id: session.post(f"{url}/api/v1/applications/{app_id}/deploy", timeout=30),
+}
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of sorted values"""
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, round(q / 100 * len(values)) - 1))]
+
+
+def latency_summary(latencies):
+    """Milliseconds at the usual percentiles"""
+    latencies = sorted(latencies)
+    return {
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else None,
+        **{f"p{q}_ms": round(percentile(latencies, q) * 1000, 2) if latencies else None for q in (50, 90, 99)},
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else None,
+    }
+
+
+def process_tree(pid):
+    """A process and all of its descendants"""
+    pids, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        pids.append(current)
+        for task in Path(f"/proc/{current}/task").glob("*"):
+            try:
+                pending += [int(child) for child in (task / "children").read_text().split()]
+            except OSError:
+                pass
+    return pids
+
+
+def rss_mb(pid):
+    """Resident memory of a process tree (gunicorn master and workers) in MiB
+
+    docker commands the server runs (the fake CLI) are not counted.
+    """
+    total = 0
+    for current in process_tree(pid):
+        try:
+            if any(arg.endswith(b"/docker") for arg in Path(f"/proc/{current}/cmdline").read_bytes().split(b"\0")):
+                continue
+            for line in Path(f"/proc/{current}/status").read_text().splitlines():
+                if line.startswith("VmRSS:"):
+                    total += int(line.split()[1])
+        except OSError:
+            pass
+    return round(total / 1024, 1)
+
+
+class MemorySampler(threading.Thread):
+    """Peak resident memory of the server while a load runs"""
+
+    def __init__(self, pid, interval=0.2):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0.0
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.is_set():
+            self.peak = max(self.peak, rss_mb(self.pid))
+            self._stopped.wait(self.interval)
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+        self.peak = max(self.peak, rss_mb(self.pid))
+        return self.peak
+
+
+def drive(url, endpoint, app_ids, duration, concurrency, seed):
+    """Loop concurrent clients on an endpoint, returning latencies, errors and responses"""
+    request = ENDPOINTS[endpoint]
+    latencies, errors, bodies = [], [], []
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client(index):
+        session = requests.Session()
+        rng = random.Random(seed * 1000 + index)
+        own_latencies, own_errors, own_bodies = [], 0, []
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                response = request(session, url, rng.choice(app_ids))
+                elapsed = time.perf_counter() - started
+                if response.ok:
+                    own_latencies.append(elapsed)
+                    if endpoint == "deploy":
+                        own_bodies.append(response.json())
+                else:
+                    own_errors += 1
+            except requests.exceptions.RequestException:
+                own_errors += 1
+        with lock:
+            latencies.extend(own_latencies)
+            errors.append(own_errors)
+            bodies.extend(own_bodies)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, sum(errors), bodies, time.monotonic() - started
+
+
+def wait_for_deployments(url, jobs, since, timeout):
+    """Wait for the deployments of queued jobs to be recorded, returning how long that took and them
+
+    Jobs only exist in the worker process that queued them, so completion
+    is read from the deployments recorded for each application.
+    """
+    expected = {}
+    for app_id, _ in jobs:
+        expected[app_id] = expected.get(app_id, 0) + 1
+
+    started = time.monotonic()
+    session = requests.Session()
+    recorded = {}
+    while time.monotonic() - started < timeout:
+        for app_id, count in expected.items():
+            if len(recorded.get(app_id, ())) < count:
+                recorded[app_id] = [
+                    deployment for deployment in
+                    session.get(f"{url}/api/v1/applications/{app_id}/deployments", timeout=30).json()
+                    if deployment["started_at"] >= since
+                ]
+        missing = sum(max(0, count - len(recorded.get(app_id, ()))) for app_id, count in expected.items())
+        if not missing:
+            break
+        time.sleep(0.2)
+    deployments = [deployment for app_deployments in recorded.values() for deployment in app_deployments]
+    return time.monotonic() - started, missing, deployments
+
+
+def seed_applications(url, count, compose_ratio, tmp):
+    """Bulk import applications, part of them deployed from a compose file"""
+    compose_file = Path(tmp) / "docker-compose.yml"
+    compose_file.write_text("services:\n  web:\n    image: nginx:alpine\n  cache:\n    image: redis:7\n")
+    rows = []
+    for i in range(count):
+        row = {"name": f"bench-{i}", "namespace": f"bench-{i % 10}"}
+        if i < count * compose_ratio:
+            row["docker"] = {"composeFile": str(compose_file)}
+        rows.append(json.dumps(row))
+    response = requests.post(
+        f"{url}/api/v1/applications/bulk", data="\n".join(rows).encode(),
+        headers={"Content-Type": "application/x-ndjson"}, timeout=120
+    )
+    response.raise_for_status()
+    results = [json.loads(line) for line in response.text.splitlines()]
+    return [result["id"] for result in results if result.get("status") == "created"]
+
+
+def start_server(args, tmp):
+    """Start the API with the fake Docker backend, returning its process, fake daemon and URL"""
+    database_url = args.database_url or f"sqlite:///{tmp}/bench.db"
+    bin_dir = Path(tmp) / "bin"
+    bin_dir.mkdir()
+    install_cli(bin_dir, args.docker_latency)
+
+    env = {
+        **os.environ,
+        **SERVERS[args.server]["env"],
+        "DATABASE_URL": database_url,
+        "PORT": str(args.port),
+        "PATH": f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}",
+        "GUNICORN_WORKERS": str(args.workers),
+        "GUNICORN_THREADS": str(args.threads),
+        "FLASK_DEBUG": "false",
+    }
+    engine = None
+    if args.docker == "socket":
+        engine = FakeEngine(Path(tmp) / "docker.sock", args.docker_latency).start()
+        env.update(DOCKER_BACKEND="auto", DOCKER_HOST=engine.docker_host)
+    else:
+        env.update(DOCKER_BACKEND="cli", DOCKER_HOST="unix:///var/run/docker.sock")
+
+    if args.server == "gunicorn":
+        # Production startup expects the schema to be migrated already
+        subprocess.run(
+            [sys.executable, "-m", "flask", "db", "upgrade"], cwd=BACKEND, check=True,
+            env={**env, "FLASK_APP": "wsgi.py"}, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+    process = subprocess.Popen(
+        SERVERS[args.server]["command"], cwd=BACKEND, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True
+    )
+    return process, engine, f"http://127.0.0.1:{args.port}"
+
+
+def git_revision():
+    try:
+        revision = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(["git", "diff", "--quiet", "HEAD"], cwd=BACKEND).returncode != 0
+        return revision + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_benchmark(args):
+    results = {
+        "meta": {
+            "revision": git_revision(),
+            "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "server": args.server,
+            "database": (args.database_url or "sqlite").split(":", 1)[0],
+            "docker": args.docker,
+            "docker_latency": args.docker_latency,
+            "applications": args.applications,
+            "duration": args.duration,
+            "concurrency": args.concurrency,
+        },
+        "endpoints": {},
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        process, engine, url = start_server(args, tmp)
+        try:
+            cold_start = wait_until_ready(url, process)
+            if cold_start is None:
+                raise SystemExit("The API server did not start")
+            results["meta"]["cold_start_seconds"] = round(cold_start, 3)
+            results["memory"] = {"startup_mb": rss_mb(process.pid)}
+
+            app_ids = seed_applications(url, args.applications, args.compose_ratio, tmp)
+            results["memory"]["seeded_mb"] = rss_mb(process.pid)
+
+            for endpoint in args.endpoints:
+                for concurrency in args.concurrency:
+                    sampler = MemorySampler(process.pid)
+                    sampler.start()
+                    since = datetime.utcnow().isoformat()
+                    latencies, errors, bodies, elapsed = drive(
+                        url, endpoint, app_ids, args.duration, concurrency, args.seed
+                    )
+                    run = {
+                        "requests": len(latencies),
+                        "errors": errors,
+                        "requests_per_second": round(len(latencies) / elapsed, 1),
+                        **latency_summary(latencies),
+                    }
+                    if endpoint == "deploy":
+                        jobs = {(body["id"], body["job"]["id"]) for body in bodies}
+                        drain, missing, deployments = wait_for_deployments(url, jobs, since, args.deploy_timeout)
+                        run["deployments"] = {
+                            "jobs": len(jobs),
+                            "coalesced_requests": len(bodies) - len(jobs),
+                            "recorded": len(deployments),
+                            "missing": missing,
+                            "failed": sum(1 for deployment in deployments if deployment["status"] != "succeeded"),
+                            "drain_seconds": round(drain, 2),
+                            **latency_summary([deployment["duration_ms"] / 1000 for deployment in deployments]),
+                        }
+                    run["peak_rss_mb"] = sampler.stop()
+                    results["endpoints"].setdefault(endpoint, {})[str(concurrency)] = run
+                    print(f"{endpoint:>7} c={concurrency:<4} {run['requests_per_second']:>9} req/s  "
+                          f"p50 {run['p50_ms']} ms  p99 {run['p99_ms']} ms  errors {errors}  "
+                          f"rss {run['peak_rss_mb']} MiB", file=sys.stderr)
+            results["memory"]["final_mb"] = rss_mb(process.pid)
+        finally:
+            if process.poll() is None:
+                os.killpg(process.pid, signal.SIGTERM)
+                process.wait(timeout=30)
+            if engine:
+                engine.stop()
+    return results
+
+
+def compare(results, baseline, max_regression):
+    """Print changes against an earlier run, returning the regressions past the threshold"""
+    regressions = []
+    print(f"\nAgainst {baseline['meta']['revision']} ({baseline['meta']['started_at']}):")
+    for endpoint, runs in results["endpoints"].items():
+        for concurrency, run in runs.items():
+            before = baseline.get("endpoints", {}).get(endpoint, {}).get(concurrency)
+            if not before or not before.get("p99_ms") or not run.get("p99_ms"):
+                continue
+            throughput = run["requests_per_second"] / before["requests_per_second"] - 1
+            p99 = run["p99_ms"] / before["p99_ms"] - 1
+            flag = ""
+            if throughput < -max_regression or p99 > max_regression:
+                regressions.append(f"{endpoint} c={concurrency}")
+                flag = "  REGRESSION"
+            print(f"{endpoint:>7} c={concurrency:<4} req/s {throughput:+.1%}  p99 {p99:+.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--server", choices=sorted(SERVERS), default="gunicorn")
+    parser.add_argument("--database-url", help="defaults to a fresh SQLite database")
+    parser.add_argument("--docker", choices=("cli", "socket"), default="cli",
+                        help="fake the docker CLI only, or the daemon socket as well")
+    parser.add_argument("--docker-latency", type=float, default=0.05,
+                        help="seconds the fake daemon spends in compose up, run, create and pull")
+    parser.add_argument("--endpoints", type=lambda value: value.split(","), default=list(ENDPOINTS),
+                        help=f"comma separated, default {','.join(ENDPOINTS)}")
+    parser.add_argument("--concurrency", type=lambda value: [int(c) for c in value.split(",")], default=[1, 8, 32],
+                        help="comma separated levels, default 1,8,32")
+    parser.add_argument("--duration", type=float, default=5, help="seconds of load per endpoint and level")
+    parser.add_argument("--applications", type=int, default=500, help="applications seeded before the runs")
+    parser.add_argument("--compose-ratio", type=float, default=0.5,
+                        help="share of the applications deployed from a compose file")
+    parser.add_argument("--deploy-timeout", type=float, default=120,
+                        help="seconds to wait for queued deployments to finish after a deploy run")
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn workers")
+    parser.add_argument("--threads", type=int, default=8, help="gunicorn threads per worker")
+    parser.add_argument("--port", type=int, default=8200)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", type=Path, help="defaults to benchmarks/results/<time>-<revision>.json")
+    parser.add_argument("--compare", type=Path, help="earlier results to compare with")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="fail when throughput drops or p99 grows by more than this fraction")
+    args = parser.parse_args()
+    unknown = [endpoint for endpoint in args.endpoints if endpoint not in ENDPOINTS]
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(unknown)}")
+
+    results = run_benchmark(args)
+
+    output = args.output or RESULTS / (
+        f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}-{results['meta']['revision']}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2) + "\n")
+    print(f"Results written to {output}", file=sys.stderr)
+
+    if args.compare:
+        regressions = compare(results, json.loads(args.compare.read_text()), args.max_regression)
+        if regressions:
+            print(f"Regressed: {', '.join(regressions)}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Cold Start Benchmark for DockFlow POC
+
+Compares the development server (python app.py) with gunicorn (wsgi.py):
+time from process start to the first successful /health response, then
+requests per second on /health and GET /api/v1/applications.
+
+    python benchmarks/cold_start.py --duration 10 --concurrency 16
+"""
+
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import requests
+
+BACKEND = Path(__file__).resolve().parent.parent / "backend"
+
+SERVERS = {
+    "dev": {
+        "command": [sys.executable, "app.py"],
+        "env": {"FLASK_ENV": "development", "DB_CREATE_ALL": "true"},
+    },
+    "gunicorn": {
+        "command": [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "wsgi:app"],
+        "env": {"FLASK_ENV": "production", "DB_CREATE_ALL": "false", "GUNICORN_ACCESS_LOG": ""},
+    },
+}
+
+
+def wait_until_ready(url, process, timeout=60):
+    """Seconds until /health answers, None if the server never came up"""
+    started = time.monotonic()
+    while time.monotonic() - started < timeout:
+        if process.poll() is not None:
+            return None
+        try:
+            if requests.get(f"{url}/health", timeout=1).status_code == 200:
+                return time.monotonic() - started
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.01)
+    return None
+
+
+def measure_throughput(url, duration, concurrency):
+    """Requests per second of concurrent clients looping on an endpoint"""
+    counts = []
+    errors = []
+    deadline = time.monotonic() + duration
+
+    def client():
+        session = requests.Session()
+        count = failed = 0
+        while time.monotonic() < deadline:
+            try:
+                response = session.get(url, timeout=10)
+                if response.ok:
+                    count += 1
+                else:
+                    failed += 1
+            except requests.exceptions.RequestException:
+                failed += 1
+        counts.append(count)
+        errors.append(failed)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {"requests_per_second": round(sum(counts) / duration, 1), "errors": sum(errors)}
+
+
+def run_server(name, args, database_url):
+    server = SERVERS[name]
+    env = {
+        **os.environ,
+        **server["env"],
+        "DATABASE_URL": database_url,
+        "PORT": str(args.port),
+        "DOCKER_BACKEND": "cli",
+        "GUNICORN_WORKERS": str(args.workers),
+        "GUNICORN_THREADS": str(args.threads),
+    }
+    process = subprocess.Popen(
+        server["command"], cwd=BACKEND, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True
+    )
+    url = f"http://127.0.0.1:{args.port}"
+    try:
+        cold_start = wait_until_ready(url, process)
+        if cold_start is None:
+            return {"error": "server did not start"}
+
+        # Some data so the list endpoint reads from the database
+        for i in range(20):
+            requests.post(f"{url}/api/v1/applications", json={"name": f"bench-{name}-{i}"}, timeout=10)
+
+        return {
+            "cold_start_seconds": round(cold_start, 3),
+            "health": measure_throughput(f"{url}/health", args.duration, args.concurrency),
+            "applications": measure_throughput(
+                f"{url}/api/v1/applications?limit=20", args.duration, args.concurrency
+            ),
+        }
+    finally:
+        # The dev server reloader and gunicorn both fork, stop the whole group
+        if process.poll() is None:
+            os.killpg(process.pid, signal.SIGTERM)
+            process.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--servers", default="dev,gunicorn", help="comma separated: dev, gunicorn")
+    parser.add_argument("--duration", type=float, default=5, help="seconds of load per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn workers")
+    parser.add_argument("--threads", type=int, default=8, help="gunicorn threads per worker")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--database-url", help="defaults to a fresh SQLite database per server")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in args.servers.split(","):
+            database_url = args.database_url or f"sqlite:///{tmp}/{name}.db"
+            if name == "gunicorn":
+                # Production startup expects the schema to be migrated already
+                subprocess.run(
+                    [sys.executable, "-m", "flask", "db", "upgrade"], cwd=BACKEND, check=True,
+                    env={**os.environ, "FLASK_APP": "wsgi.py", "DATABASE_URL": database_url,
+                         "DOCKER_BACKEND": "cli"},
+                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+                )
+            results[name] = run_server(name, args, database_url)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Fake Docker Backend for DockFlow POC benchmarks
+
+Stands in for a Docker daemon so the API can be loaded without one:
+
+- a `docker` executable answering the CLI calls DockerService makes,
+  `docker compose up` included, to put first on PATH
+- an Engine API subset served on a unix socket, to use as DOCKER_HOST
+
+Both keep containers in memory only and sleep `latency` seconds in the
+calls that would do real work (compose up, run, create, pull).
+"""
+
+import json
+import queue
+import socketserver
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+CLI_SCRIPT = '''#!{python}
+import json, sys, time
+
+LATENCY = {latency!r}
+args = sys.argv[1:]
+if args[:1] == ["compose"] and "up" in args:
+    time.sleep(LATENCY)
+    print("Container started")
+elif args[:1] in (["run"], ["pull"]):
+    time.sleep(LATENCY)
+    print("0123456789abcdef0123456789abcdef")
+elif args[:2] == ["image", "inspect"]:
+    print("sha256:" + "0" * 64)
+elif args[:1] == ["inspect"]:
+    print("{{}}" if "Ports" in " ".join(args) else json.dumps({{"Running": True, "ExitCode": 0}}))
+elif args[:1] == ["version"]:
+    print("24.0.0-fake")
+elif args[:2] == ["ps", "-a"]:
+    pass
+'''
+
+
+def install_cli(directory, latency=0.0):
+    """Write the fake `docker` executable into a directory and return its path"""
+    path = Path(directory) / "docker"
+    path.write_text(CLI_SCRIPT.format(python=sys.executable, latency=latency))
+    path.chmod(0o755)
+    return path
+
+
+class FakeEngineHandler(BaseHTTPRequestHandler):
+    """Answers the Engine API calls DockerService and its caches make"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body=None):
+        payload = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _events(self):
+        subscriber = queue.Queue()
+        with self.server.lock:
+            self.server.subscribers.append(subscriber)
+        self.send_response(200)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        self.wfile.flush()
+        try:
+            while True:
+                event = subscriber.get()
+                if event is None:
+                    self.wfile.write(b"0\r\n\r\n")
+                    return
+                line = json.dumps(event).encode() + b"\n"
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+                self.wfile.flush()
+        except OSError:
+            pass
+        finally:
+            with self.server.lock:
+                self.server.subscribers.remove(subscriber)
+
+    def _handle(self):
+        url = urlparse(self.path)
+        parts = url.path.strip("/").split("/")
+        if parts and parts[0].startswith("v1."):
+            parts = parts[1:]
+        path = "/".join(parts)
+        query = parse_qs(url.query)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length)) if length else None
+        server = self.server
+
+        if path == "_ping":
+            self.send_response(200)
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"OK")
+        elif path == "events":
+            self._events()
+        elif path == "containers/json":
+            filters = json.loads(query.get("filters", ["{}"])[0])
+            with server.lock:
+                matches = [
+                    c for c in server.containers.values()
+                    if all(c["Id"].startswith(i) for i in filters.get("id", []))
+                    and all(n in c["Names"][0] for n in filters.get("name", []))
+                ]
+            self._reply(200, matches)
+        elif path == "containers/create":
+            time.sleep(server.latency)
+            name = query["name"][0]
+            container = {
+                "Id": uuid.uuid4().hex * 2,
+                "Names": [f"/{name}"],
+                "Image": body["Image"],
+                "Status": "Created",
+                "State": "created",
+                "Labels": body.get("Labels") or {},
+                "Ports": [],
+            }
+            with server.lock:
+                if name in server.containers:
+                    return self._reply(409, {"message": f"Conflict. The container name /{name} is already in use"})
+                server.containers[name] = container
+            server.publish("create", container["Id"])
+            self._reply(201, {"Id": container["Id"], "Warnings": []})
+        elif path.startswith("containers/"):
+            self._container(parts[1], parts[2] if len(parts) > 2 else "", query)
+        elif path == "images/create":
+            time.sleep(server.latency)
+            self._reply(200, {"status": "Downloaded newer image"})
+        elif path.startswith("images/"):
+            self._reply(200, {"Id": "sha256:" + "0" * 64})
+        elif path.startswith("networks"):
+            self._reply(200, {"Name": parts[-1]} if self.command == "GET" else {})
+        else:
+            self._reply(404, {"message": "page not found"})
+
+    def _container(self, name, action, query):
+        server = self.server
+        with server.lock:
+            key = next((k for k, c in server.containers.items() if name in (k, c["Id"])), None)
+            container = server.containers.get(key)
+            if container is not None and self.command == "DELETE":
+                del server.containers[key]
+            elif container is not None and action == "rename":
+                del server.containers[key]
+                container["Names"] = [f"/{query['name'][0]}"]
+                server.containers[query["name"][0]] = container
+            elif container is not None and action in ("start", "stop"):
+                container["Status"] = "Up 1 second" if action == "start" else "Exited (0) 1 second ago"
+                container["State"] = "running" if action == "start" else "exited"
+
+        if container is None:
+            return self._reply(404, {"message": f"No such container: {name}"})
+        if self.command == "DELETE":
+            server.publish("destroy", container["Id"])
+            return self._reply(204)
+        if action == "json":
+            return self._reply(200, {
+                "Id": container["Id"],
+                "State": {"Running": container["State"] == "running", "ExitCode": 0},
+                "NetworkSettings": {"Ports": {}},
+            })
+        if action in ("start", "stop"):
+            server.publish(action, container["Id"])
+        self._reply(204)
+
+    do_GET = do_POST = do_DELETE = _handle
+
+
+class FakeEngine(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Engine API stand-in listening on a unix socket"""
+
+    daemon_threads = True
+
+    def __init__(self, path, latency=0.0):
+        super().__init__(str(path), FakeEngineHandler)
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.containers = {}
+        self.subscribers = []
+
+    @property
+    def docker_host(self):
+        return f"unix://{self.server_address}"
+
+    def publish(self, action, container_id):
+        """Send a container event to every events stream"""
+        event = {"Type": "container", "Action": action, "id": container_id, "Actor": {"ID": container_id}}
+        with self.lock:
+            for subscriber in self.subscribers:
+                subscriber.put(event)
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="fake-docker", daemon=True).start()
+        return self
+
+    def stop(self):
+        with self.lock:
+            for subscriber in self.subscribers:
+                subscriber.put(None)
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,240 @@
+import json
+import queue
+import socketserver
+import struct
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "backend"))
+
+
+class FakeDockerHandler(BaseHTTPRequestHandler):
+    """Answers a small subset of the Docker Engine API"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def _reply(self, status, body=None):
+        payload = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _handle(self):
+        url = urlparse(self.path)
+        path = url.path.split("/", 2)[2]
+        query = parse_qs(url.query)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length)) if length else None
+        self.server.calls.append((self.command, "/" + path, query, body))
+
+        containers = self.server.containers
+        if path == "_ping":
+            payload = b"OK"
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        elif path == "containers/json":
+            filters = json.loads(query.get("filters", ["{}"])[0])
+            matches = [
+                c for c in containers.values()
+                if all(c["Id"].startswith(i) for i in filters.get("id", []))
+                and all(n in c["Names"][0] for n in filters.get("name", []))
+                and all(
+                    label.partition("=")[::2] in (c.get("Labels") or {}).items()
+                    for label in filters.get("label", [])
+                )
+            ]
+            self._reply(200, matches)
+        elif path == "events":
+            self.send_response(200)
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            self.wfile.flush()
+            while True:
+                event = self.server.events.get()
+                if event is None:
+                    self.wfile.write(b"0\r\n\r\n")
+                    return
+                line = json.dumps(event).encode() + b"\n"
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+                self.wfile.flush()
+        elif path == "images/create":
+            time.sleep(self.server.pull_delay)
+            image = f"{query['fromImage'][0]}:{query.get('tag', ['latest'])[0]}"
+            if image in self.server.missing_images:
+                self._reply(200, {"error": f"manifest for {image} not found"})
+            else:
+                self.server.images.add(image)
+                self._reply(200, {"status": f"Downloaded newer image for {image}"})
+        elif path.startswith("images/") and path.endswith("/json"):
+            image = path[len("images/"):-len("/json")]
+            if image in self.server.images:
+                self._reply(200, {"Id": f"sha256:{image}"})
+            else:
+                self._reply(404, {"message": f"No such image: {image}"})
+        elif path == "containers/create" and self.server.fail_creates:
+            self._reply(500, {"message": "daemon is broken"})
+        elif path == "containers/create":
+            time.sleep(self.server.delay)
+            name = query["name"][0]
+            containers[name] = {
+                "Id": f"{name}-id-0123456789",
+                "Names": [f"/{name}"],
+                "Image": body["Image"],
+                "Status": "Created",
+                "Ports": [{"IP": "0.0.0.0", "PrivatePort": 80, "PublicPort": 8080, "Type": "tcp"}]
+            }
+            self._reply(201, {"Id": containers[name]["Id"], "Warnings": []})
+        elif path.startswith("containers/"):
+            name, _, action = path[len("containers/"):].partition("/")
+            key = next((k for k, c in containers.items() if name in (k, c["Id"])), None)
+            if key is None:
+                self._reply(404, {"message": f"No such container: {name}"})
+            elif self.command == "DELETE":
+                container = containers.pop(key)
+                for members in self.server.networks.values():
+                    members.pop(container["Id"], None)
+                self._reply(204)
+            elif action == "json":
+                self._reply(200, {
+                    "Id": containers[key]["Id"],
+                    "Config": {"Tty": containers[key].get("Tty", False)},
+                    "State": {"Running": True, "ExitCode": 0, **(
+                        {"Health": {"Status": self.server.health}} if self.server.health else {}
+                    )},
+                    "NetworkSettings": {"Ports": {"80/tcp": [{"HostIp": "0.0.0.0", "HostPort": "32768"}]}}
+                })
+            elif action == "logs":
+                self._stream_logs(key, query)
+            elif action == "rename":
+                container = containers.pop(key)
+                new_name = query["name"][0]
+                container["Names"] = [f"/{new_name}"]
+                containers[new_name] = container
+                self._reply(204)
+            else:
+                self._reply(204)
+        elif path == "networks/create":
+            self.server.networks.setdefault(body["Name"], {})
+            self._reply(201, {"Id": body["Name"]})
+        elif path.startswith("networks/"):
+            network, _, action = path[len("networks/"):].partition("/")
+            if network not in self.server.networks:
+                self._reply(404, {"message": f"network {network} not found"})
+            elif action == "connect" and self.server.fail_connects:
+                self._reply(500, {"message": "could not attach to network"})
+            elif action == "connect":
+                self.server.networks[network][body["Container"]] = body["EndpointConfig"]["Aliases"]
+                self._reply(200)
+            elif action == "disconnect":
+                container = containers.get(body["Container"], {}).get("Id", body["Container"])
+                if self.server.networks[network].pop(container, None) is None:
+                    self._reply(403, {"message": f"container {body['Container']} is not connected to {network}"})
+                else:
+                    self._reply(200)
+            else:
+                self._reply(200, {"Name": network})
+        else:
+            self._reply(404, {"message": "page not found"})
+
+    def _stream_logs(self, key, query):
+        """Stored log lines of a container, multiplexed unless it has a TTY"""
+        tty = self.server.containers[key].get("Tty", False)
+        lines = self.server.logs.get(key, [])
+        tail = query.get("tail", ["all"])[0]
+        if tail != "all":
+            lines = lines[len(lines) - int(tail):] if int(tail) else []
+        self.send_response(200)
+        self.send_header("Content-Type", "application/vnd.docker.raw-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def write(stream, line):
+            frame = line if tty else struct.pack(">BxxxI", stream, len(line)) + line
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(frame), frame))
+            self.wfile.flush()
+
+        try:
+            for stream, line in lines:
+                write(stream, line)
+            if query.get("follow") == ["1"]:
+                followed = self.server.followed.setdefault(key, queue.Queue())
+                while True:
+                    entry = followed.get()
+                    if entry is None:
+                        break
+                    write(*entry)
+            self.wfile.write(b"0\r\n\r\n")
+        except ConnectionError:
+            # The client stopped following
+            self.close_connection = True
+
+    do_GET = do_POST = do_DELETE = _handle
+
+
+class FakeDockerDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path):
+        super().__init__(str(path), FakeDockerHandler)
+        self.calls = []
+        self.containers = {}
+        self.connections = 0
+        self.events = queue.Queue()
+        self.fail_creates = False
+        self.fail_connects = False
+        self.delay = 0
+        self.images = set()
+        self.missing_images = set()
+        self.pull_delay = 0
+        self.networks = {}
+        self.health = None
+        self.logs = {}
+        self.followed = {}
+
+
+@pytest.fixture
+def start_fake_daemon(tmp_path):
+    """Factory starting fake Docker daemons on unix sockets"""
+    servers = []
+
+    def start(name="docker"):
+        server = FakeDockerDaemon(tmp_path / f"{name}.sock")
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.events.put(None)
+        for followed in server.followed.values():
+            followed.put(None)
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def fake_daemon(start_fake_daemon):
+    """Fake Docker daemon listening on a unix socket"""
+    return start_fake_daemon()
+
+
+@pytest.fixture
+def docker_host(fake_daemon):
+    return f"unix://{fake_daemon.server_address}"
@@ -0,0 +1,350 @@
+"""
+Unit tests for the asyncio Docker service and the ASGI application
+"""
+
+import asyncio
+import json
+import threading
+
+import pytest
+from flask import Flask, request
+
+from app import create_app, db
+from app.controllers import applications
+from app.controllers.asgi import ASGIApplication
+from app.models.application import Application
+from app.services.async_docker import AsyncDockerService
+from app.services.container_logs import LOG_STREAMS
+from app.services.docker_scheduler import DockerBusyError
+from app.services.docker_service import DockerService
+from app.services.event_bus import EventBus
+
+
+@pytest.fixture
+def asgi_app(tmp_path, monkeypatch, docker_host):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path}/dockflow.db")
+    monkeypatch.setenv("DB_CREATE_ALL", "true")
+    monkeypatch.setenv("DOCKER_HOST", docker_host)
+    monkeypatch.setenv("CONTAINER_STATE_CACHE", "false")
+    monkeypatch.setattr(applications, "event_bus", EventBus())
+    return ASGIApplication(create_app("development"))
+
+
+async def call(app, method, path, query=b"", headers=(), body=b"", disconnect=None):
+    """Send one request to an ASGI application, returning status, headers and body"""
+    requests = [{"type": "http.request", "body": body, "more_body": False}]
+    response = {"status": None, "headers": {}, "body": b""}
+
+    async def receive():
+        if requests:
+            return requests.pop(0)
+        await (disconnect.wait() if disconnect else asyncio.Event().wait())
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = {k.decode(): v.decode() for k, v in message["headers"]}
+        else:
+            response["body"] += message.get("body", b"")
+
+    scope = {
+        "type": "http", "method": method, "path": path, "query_string": query,
+        "headers": [(b"content-type", b"application/json"), *headers],
+        "server": ("testserver", 80), "client": ("127.0.0.1", 1234), "scheme": "http",
+    }
+    await app(scope, receive, send)
+    return response
+
+
+def create_application(app, name):
+    response = asyncio.run(call(app, "POST", "/api/v1/applications", body=json.dumps({"name": name}).encode()))
+    assert response["status"] == 201
+    return json.loads(response["body"])["id"]
+
+
+def test_async_service_reads_container_status(fake_daemon, docker_host, monkeypatch):
+    monkeypatch.setenv("CONTAINER_STATE_CACHE", "false")
+    assert DockerService(docker_host).deploy_container("web", "nginx:alpine")["success"]
+    fake_daemon.calls.clear()
+    fake_daemon.connections = 0
+
+    async def statuses():
+        service = AsyncDockerService(docker_host, max_concurrency=4)
+        try:
+            results = await asyncio.gather(*(service.get_container_status("web") for _ in range(20)))
+            grouped = await service.list_containers_by_app()
+        finally:
+            await service.close()
+        return results, grouped
+
+    results, grouped = asyncio.run(statuses())
+    assert all(result == results[0] for result in results)
+    assert results[0][0]["name"] == "web" and results[0][0]["image"] == "nginx:alpine"
+    assert grouped["web"] == results[0]
+    assert len(fake_daemon.calls) == 21
+    # Connections are kept open and shared by the operations
+    assert fake_daemon.connections <= 4
+
+
+def test_async_service_turns_callers_away_when_the_queue_is_full(fake_daemon, docker_host):
+    fake_daemon.delay = 0.2
+
+    async def statuses():
+        service = AsyncDockerService(docker_host, max_concurrency=1, max_queued=1)
+        try:
+            return await asyncio.gather(
+                *(service.get_container_status("web") for _ in range(3)), return_exceptions=True
+            )
+        finally:
+            await service.close()
+
+    results = asyncio.run(statuses())
+    assert sum(isinstance(result, DockerBusyError) for result in results) == 1
+
+
+def test_subscription_wakes_up_an_event_loop():
+    bus = EventBus()
+
+    async def wait():
+        with bus.subscribe("app") as subscription:
+            assert await subscription.get_async(timeout=0.05) is None
+            threading.Timer(0.05, bus.publish, ("app", "status", {"status": "running"})).start()
+            return await subscription.get_async(timeout=5)
+
+    assert asyncio.run(wait()) == {"event": "status", "data": {"status": "running"}}
+
+
+def test_status_endpoints_run_on_the_event_loop(asgi_app, fake_daemon, docker_host):
+    app_id = create_application(asgi_app, "demo")
+    assert DockerService(docker_host).deploy_container("demo", "nginx:alpine")["success"]
+
+    response = asyncio.run(call(asgi_app, "GET", f"/api/v1/applications/{app_id}/status"))
+    assert response["status"] == 200
+    status = json.loads(response["body"])
+    assert status["name"] == "demo"
+    assert [container["name"] for container in status["containers"]] == ["demo"]
+
+    response = asyncio.run(call(asgi_app, "GET", "/api/v1/applications/status",
+                                headers=[(b"accept", b"application/x-ndjson")]))
+    assert response["headers"]["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in response["body"].decode().splitlines()]
+    assert [(row["id"], len(row["containers"])) for row in rows] == [(app_id, 1)]
+
+    response = asyncio.run(call(asgi_app, "GET", "/api/v1/applications/missing/status"))
+    assert response["status"] == 404
+
+
+def test_bulk_status_lists_containers_of_every_docker_host(asgi_app, docker_host, start_fake_daemon):
+    other_host = f"unix://{start_fake_daemon('other').server_address}"
+    local_id = create_application(asgi_app, "local")
+    response = asyncio.run(call(asgi_app, "POST", "/api/v1/applications", body=json.dumps(
+        {"name": "remote", "environments": [{"name": "production", "dockerHost": other_host}]}
+    ).encode()))
+    remote_id = json.loads(response["body"])["id"]
+    assert DockerService(docker_host).deploy_container("local", "nginx:alpine")["success"]
+    assert DockerService(other_host).deploy_container("remote", "nginx:alpine")["success"]
+    expected = {local_id: ["local"], remote_id: ["remote"]}
+
+    response = asyncio.run(call(asgi_app, "GET", "/api/v1/applications/status"))
+    rows = json.loads(response["body"])
+    assert {row["id"]: [c["name"] for c in row["containers"]] for row in rows} == expected
+
+    rows = asgi_app.flask_app.test_client().get("/api/v1/applications/status").get_json()
+    assert {row["id"]: [c["name"] for c in row["containers"]] for row in rows} == expected
+
+
+def test_bulk_status_is_paginated(asgi_app, fake_daemon):
+    app_ids = [create_application(asgi_app, name) for name in ("one", "two", "three")]
+
+    response = asyncio.run(call(asgi_app, "GET", "/api/v1/applications/status", query=b"limit=2"))
+    assert [row["id"] for row in json.loads(response["body"])] == app_ids[:2]
+    cursor = response["headers"]["x-next-cursor"]
+    assert response["headers"]["link"].startswith("</api/v1/applications/status?limit=2&cursor=")
+
+    response = asyncio.run(call(asgi_app, "GET", "/api/v1/applications/status",
+                                query=f"limit=2&cursor={cursor}".encode()))
+    assert [row["id"] for row in json.loads(response["body"])] == app_ids[2:]
+    assert "x-next-cursor" not in response["headers"]
+
+    response = asyncio.run(call(asgi_app, "GET", "/api/v1/applications/status", query=b"limit=0"))
+    assert response["status"] == 400
+
+
+def test_list_requests_reject_the_same_limits(asgi_app):
+    app_id = create_application(asgi_app, "demo")
+    client = asgi_app.flask_app.test_client()
+    paths = ["/api/v1/applications", "/api/v1/applications/status", f"/api/v1/applications/{app_id}/deployments"]
+
+    for path in paths:
+        assert client.get(f"{path}?limit=1").status_code == 200
+        for limit in ("0", "-1", "1001", "ten"):
+            response = client.get(f"{path}?limit={limit}")
+            assert response.status_code == 400, (path, limit)
+            assert response.get_json() == {"error": "limit must be between 1 and 1000"}
+
+
+def test_event_stream_ends_when_the_deployment_finishes(asgi_app):
+    app_id = create_application(asgi_app, "demo")
+
+    async def stream():
+        publish = lambda status: applications.event_bus.publish(app_id, "status", {"id": app_id, "status": status})
+        loop = asyncio.get_running_loop()
+        loop.call_later(0.1, publish, "deploying")
+        loop.call_later(0.2, publish, "running")
+        return await call(asgi_app, "GET", f"/api/v1/applications/{app_id}/events", query=b"until=finished")
+
+    response = asyncio.run(stream())
+    assert response["headers"]["content-type"].startswith("text/event-stream")
+    statuses = [json.loads(line[6:])["status"] for line in response["body"].decode().splitlines()
+                if line.startswith("data: ")]
+    assert statuses == ["created", "deploying", "running"]
+
+
+def test_event_stream_stops_when_the_client_disconnects(asgi_app):
+    app_id = create_application(asgi_app, "demo")
+
+    async def stream():
+        disconnect = asyncio.Event()
+        asyncio.get_running_loop().call_later(0.1, disconnect.set)
+        return await asyncio.wait_for(
+            call(asgi_app, "GET", f"/api/v1/applications/{app_id}/events", disconnect=disconnect), 5
+        )
+
+    response = asyncio.run(stream())
+    assert response["status"] == 200
+    assert b"event: status" in response["body"]
+
+
+def test_other_routes_are_served_by_flask(asgi_app):
+    response = asyncio.run(call(asgi_app, "GET", "/health"))
+    assert response["status"] == 200
+    assert json.loads(response["body"]) == {"status": "healthy"}
+
+    app_id = create_application(asgi_app, "demo")
+    response = asyncio.run(call(asgi_app, "GET", f"/api/v1/applications/{app_id}"))
+    assert json.loads(response["body"])["name"] == "demo"
+
+
+def test_followed_logs_stop_when_the_client_disconnects(asgi_app, fake_daemon):
+    app_id = create_application(asgi_app, "demo")
+    fake_daemon.containers["demo"] = {"Id": "demo-id-0123456789", "Names": ["/demo"], "Image": "nginx:alpine"}
+    fake_daemon.logs["demo"] = [(1, b"hello\n")]
+
+    async def stream():
+        disconnect = asyncio.Event()
+        asyncio.get_running_loop().call_later(0.2, disconnect.set)
+        # The container stays silent, the view is woken up by the disconnect
+        return await asyncio.wait_for(
+            call(asgi_app, "GET", f"/api/v1/applications/{app_id}/logs", query=b"follow=1", disconnect=disconnect), 5
+        )
+
+    response = asyncio.run(stream())
+    assert response["status"] == 200
+    assert response["body"] == b"hello\n"
+    assert LOG_STREAMS.samples() == ["dockflow_log_streams 0"]
+
+
+def test_flask_views_run_on_their_own_threads(asgi_app, monkeypatch):
+    threads = []
+    view = asgi_app.flask_app.view_functions["health.health_check"]
+    monkeypatch.setitem(asgi_app.flask_app.view_functions, "health.health_check",
+                        lambda: threads.append(threading.current_thread().name) or view())
+
+    assert asyncio.run(call(asgi_app, "GET", "/health"))["status"] == 200
+    assert threads[0].startswith("asgi-wsgi")
+
+
+def test_event_stream_sees_deployments_of_other_processes(asgi_app, monkeypatch):
+    app_id = create_application(asgi_app, "demo")
+    monkeypatch.setattr(applications, "EVENT_STREAM_POLL_INTERVAL", 0.05)
+
+    def finish():
+        # Written by another process: nothing is published on this event bus
+        with asgi_app.flask_app.app_context():
+            Application.query.filter_by(id=app_id).update({"status": "running"})
+            db.session.commit()
+
+    async def stream():
+        asyncio.get_running_loop().call_later(0.1, threading.Thread(target=finish).start)
+        return await asyncio.wait_for(
+            call(asgi_app, "GET", f"/api/v1/applications/{app_id}/events", query=b"until=finished"), 5
+        )
+
+    response = asyncio.run(stream())
+    statuses = [json.loads(line[6:])["status"] for line in response["body"].decode().splitlines()
+                if line.startswith("data: ")]
+    assert statuses == ["created", "running"]
+
+
+def test_request_bodies_are_streamed_to_flask_views():
+    flask_app = Flask(__name__)
+    events = []
+
+    @flask_app.route("/upload", methods=["POST"])
+    def upload():
+        size = 0
+        while chunk := request.stream.read(4):
+            events.append("read")
+            size += len(chunk)
+        return {"size": size}
+
+    chunks = [b"abcd"] * 8
+
+    async def receive():
+        await asyncio.sleep(0.01)
+        events.append("received")
+        chunk = chunks.pop(0)
+        return {"type": "http.request", "body": chunk, "more_body": bool(chunks)}
+
+    async def upload_chunked():
+        response = {"body": b""}
+
+        async def send(message):
+            response["body"] += message.get("body", b"")
+            response.setdefault("status", message.get("status"))
+
+        scope = {"type": "http", "method": "POST", "path": "/upload", "query_string": b"", "headers": []}
+        await ASGIApplication(flask_app)(scope, receive, send)
+        return response
+
+    response = asyncio.run(upload_chunked())
+    assert response["status"] == 200
+    assert json.loads(response["body"]) == {"size": 32}
+    # The view reads the first chunks before the client has sent the last ones
+    assert events.index("read") < len(events) - 1 - events[::-1].index("received")
+
+
+def test_cancelled_requests_let_their_flask_view_go():
+    flask_app = Flask(__name__)
+    closed = threading.Event()
+
+    @flask_app.route("/stream")
+    def stream():
+        def generate():
+            try:
+                while True:
+                    yield b"x" * 1024
+            finally:
+                closed.set()
+        return flask_app.response_class(generate())
+
+    async def request_then_cancel():
+        requests = [{"type": "http.request", "body": b"", "more_body": False}]
+
+        async def receive():
+            if requests:
+                return requests.pop()
+            await asyncio.Event().wait()
+
+        async def send(message):
+            # A client that stopped reading
+            await asyncio.Event().wait()
+
+        scope = {"type": "http", "method": "GET", "path": "/stream", "query_string": b"", "headers": []}
+        task = asyncio.ensure_future(ASGIApplication(flask_app)(scope, receive, send))
+        await asyncio.sleep(0.2)
+        task.cancel()
+        return await asyncio.get_running_loop().run_in_executor(None, closed.wait, 5)
+
+    assert asyncio.run(request_then_cancel())
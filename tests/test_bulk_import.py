@@ -0,0 +1,88 @@
+"""
+Unit tests for the bulk import of applications
+"""
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from app import create_app, db
+from app.models.application import Application
+from app.services.bulk_import import import_applications
+
+
+@pytest.fixture
+def flask_app(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path}/dockflow.db")
+    monkeypatch.setenv("DB_CREATE_ALL", "true")
+    app = create_app("development")
+    with app.app_context():
+        yield app
+
+
+def run(rows, upsert=False, batch_size=100):
+    return list(import_applications(enumerate(rows, 1), upsert=upsert, batch_size=batch_size))
+
+
+def stored():
+    db.session.expire_all()
+    return {(app.id, app.namespace, app.name, app.repository_branch) for app in Application.query}
+
+
+def test_rows_are_written_per_batch(flask_app):
+    batches = run([{"name": "web"}, {"namespace": "shop"}, {"name": "db"}, {"name": "cache"}], batch_size=2)
+    assert [[result["row"] for result in batch] for batch in batches] == [[2], [1, 3], [4]]
+    assert batches[0][0]["status"] == "error"
+    assert {app[2] for app in stored()} == {"web", "db", "cache"}
+
+
+def test_upsert_matches_by_id_then_by_namespace_and_name(flask_app):
+    [[web, db_row]] = run([{"id": "web-1", "name": "web"}, {"name": "db", "namespace": "shop"}])
+    assert (web["status"], db_row["status"]) == ("created", "created")
+
+    [results] = run([
+        {"id": "web-1", "name": "renamed", "repository": {"branch": "next"}},
+        {"name": "db", "namespace": "shop", "repository": {"branch": "next"}},
+        {"name": "db", "namespace": "other"},
+    ], upsert=True)
+    assert [result["status"] for result in results] == ["updated", "updated", "created"]
+    assert results[1]["id"] == db_row["id"]
+    assert stored() == {
+        ("web-1", "default", "renamed", "next"),
+        (db_row["id"], "shop", "db", "next"),
+        (results[2]["id"], "other", "db", "main"),
+    }
+
+
+def test_duplicate_ids_are_rejected_without_upsert(flask_app):
+    run([{"id": "web-1", "name": "web"}])
+
+    [results] = run([{"id": "web-1", "name": "web"}, {"name": "db"}])
+    assert results[0] == {"row": 1, "status": "error", "id": "web-1", "error": "Application web-1 already exists"}
+    assert results[1]["status"] == "created"
+
+
+def test_later_rows_of_a_batch_see_earlier_ones(flask_app):
+    [results] = run([{"id": "web-1", "name": "web"}, {"id": "web-1", "name": "web"}])
+    assert [result["status"] for result in results] == ["created", "error"]
+
+    [results] = run([
+        {"name": "api", "namespace": "shop"},
+        {"name": "api", "namespace": "shop", "repository": {"branch": "next"}},
+    ], upsert=True)
+    assert [result["status"] for result in results] == ["created", "updated"]
+    assert results[0]["id"] == results[1]["id"]
+    assert (results[0]["id"], "shop", "api", "next") in stored()
+
+
+def test_database_errors_fail_the_whole_batch(flask_app, monkeypatch):
+    def execute(*args, **kwargs):
+        raise OperationalError("INSERT", {}, Exception("database is locked"))
+
+    with monkeypatch.context() as patch:
+        patch.setattr(db.session, "execute", execute)
+        batches = run([{"name": "web"}, {"name": "db"}, {"name": "cache"}], batch_size=2)
+
+    assert [result for batch in batches for result in batch] == [
+        {"row": number, "status": "error", "error": "Database error: OperationalError"} for number in (1, 2, 3)
+    ]
+    assert stored() == set()
@@ -0,0 +1,145 @@
+"""
+Unit tests for compose file parsing and caching
+"""
+
+import os
+
+import pytest
+
+from app.services.compose_service import ComposeCache, ComposeError, compose_hashes, interpolate
+
+
+def write(path, content):
+    path.write_text(content)
+    # Make every rewrite visible even on filesystems with coarse timestamps
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_interpolation():
+    variables = {"TAG": "1.27", "EMPTY": ""}
+    assert interpolate("nginx:${TAG}", variables) == "nginx:1.27"
+    assert interpolate("nginx:$TAG", variables) == "nginx:1.27"
+    assert interpolate("${EMPTY:-alpine} ${EMPTY-alpine}", variables) == "alpine "
+    assert interpolate("${MISSING:-${TAG}}", variables) == "1.27"
+    assert interpolate("${TAG:+set}${MISSING:+set}", variables) == "set"
+    assert interpolate("$$TAG", variables) == "$TAG"
+    with pytest.raises(ComposeError, match="MISSING is missing: needed"):
+        interpolate("${MISSING:?needed}", variables)
+
+
+def test_project_is_parsed_and_normalized(tmp_path):
+    compose_file = tmp_path / "docker-compose.yml"
+    write(compose_file,
+          "services:\n"
+          "  web:\n"
+          "    image: nginx:${TAG:-alpine}\n"
+          "    ports: ['8080:80', '127.0.0.1:53:53/udp', 3000, {target: 443, published: 8443}]\n"
+          "    environment: [A=1, B]\n"
+          "    depends_on: [api]\n"
+          "  api: {build: ., environment: {DEBUG: true}}\n"
+          "x-defaults: {restart: always}\n")
+    (tmp_path / ".env").write_text("# tags\nTAG='1.27'\n")
+
+    project = ComposeCache().load(str(compose_file))
+    assert project.images() == ["nginx:1.27"]
+    assert [(p["published"], p["target"], p["protocol"], p["host_ip"]) for p in project.services["web"]["ports"]] == [
+        ("8080", "80", "tcp", None), ("53", "53", "udp", "127.0.0.1"), (None, "3000", "tcp", None), ("8443", "443", "tcp", None)
+    ]
+    assert project.services["web"]["environment"] == {"A": "1", "B": None}
+    assert project.services["api"]["environment"] == {"DEBUG": "True"}
+    assert "environment" not in project.summary()["web"]
+
+
+@pytest.mark.parametrize("content, error", [
+    ("services: [", "Invalid YAML"),
+    ("services: {}\n", "No services"),
+    ("services: {web: {image: nginx}}\nfoo: 1\n", "Unknown top-level sections foo"),
+    ("services: {web: {ports: ['80']}}\n", "neither an image nor a build"),
+    ("services: {web: {image: nginx, depends_on: [db]}}\n", "undefined services db"),
+    ("services: {web: {image: nginx, ports: ['a:b']}}\n", "Invalid port"),
+])
+def test_invalid_compose_files(tmp_path, content, error):
+    compose_file = tmp_path / "docker-compose.yml"
+    write(compose_file, content)
+    with pytest.raises(ComposeError, match=error):
+        ComposeCache().load(str(compose_file))
+
+
+def test_unchanged_files_are_not_parsed_again(tmp_path, monkeypatch):
+    cache = ComposeCache()
+    compose_file = tmp_path / "docker-compose.yml"
+    write(compose_file, "services: {web: {image: 'nginx:${TAG}'}}\n")
+    monkeypatch.setenv("TAG", "1.26")
+
+    first = cache.load(str(compose_file))
+    assert cache.load(str(compose_file)) is first
+    assert cache.stats()["hits"] == 1
+
+    # A touched file with the same content reuses the parsed project
+    write(compose_file, "services: {web: {image: 'nginx:${TAG}'}}\n")
+    assert cache.load(str(compose_file)) is first
+
+    # So does another checkout of the same revision
+    other = tmp_path / "other"
+    other.mkdir()
+    write(other / "docker-compose.yml", "services: {web: {image: 'nginx:${TAG}'}}\n")
+    assert cache.load(str(other / "docker-compose.yml")) is first
+
+    # Changing the file or its .env parses it again
+    write(compose_file, "services: {web: {image: 'nginx:${TAG}-alpine'}}\n")
+    assert cache.load(str(compose_file)).images() == ["nginx:1.26-alpine"]
+    monkeypatch.delenv("TAG")
+    (tmp_path / ".env").write_text("TAG=1.27\n")
+    assert cache.load(str(compose_file)).images() == ["nginx:1.27-alpine"]
+
+
+def test_failures_are_cached(tmp_path):
+    cache = ComposeCache()
+    compose_file = tmp_path / "docker-compose.yml"
+    write(compose_file, "services: {web: {}}\n")
+
+    for _ in range(2):
+        with pytest.raises(ComposeError, match="neither an image"):
+            cache.load(str(compose_file))
+    assert cache.stats() == {"paths": 1, "contents": 1, "hits": 1, "misses": 1}
+
+    write(compose_file, "services: {web: {image: nginx}}\n")
+    assert cache.load(str(compose_file)).images() == ["nginx"]
+
+    with pytest.raises(ComposeError, match="does not exist"):
+        cache.load(str(tmp_path / "missing.yml"))
+
+
+def test_cache_is_bounded(tmp_path):
+    cache = ComposeCache(max_entries=2)
+    for index in range(4):
+        compose_file = tmp_path / f"compose-{index}.yml"
+        write(compose_file, f"services: {{web: {{image: 'nginx:{index}'}}}}\n")
+        cache.load(str(compose_file))
+    assert cache.stats()["paths"] == 2
+    assert cache.stats()["contents"] == 2
+
+
+def test_compose_hashes_follow_services_images_and_shared_sections():
+    compose = {
+        "version": "3.8",
+        "services": {"web": {"image": "nginx:1.27", "ports": ["80"]}, "api": {"build": "."}},
+        "networks": {"front": {}},
+    }
+    image_ids = {"nginx:1.27": "sha256:aaa"}
+    hashes = compose_hashes(compose, image_ids)
+    assert hashes["services"]["api"] is None
+
+    # Key order and the version field do not matter
+    reordered = {"networks": {"front": {}}, "services": {"web": {"ports": ["80"], "image": "nginx:1.27"},
+                                                         "api": {"build": "."}}}
+    assert compose_hashes(reordered, image_ids) == hashes
+
+    pulled = compose_hashes(compose, {"nginx:1.27": "sha256:bbb"})
+    assert pulled["services"]["web"] != hashes["services"]["web"]
+    assert pulled["shared"] == hashes["shared"] and pulled["config"] != hashes["config"]
+
+    shared = compose_hashes({**compose, "networks": {"back": {}}}, image_ids)
+    assert shared["services"] == hashes["services"]
+    assert shared["shared"] != hashes["shared"] and shared["config"] != hashes["config"]
@@ -0,0 +1,147 @@
+"""
+Unit tests for container log retrieval
+"""
+
+import threading
+
+import pytest
+
+from app import create_app
+from app.services.container_logs import ApplicationLogs, CommandLogStream, LogStreamer, parse_since, parse_tail
+from app.services.docker_api import DockerAPIClient
+from app.services.docker_service import DockerService
+
+PROJECT_LABEL = "com.docker.compose.project"
+SERVICE_LABEL = "com.docker.compose.service"
+
+
+def add_container(fake_daemon, name, lines=(), labels=None, tty=False):
+    fake_daemon.containers[name] = {
+        "Id": f"{name}-id-0123456789", "Names": [f"/{name}"], "Image": "nginx:alpine",
+        "Status": "Up", "Ports": [], "Labels": labels or {}, "Tty": tty
+    }
+    fake_daemon.logs[name] = [(1, line) for line in lines]
+
+
+@pytest.fixture
+def service(docker_host, monkeypatch):
+    monkeypatch.setenv("CONTAINER_STATE_CACHE", "false")
+    return DockerService(docker_host)
+
+
+def test_log_arguments_are_parsed():
+    assert parse_tail(None) == "all"
+    assert parse_tail("50") == "50"
+    with pytest.raises(ValueError):
+        parse_tail("-1")
+
+    assert parse_since(None) is None
+    assert parse_since("1700000000") == "1700000000"
+    assert parse_since("15m", now=1700000000) == "1699999100"
+    assert parse_since("2023-11-14T22:13:20Z") == "1700000000"
+    with pytest.raises(ValueError):
+        parse_since("yesterday")
+
+
+def test_multiplexed_frames_are_read_in_bounded_chunks(fake_daemon, docker_host):
+    big = b"x" * 10000 + b"\n"
+    add_container(fake_daemon, "web", [b"first\n", big])
+    fake_daemon.logs["web"].append((2, b"oops\n"))
+    client = DockerAPIClient(docker_host)
+
+    with client.stream_logs("web", chunk_size=4096) as stream:
+        chunks = list(stream)
+    assert max(len(chunk) for chunk in chunks) <= 4096
+    assert b"".join(chunks) == b"first\n" + big + b"oops\n"
+
+    with client.stream_logs("web", tail="1") as stream:
+        assert b"".join(stream) == b"oops\n"
+    query = fake_daemon.calls[-1][2]
+    assert query["tail"] == ["1"] and query["follow"] == ["0"]
+
+    # Output of a TTY is not framed
+    add_container(fake_daemon, "shell", [b"$ ls\n"], tty=True)
+    with client.stream_logs("shell", multiplexed=False) as stream:
+        assert b"".join(stream) == b"$ ls\n"
+
+
+def test_app_containers_are_found_by_name_and_compose_project(fake_daemon, service):
+    add_container(fake_daemon, "shop")
+    add_container(fake_daemon, "shop-web-1", labels={PROJECT_LABEL: "shop", SERVICE_LABEL: "web"})
+    add_container(fake_daemon, "shop-db-1", labels={PROJECT_LABEL: "shop", SERVICE_LABEL: "db"}, tty=True)
+    add_container(fake_daemon, "shopping")
+
+    containers = service.find_app_containers("shop")
+    assert [(c["name"], c["service"], c["tty"]) for c in containers] == [
+        ("shop", None, False), ("shop-db-1", "db", True), ("shop-web-1", "web", False)
+    ]
+    assert [c["name"] for c in service.find_app_containers("shop", ["web"])] == ["shop-web-1"]
+
+
+def test_logs_of_several_containers_are_merged_line_by_line(fake_daemon, service):
+    add_container(fake_daemon, "app-web-1", [b"GET /\n", b"GET /health\n"], labels={PROJECT_LABEL: "app"})
+    add_container(fake_daemon, "app-db", [b"ready\n", b"no newline"], labels={PROJECT_LABEL: "app"})
+
+    logs = LogStreamer(chunk_size=64, buffer_chunks=1).open(service, service.find_app_containers("app"))
+    lines = b"".join(logs).decode().splitlines()
+    assert sorted(lines) == [
+        "app-db    | no newline", "app-db    | ready",
+        "app-web-1 | GET /", "app-web-1 | GET /health"
+    ]
+    assert lines.index("app-db    | ready") < lines.index("app-db    | no newline")
+
+
+def test_followed_logs_stop_when_closed(fake_daemon, service):
+    add_container(fake_daemon, "web", [b"started\n"])
+    add_container(fake_daemon, "web-2", labels={PROJECT_LABEL: "web"})
+    containers = service.find_app_containers("web")
+    received = []
+
+    for logs in (LogStreamer().open(service, containers[:1], follow=True),
+                 LogStreamer().open(service, containers, follow=True)):
+        chunks = iter(logs)
+        received.append(next(chunks))
+        # Closing from another thread wakes up readers waiting for output
+        threading.Timer(0.1, logs.close).start()
+        assert list(chunks) == []
+
+    assert received == [b"started\n", b"web   | started\n"]
+
+
+def test_docker_cli_is_used_without_the_api(tmp_path, monkeypatch):
+    cli = tmp_path / "docker"
+    cli.write_text("#!/bin/sh\necho \"$@\"\n")
+    cli.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{tmp_path}:/usr/bin:/bin")
+    monkeypatch.setenv("DOCKER_BACKEND", "cli")
+    service = DockerService(f"unix://{tmp_path}/docker.sock")
+
+    stream = service.open_container_logs({"id": "abc123", "name": "web"}, follow=True, tail="10", since="1700000000")
+    assert isinstance(stream, CommandLogStream)
+    assert b"".join(ApplicationLogs([("web", stream)])) == b"logs --tail 10 --follow --since 1700000000 abc123\n"
+
+
+def test_logs_endpoint_streams_application_logs(tmp_path, monkeypatch, fake_daemon, docker_host):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path}/dockflow.db")
+    monkeypatch.setenv("DB_CREATE_ALL", "true")
+    monkeypatch.setenv("CONTAINER_STATE_CACHE", "false")
+    client = create_app("development").test_client()
+    app_id = client.post("/api/v1/applications", json={
+        "name": "shop", "environments": [{"name": "production", "dockerHost": docker_host}]
+    }).get_json()["id"]
+    add_container(fake_daemon, "shop-web-1", [b"one\n", b"two\n"], labels={PROJECT_LABEL: "shop", SERVICE_LABEL: "web"})
+    add_container(fake_daemon, "shop-db-1", [b"ready\n"], labels={PROJECT_LABEL: "shop", SERVICE_LABEL: "db"})
+
+    response = client.get(f"/api/v1/applications/{app_id}/logs?service=web&tail=1")
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    assert response.get_data() == b"two\n"
+
+    response = client.get(f"/api/v1/applications/{app_id}/logs?environment=production")
+    assert sorted(response.get_data().decode().splitlines()) == [
+        "shop-db-1  | ready", "shop-web-1 | one", "shop-web-1 | two"
+    ]
+
+    assert client.get(f"/api/v1/applications/{app_id}/logs?since=soon").status_code == 400
+    assert client.get(f"/api/v1/applications/{app_id}/logs?service=cache").status_code == 404
+    assert client.get(f"/api/v1/applications/{app_id}/logs?environment=staging").status_code == 404
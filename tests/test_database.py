@@ -0,0 +1,99 @@
+"""
+Unit tests for engine configuration, read replica routing and advisory locks
+"""
+
+import threading
+from datetime import datetime
+
+import pytest
+import sqlalchemy as sa
+
+from app import create_app, db
+from app.core.database import LockTimeout, TimedQueuePool, _lock_id, advisory_lock
+from app.models.application import Application
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path}/primary.db")
+    monkeypatch.setenv("DATABASE_REPLICA_URL", f"sqlite:///{tmp_path}/replica.db")
+    monkeypatch.setenv("DB_CREATE_ALL", "true")
+    app = create_app("development")
+    with app.app_context():
+        replica = db.engines["replica"]
+        db.metadata.create_all(replica)
+        with replica.begin() as connection:
+            connection.execute(sa.insert(Application.__table__), {
+                "id": "replica-only", "name": "from-replica", "namespace": "default",
+                "status": "created", "created_at": datetime.utcnow()
+            })
+    return app
+
+
+def test_reads_go_to_the_replica_and_writes_to_the_primary(app):
+    client = app.test_client()
+
+    names = [a["name"] for a in client.get("/api/v1/applications").get_json()]
+    assert names == ["from-replica"]
+    assert client.get("/api/v1/applications/replica-only").status_code == 200
+
+    response = client.post("/api/v1/applications", json={"name": "from-primary"})
+    assert response.status_code == 201
+    # Not replicated in this test, so the replica still has only its own row
+    names = [a["name"] for a in client.get("/api/v1/applications").get_json()]
+    assert names == ["from-replica"]
+
+    with app.app_context():
+        assert [a.name for a in Application.query.all()] == ["from-primary"]
+
+
+def test_pool_stats_cover_every_database(app):
+    stats = app.test_client().get("/health/database").get_json()
+    assert set(stats) == {"primary", "replica"}
+    assert stats["primary"]["pool"] == "TimedQueuePool"
+    assert stats["primary"]["checkout"]["checkouts"] >= 1
+
+
+def test_checkout_timeouts_are_counted(tmp_path):
+    engine = sa.create_engine(
+        f"sqlite:///{tmp_path}/pool.db", poolclass=TimedQueuePool,
+        pool_size=1, max_overflow=0, pool_timeout=0.05
+    )
+    with engine.connect():
+        with pytest.raises(sa.exc.TimeoutError):
+            engine.connect()
+    metrics = engine.pool.metrics.to_dict()
+    assert metrics["checkouts"] == 2
+    assert metrics["timeouts"] == 1
+    assert metrics["wait_seconds_max"] >= 0.05
+
+
+def test_advisory_lock_is_exclusive(app):
+    holding, release = threading.Event(), threading.Event()
+
+    def hold():
+        with app.app_context(), advisory_lock("deploy:a"):
+            holding.set()
+            release.wait()
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    holding.wait()
+    with app.app_context():
+        with pytest.raises(LockTimeout):
+            with advisory_lock("deploy:a", timeout=0.1):
+                pass
+        # Other names are not affected
+        with advisory_lock("deploy:b", timeout=0.1):
+            pass
+
+        release.set()
+        holder.join()
+        with advisory_lock("deploy:a", timeout=0.1):
+            pass
+
+
+def test_lock_ids_fit_postgres_bigint():
+    ids = {_lock_id(f"deploy:{i}") for i in range(1000)}
+    assert len(ids) == 1000
+    assert all(-2 ** 63 <= key < 2 ** 63 for key in ids)
@@ -0,0 +1,86 @@
+"""
+Unit tests for the deployment queue
+"""
+
+import threading
+import time
+
+from app.services.deployment_queue import DeploymentQueue
+
+
+def test_duplicate_requests_coalesce_into_one_follow_up():
+    queue = DeploymentQueue(max_workers=2)
+    started, release = threading.Event(), threading.Event()
+    runs = []
+
+    def deploy(name):
+        runs.append(name)
+        started.set()
+        release.wait(5)
+        return {"success": True}
+
+    running = queue.submit("app", deploy, "first", coalesce_key="plain")
+    started.wait(5)
+    # The running deployment cannot pick up later changes, one follow-up does
+    follow_ups = [queue.submit("app", deploy, "again", coalesce_key="plain") for _ in range(3)]
+    forced = queue.submit("app", deploy, "forced", coalesce_key="force")
+    other = queue.submit("other", deploy, "other", coalesce_key="plain")
+
+    assert follow_ups[0] is not running
+    assert follow_ups[1] is follow_ups[0] and follow_ups[2] is follow_ups[0]
+    assert follow_ups[0].coalesced == 2
+    assert forced is not follow_ups[0]
+    assert other is not follow_ups[0]
+
+    release.set()
+    deadline = time.monotonic() + 5
+    while any(queue.stats()[state] for state in ("pending", "running")) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert [job.status for job in (running, follow_ups[0], forced, other)] == ["succeeded"] * 4
+    assert sorted(runs) == ["again", "first", "forced", "other"]
+
+
+def test_jobs_without_key_are_never_merged():
+    queue = DeploymentQueue(max_workers=1)
+    release = threading.Event()
+    queue.submit("app", lambda: {"success": release.wait(5)})
+
+    first = queue.submit("app", lambda: {"success": True})
+    second = queue.submit("app", lambda: {"success": True})
+
+    assert first is not second
+    release.set()
+
+
+def test_queued_deployments_are_reported_until_they_start():
+    queue = DeploymentQueue(max_workers=1)
+    started, release = threading.Event(), threading.Event()
+    running = queue.submit("app", lambda: {"success": started.set() or release.wait(5)})
+    started.wait(5)
+    assert not queue.has_queued("app")
+
+    queue.submit("app", lambda: {"success": True})
+    assert queue.has_queued("app") and not queue.has_queued("other")
+    release.set()
+    deadline = time.monotonic() + 5
+    while queue.has_queued("app") and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert running.status == "succeeded"
+    assert not queue.has_queued("app")
+
+
+def test_done_callbacks_run_once_the_job_finished():
+    queue = DeploymentQueue(max_workers=1)
+    release, finished = threading.Event(), threading.Event()
+    done = []
+    job = queue.submit("app", lambda: {"success": release.wait(5)})
+    job.add_done_callback(lambda job: done.append(job.status) or finished.set())
+
+    assert done == []
+    release.set()
+    assert finished.wait(5)
+    assert done == ["succeeded"]
+
+    # Added later, a callback runs right away
+    job.add_done_callback(lambda job: done.append("late"))
+    assert done == ["succeeded", "late"]
@@ -0,0 +1,210 @@
+"""
+Unit tests for the compose deployment decisions of the deployment service
+"""
+
+import os
+import threading
+import time
+
+import pytest
+
+from app import create_app, db
+from app.controllers import applications
+from app.models.application import Application
+from app.models.job import Job
+from app.services.deployment_queue import DeploymentQueue
+from app.services.deployment_recorder import DeploymentRecorder
+from app.services.deployment_service import DeploymentService
+from app.services.event_bus import EventBus
+
+COMPOSE = """
+services:
+  web:
+    image: nginx:1.27
+  db:
+    image: postgres:16
+"""
+
+
+class FakeDocker:
+    """Docker service recording the compose deployments it is asked for"""
+
+    docker_host = "unix:///var/run/docker.sock"
+
+    def __init__(self):
+        self.containers = [{"name": "shop-web-1", "status": "running"}]
+        self.image_ids = {}
+        self.deployed = []
+
+    def get_image_id(self, image):
+        return self.image_ids.get(image, f"sha256:{image}")
+
+    def get_container_status(self, app_name):
+        return self.containers
+
+    def deploy_compose(self, compose_file, app_name, on_output=None, services=None):
+        self.deployed.append(services)
+        return {"success": True, "message": "Deployed"}
+
+
+@pytest.fixture
+def service():
+    return DeploymentService(DeploymentQueue(), EventBus(), DeploymentRecorder())
+
+
+@pytest.fixture
+def docker():
+    return FakeDocker()
+
+
+def deploy(service, docker, compose_file, previous=None, force=False):
+    docker.deployed.clear()
+    return service._deploy_compose(docker, "app-id", "shop", str(compose_file), previous, force)
+
+
+@pytest.fixture
+def deployed(service, docker, tmp_path):
+    """Compose file of a first, full deployment and the hashes it recorded"""
+    compose_file = tmp_path / "docker-compose.yml"
+    compose_file.write_text(COMPOSE)
+    result = deploy(service, docker, compose_file)
+    assert docker.deployed == [None]
+    return compose_file, result["compose_hashes"]
+
+
+def rewrite(compose_file, content):
+    compose_file.write_text(content)
+    # Let the compose cache see the change even with coarse timestamps
+    stat = compose_file.stat()
+    os.utime(compose_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_unchanged_applications_are_skipped(service, docker, deployed):
+    compose_file, hashes = deployed
+    result = deploy(service, docker, compose_file, hashes)
+    assert docker.deployed == []
+    assert result["success"]
+    assert (result["updated_services"], result["skipped_services"]) == ([], ["db", "web"])
+
+
+def test_changed_services_are_recreated_alone(service, docker, deployed):
+    compose_file, hashes = deployed
+    rewrite(compose_file, COMPOSE.replace("nginx:1.27", "nginx:1.28"))
+    result = deploy(service, docker, compose_file, hashes)
+    # Only the given services are brought up, with --no-deps
+    assert docker.deployed == [["web"]]
+    assert (result["updated_services"], result["skipped_services"]) == (["web"], ["db"])
+
+    # A new image behind the same tag counts as a change
+    docker.image_ids["postgres:16"] = "sha256:newer"
+    assert deploy(service, docker, compose_file, result["compose_hashes"])["updated_services"] == ["db"]
+    assert docker.deployed == [["db"]]
+
+
+def test_services_that_build_are_always_recreated(service, docker, tmp_path):
+    compose_file = tmp_path / "docker-compose.yml"
+    compose_file.write_text(COMPOSE + "  api:\n    build: .\n")
+    hashes = deploy(service, docker, compose_file)["compose_hashes"]
+
+    result = deploy(service, docker, compose_file, hashes)
+    assert docker.deployed == [["api"]]
+    assert result["skipped_services"] == ["db", "web"]
+
+
+@pytest.mark.parametrize("content", [
+    COMPOSE + "networks:\n  front: {}\n",
+    COMPOSE + "  cache:\n    image: redis:7\n",
+    COMPOSE.split("  db:")[0],
+], ids=["shared-section", "added-service", "removed-service"])
+def test_project_changes_bring_up_everything(service, docker, deployed, content):
+    compose_file, hashes = deployed
+    rewrite(compose_file, content)
+    deploy(service, docker, compose_file, hashes)
+    assert docker.deployed == [None]
+
+
+@pytest.mark.parametrize("containers", [[], [{"error": "Failed to get container status: timeout"}]],
+                         ids=["no-containers", "unknown-status"])
+def test_missing_or_unknown_containers_bring_up_everything(service, docker, deployed, containers):
+    compose_file, hashes = deployed
+    docker.containers = containers
+    deploy(service, docker, compose_file, hashes)
+    assert docker.deployed == [None]
+
+
+def test_forced_deployments_bring_up_everything(service, docker, deployed):
+    compose_file, hashes = deployed
+    result = deploy(service, docker, compose_file, hashes, force=True)
+    assert docker.deployed == [None]
+    assert result["updated_services"] == ["db", "web"]
+
+
+@pytest.fixture
+def flask_app(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path}/dockflow.db")
+    monkeypatch.setenv("DB_CREATE_ALL", "true")
+    app = create_app("development")
+    with app.app_context():
+        yield app
+
+
+def wait_for(job):
+    deadline = time.monotonic() + 5
+    while job.status in ("queued", "running") and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def stored_status(app_id):
+    db.session.expire_all()
+    return db.session.get(Application, app_id).status
+
+
+def test_superseded_deployments_leave_the_application_deploying(flask_app, service, monkeypatch):
+    app = Application(name="shop")
+    db.session.add(app)
+    db.session.commit()
+    releases = [threading.Event(), threading.Event()]
+    waits = iter(releases)
+    monkeypatch.setattr(service, "_deploy_to_host", lambda *args: {"success": next(waits).wait(5)})
+
+    # Buffered results of earlier deployments are dropped, not flushed
+    service.recorder.record(flask_app, [], {"id": app.id, "status": "failed"})
+    first = service.enqueue(app)
+    assert stored_status(app.id) == "deploying"
+    service.recorder.flush()
+    assert stored_status(app.id) == "deploying"
+
+    second = service.enqueue(db.session.get(Application, app.id), force=True)
+    releases[0].set()
+    wait_for(first)
+    service.recorder.flush()
+    assert first.result["status"] == "running"
+    assert stored_status(app.id) == "deploying"
+
+    releases[1].set()
+    wait_for(second)
+    service.recorder.flush()
+    assert stored_status(app.id) == "running"
+
+
+def test_jobs_can_be_read_from_another_process(flask_app, service, monkeypatch):
+    app = Application(name="shop")
+    db.session.add(app)
+    db.session.commit()
+    release = threading.Event()
+    monkeypatch.setattr(service, "_deploy_to_host", lambda *args: {"success": release.wait(5)})
+
+    running = service.enqueue(app)
+    queued = service.enqueue(db.session.get(Application, app.id), force=True)
+    assert service.enqueue(db.session.get(Application, app.id), force=True) is queued
+    assert db.session.get(Job, queued.id).to_dict()["coalesced_requests"] == 1
+    release.set()
+    wait_for(running)
+    wait_for(queued)
+
+    # The queue of another API process has never seen the job
+    monkeypatch.setattr(applications, "deployment_queue", DeploymentQueue())
+    job = flask_app.test_client().get(f"/api/v1/jobs/{running.id}").get_json()
+    assert job["status"] == "succeeded" and job["result"]["status"] == "running"
+    assert job["started_at"] and job["finished_at"]
+    assert flask_app.test_client().get("/api/v1/jobs/missing").status_code == 404
@@ -0,0 +1,308 @@
+import socket
+import threading
+import time
+
+import pytest
+
+from app.services.container_state import ContainerStateCache
+from app.services.docker_api import DockerAPIClient, DockerAPIError, DockerConnectionError
+from app.services.docker_service import DockerService, normalize_ports
+
+
+def test_client_reuses_connections(fake_daemon, docker_host):
+    """Sequential requests share one keep-alive connection"""
+    client = DockerAPIClient(docker_host)
+
+    assert client.ping()
+    for _ in range(5):
+        assert client.list_containers() == []
+
+    assert fake_daemon.connections == 1
+    client.close()
+
+
+def drop_second_requests(path):
+    """Daemon answering the first request of each connection and dropping it on the second"""
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(str(path))
+    server.listen()
+    received = []
+
+    def serve(conn):
+        with conn, conn.makefile("rb") as stream:
+            for count in (1, 2):
+                request_line = stream.readline().decode()
+                if not request_line:
+                    return
+                length = 0
+                while (line := stream.readline()) not in (b"\r\n", b""):
+                    name, _, value = line.decode().partition(":")
+                    if name.lower() == "content-length":
+                        length = int(value)
+                stream.read(length)
+                received.append(request_line.split()[:2])
+                if count == 2:
+                    return
+                conn.sendall(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: 2\r\n\r\n[]")
+
+    def accept():
+        while True:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                return
+            threading.Thread(target=serve, args=(conn,), daemon=True).start()
+
+    threading.Thread(target=accept, daemon=True).start()
+    return server, received
+
+
+def test_client_only_resends_idempotent_requests(tmp_path):
+    """A request the daemon may have acted on is not sent twice"""
+    server, received = drop_second_requests(tmp_path / "docker.sock")
+    client = DockerAPIClient(f"unix://{tmp_path / 'docker.sock'}")
+    try:
+        assert client.list_containers() == []
+        assert client.list_containers() == []
+        assert [method for method, _ in received] == ["GET", "GET", "GET"]
+
+        with pytest.raises(DockerConnectionError):
+            client.start_container("web")
+        assert [method for method, _ in received].count("POST") == 1
+    finally:
+        client.close()
+        server.close()
+
+
+def test_client_raises_api_errors(docker_host):
+    """HTTP errors carry the daemon message and status"""
+    client = DockerAPIClient(docker_host)
+
+    with pytest.raises(DockerAPIError) as excinfo:
+        client.stop_container("missing")
+
+    assert excinfo.value.status == 404
+    assert "No such container" in str(excinfo.value)
+
+
+def test_service_deploys_container_over_api(monkeypatch, fake_daemon, docker_host):
+    """deploy_container and get_container_status go through the socket"""
+    monkeypatch.setenv("DOCKER_HOST", docker_host)
+    monkeypatch.setenv("CONTAINER_STATE_CACHE", "false")
+    service = DockerService()
+
+    result = service.deploy_container("web", "nginx:alpine")
+    assert result["success"]
+    assert [call[:2] for call in fake_daemon.calls] == [
+        ("POST", "/containers/web/stop"),
+        ("DELETE", "/containers/web"),
+        ("GET", "/networks/dockflow"),
+        ("POST", "/networks/create"),
+        ("POST", "/containers/create"),
+        ("POST", "/networks/dockflow/connect"),
+        ("POST", "/containers/web-id-0123456789/start"),
+    ]
+    # Reachable under its name on the deploy network like a swapped container
+    assert fake_daemon.networks["dockflow"] == {"web-id-0123456789": ["web"]}
+
+    assert service.get_container_status("web") == [{
+        "id": "web-id-01234",
+        "name": "web",
+        "status": "Created",
+        "ports": "0.0.0.0:8080->80/tcp",
+        "image": "nginx:alpine"
+    }]
+
+    assert service.stop_container("web")["success"]
+    assert service.remove_container("web")["success"]
+    assert not service.remove_container("web")["success"]
+
+
+def test_service_swaps_containers_blue_green(monkeypatch, fake_daemon, docker_host):
+    """The new container takes over the network alias before the old one goes away"""
+    monkeypatch.setenv("DOCKER_HOST", docker_host)
+    monkeypatch.setenv("CONTAINER_STATE_CACHE", "false")
+    service = DockerService()
+    assert service.deploy_container("web", "nginx:1.25", ports={80: 8080})["success"]
+    old_id = fake_daemon.containers["web"]["Id"]
+    fake_daemon.calls.clear()
+
+    result = service.deploy_container("web", "nginx:1.27", strategy="blue_green")
+
+    assert result["success"], result
+    assert result["strategy"] == "blue_green"
+    assert result["ports"] == {"80/tcp": "32768"}
+    assert result["cutover_ms"] >= 0
+    calls = [call[:2] for call in fake_daemon.calls]
+    # Nothing stops the old container until the new one serves the alias
+    assert calls.index(("POST", "/networks/dockflow/connect")) < calls.index(("POST", "/containers/web/stop"))
+    assert calls.index(("POST", "/containers/create")) < calls.index(("POST", "/containers/web/stop"))
+    create = next(call for call in fake_daemon.calls if call[1] == "/containers/create")
+    assert create[2]["name"] == ["web-next"]
+    assert create[3]["HostConfig"]["PortBindings"] == {"80/tcp": [{"HostPort": ""}]}
+
+    assert list(fake_daemon.containers) == ["web"]
+    new = fake_daemon.containers["web"]
+    assert new["Id"] != old_id and new["Image"] == "nginx:1.27"
+    assert fake_daemon.networks["dockflow"] == {new["Id"]: ["web"]}
+
+
+def test_unhealthy_swap_keeps_running_container(monkeypatch, fake_daemon, docker_host):
+    monkeypatch.setenv("DOCKER_HOST", docker_host)
+    monkeypatch.setenv("CONTAINER_STATE_CACHE", "false")
+    service = DockerService()
+    assert service.deploy_container("web", "nginx:1.25")["success"]
+    fake_daemon.health = "unhealthy"
+
+    result = service.deploy_container("web", "nginx:broken", strategy="blue_green")
+
+    assert not result["success"]
+    assert result["error"] == "health check failed"
+    assert list(fake_daemon.containers) == ["web"]
+    assert fake_daemon.containers["web"]["Image"] == "nginx:1.25"
+
+
+def test_failed_cutover_removes_the_new_container(monkeypatch, fake_daemon, docker_host):
+    monkeypatch.setenv("DOCKER_HOST", docker_host)
+    monkeypatch.setenv("CONTAINER_STATE_CACHE", "false")
+    service = DockerService()
+    assert service.deploy_container("web", "nginx:1.25")["success"]
+    old_id = fake_daemon.containers["web"]["Id"]
+    fake_daemon.fail_connects = True
+
+    result = service.deploy_container("web", "nginx:1.27", strategy="blue_green")
+
+    assert not result["success"]
+    assert "could not attach" in result["message"]
+    # The old container keeps running and answering under the alias
+    assert list(fake_daemon.containers) == ["web"]
+    assert fake_daemon.containers["web"]["Image"] == "nginx:1.25"
+    assert fake_daemon.networks["dockflow"] == {old_id: ["web"]}
+
+
+def test_blue_green_rejects_fixed_host_ports(monkeypatch, fake_daemon, docker_host):
+    monkeypatch.setenv("DOCKER_HOST", docker_host)
+    service = DockerService()
+
+    result = service.deploy_container("web", "nginx:alpine", ports={"80/tcp": 8080}, strategy="blue_green")
+
+    assert not result["success"]
+    assert not fake_daemon.calls or all(call[1] != "/containers/create" for call in fake_daemon.calls)
+
+
+def test_normalize_ports():
+    assert normalize_ports({80: 8080, "53/udp": None}) == {"80/tcp": "8080", "53/udp": None}
+    with pytest.raises(ValueError):
+        normalize_ports({"http": 8080})
+    with pytest.raises(ValueError):
+        normalize_ports({80: "eighty"})
+
+
+def test_service_falls_back_to_cli(monkeypatch, tmp_path):
+    """Without a usable socket the docker CLI is used"""
+    monkeypatch.setenv("DOCKER_HOST", f"unix://{tmp_path / 'missing.sock'}")
+    assert DockerService().api is None
+
+    monkeypatch.setenv("DOCKER_BACKEND", "cli")
+    monkeypatch.setenv("DOCKER_HOST", "unix:///var/run/docker.sock")
+    assert DockerService().api is None
+
+
+def test_cli_deployments_join_the_deploy_network(monkeypatch, tmp_path):
+    calls = tmp_path / "calls"
+    cli = tmp_path / "docker"
+    # Records its arguments; the deploy network does not exist yet
+    cli.write_text(f"""#!/bin/sh
+echo "$*" >> {calls}
+[ "$1 $2" = "network inspect" ] && exit 1
+[ "$1" = create ] && echo new-id
+exit 0
+""")
+    cli.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{tmp_path}:/usr/bin:/bin")
+    monkeypatch.setenv("DOCKER_BACKEND", "cli")
+
+    result = DockerService(f"unix://{tmp_path}/docker.sock").deploy_container("web", "nginx:alpine", ports={80: None})
+    assert result["success"] and result["container_id"] == "new-id"
+    assert calls.read_text().splitlines() == [
+        "stop web", "rm web", "network inspect dockflow", "network create dockflow",
+        "create --name web -p 80/tcp nginx:alpine", "network connect --alias web dockflow new-id", "start new-id"
+    ]
+
+
+def test_container_state_follows_events(fake_daemon, docker_host):
+    """The cache is seeded from a listing and updated from events"""
+    client = DockerAPIClient(docker_host)
+    client.create_container("web", {"Image": "nginx:alpine"})
+    cache = ContainerStateCache(client)
+
+    for _ in range(50):
+        if cache.get("web") is not None:
+            break
+        time.sleep(0.05)
+    assert [c["name"] for c in cache.get("web")] == ["web"]
+
+    container_id = client.create_container("db", {"Image": "postgres:17"})
+    calls = len(fake_daemon.calls)
+    fake_daemon.events.put({"Type": "container", "Action": "create", "id": container_id})
+    for _ in range(50):
+        if cache.get("db"):
+            break
+        time.sleep(0.05)
+    assert [c["image"] for c in cache.get("db")] == ["postgres:17"]
+
+    fake_daemon.events.put({"Type": "container", "Action": "destroy", "id": container_id})
+    for _ in range(50):
+        if not cache.get("db"):
+            break
+        time.sleep(0.05)
+    assert cache.get("db") == []
+
+    # Reads never touch the daemon
+    list_calls = [c for c in fake_daemon.calls[calls:] if c[1] == "/containers/json"]
+    assert len(list_calls) == 1
+
+
+def test_container_state_is_not_served_before_connecting(docker_host):
+    """A cache synced but never connected is not fresh, rather than failing"""
+    cache = ContainerStateCache(DockerAPIClient(docker_host))
+    cache._synced_at = time.monotonic()
+    assert cache.is_fresh() is False
+
+    cache.resync()
+    assert cache.is_fresh() is True
+    cache._mark_disconnected()
+    assert cache.is_fresh() is True
+    cache.max_staleness = 0
+    assert cache.is_fresh() is False
+
+
+def test_compose_stacks_keep_the_project_they_run_under(monkeypatch, tmp_path, fake_daemon, docker_host):
+    calls = tmp_path / "calls"
+    cli = tmp_path / "docker"
+    cli.write_text(f'#!/bin/sh\necho "$*" >> {calls}\n')
+    cli.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{tmp_path}:/usr/bin:/bin")
+    monkeypatch.setenv("CONTAINER_STATE_CACHE", "false")
+    compose_file = tmp_path / "Shop Stack" / "docker-compose.yml"
+    compose_file.parent.mkdir()
+    compose_file.write_text("services:\n  web:\n    image: nginx:alpine\n")
+    service = DockerService(docker_host)
+
+    assert service.deploy_compose(str(compose_file), "shop")["success"]
+    # Deployed before projects were named after applications
+    fake_daemon.containers["shopstack-web-1"] = {
+        "Id": "legacy-id-0123456789", "Names": ["/shopstack-web-1"], "Image": "nginx:alpine",
+        "Labels": {"com.docker.compose.project": "shopstack",
+                   "com.docker.compose.project.config_files": f"{compose_file},/elsewhere/override.yml"}
+    }
+    assert service.deploy_compose(str(compose_file), "shop")["success"]
+    # The file of another application in a directory of the same name is not that project's
+    other_file = tmp_path / "other" / "Shop Stack" / "docker-compose.yml"
+    other_file.parent.mkdir(parents=True)
+    other_file.write_text(compose_file.read_text())
+    assert service.deploy_compose(str(other_file), "other")["success"]
+
+    assert [line.split(" -f ")[0] for line in calls.read_text().splitlines()] == [
+        "compose -p shop", "compose -p shopstack", "compose -p other"
+    ]
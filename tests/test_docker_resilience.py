@@ -0,0 +1,152 @@
+"""
+Unit tests for Docker operation retries and the circuit breaker
+"""
+
+import subprocess
+import time
+
+import pytest
+
+from app.services.docker_api import DockerAPIError, DockerConnectionError
+from app.services.docker_resilience import (
+    CircuitBreaker, DockerUnavailableError, RetryPolicy, resilient, transient_error
+)
+from app.services.docker_service import DockerService
+
+DAEMON_DOWN = "Cannot connect to the Docker daemon at unix:///var/run/docker.sock. Is the docker daemon running?"
+
+
+class FakeService:
+    """Stand-in for a DockerService, failing as told"""
+
+    docker_host = "unix:///test.sock"
+
+    def __init__(self, outcomes, threshold=5, reset_timeout=30.0):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+        self.retry_policy = RetryPolicy(max_attempts=3, initial_delay=0.01)
+        self.circuit_breaker = CircuitBreaker(self.docker_host, failure_threshold=threshold, reset_timeout=reset_timeout)
+
+    @resilient
+    def operation(self):
+        self.calls += 1
+        outcome = self.outcomes.pop(0) if self.outcomes else {"success": True}
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    @resilient
+    def outer(self):
+        return self.operation()
+
+
+def test_transient_errors_are_told_apart():
+    assert transient_error(DockerConnectionError("Lost connection to Docker daemon"))
+    assert transient_error(DockerAPIError("server is restarting", status=503))
+    assert transient_error({"success": False, "message": f"Failed to deploy app: {DAEMON_DOWN}", "transient": True})
+    assert transient_error([{"error": "Failed to get container status: i/o timeout", "transient": True}])
+    assert transient_error(subprocess.CalledProcessError(1, ["docker"], stderr="toomanyrequests: rate limited"))
+    assert not transient_error({"success": False, "message": "manifest for nginx:nope not found"})
+    assert not transient_error(DockerAPIError("No such container: web", status=404))
+    assert not transient_error({"success": True})
+
+    # What applications print is not looked at, even when it reads like a daemon error
+    assert not transient_error({"success": False, "message": f"Failed to deploy app: {DAEMON_DOWN}"})
+    assert not transient_error(RuntimeError("upstream: connection refused"))
+    assert not transient_error(subprocess.CalledProcessError(1, ["docker"], output="connection refused", stderr=""))
+
+
+@pytest.mark.parametrize("strategy, ceilings", [
+    ("exponential", [1, 2, 4, 5]),
+    ("linear", [1, 2, 3, 4]),
+    ("constant", [1, 1, 1, 1]),
+])
+def test_backoff_delays_are_jittered_below_their_ceiling(strategy, ceilings):
+    policy = RetryPolicy(backoff_strategy=strategy, initial_delay=1, max_delay=5)
+    for attempt, ceiling in enumerate(ceilings, start=1):
+        delays = [policy.delay(attempt) for _ in range(50)]
+        assert all(0 <= delay <= ceiling for delay in delays)
+        assert len(set(delays)) > 1
+
+
+def test_transient_failures_are_retried():
+    service = FakeService([{"success": False, "message": DAEMON_DOWN, "transient": True}, DockerConnectionError("Lost connection")])
+    assert service.operation() == {"success": True}
+    assert service.calls == 3
+
+    # Errors of the request itself are not
+    service = FakeService([{"success": False, "message": "No such image"}])
+    assert service.operation()["success"] is False
+    assert service.calls == 1
+
+    # The last outcome is returned or raised once attempts run out
+    service = FakeService([DockerConnectionError("Lost connection")] * 3)
+    with pytest.raises(DockerConnectionError):
+        service.operation()
+    assert service.calls == 3
+
+    # Nested operations are retried by the outer one only
+    service = FakeService([{"success": False, "message": DAEMON_DOWN, "transient": True}] * 2)
+    assert service.outer() == {"success": True}
+    assert service.calls == 3
+
+
+def test_circuit_opens_and_probes_the_daemon_again():
+    service = FakeService([{"success": False, "message": DAEMON_DOWN, "transient": True}] * 4, threshold=4, reset_timeout=0.2)
+    assert service.operation()["success"] is False
+    assert service.operation()["success"] is False
+    assert service.circuit_breaker.state == "open"
+    assert service.calls == 4
+
+    with pytest.raises(DockerUnavailableError) as error:
+        service.operation()
+    assert error.value.retry_after == 1
+    assert service.calls == 4
+
+    # One probe after the reset timeout, which closes the circuit
+    time.sleep(0.25)
+    assert service.operation() == {"success": True}
+    assert service.circuit_breaker.state == "closed"
+
+
+def test_docker_service_fails_fast_while_the_daemon_is_down(tmp_path, monkeypatch):
+    calls = tmp_path / "calls"
+    cli = tmp_path / "docker"
+    cli.write_text(f"#!/bin/sh\necho call >> {calls}\necho '{DAEMON_DOWN}' >&2\nexit 1\n")
+    cli.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{tmp_path}:/usr/bin:/bin")
+    monkeypatch.setenv("DOCKER_RETRY_INITIAL_DELAY", "0")
+    monkeypatch.setenv("DOCKER_CIRCUIT_THRESHOLD", "3")
+    service = DockerService(f"unix://{tmp_path}/missing.sock")
+
+    result = service.stop_container("web")
+    assert result["success"] is False
+    assert "Cannot connect" in result["message"]
+    assert len(calls.read_text().splitlines()) == 3
+
+    started = time.perf_counter()
+    with pytest.raises(DockerUnavailableError, match="is unavailable"):
+        service.remove_container("web")
+    assert time.perf_counter() - started < 0.1
+    assert len(calls.read_text().splitlines()) == 3
+
+
+def test_compose_failures_are_not_retried_once_up_started(tmp_path, monkeypatch):
+    calls = tmp_path / "calls"
+    cli = tmp_path / "docker"
+    # A build step of the stack fails talking to a service of its own
+    cli.write_text(f"#!/bin/sh\necho \"$1\" >> {calls}\necho 'curl: (7) connection refused' >&2\nexit 1\n")
+    cli.chmod(0o755)
+    compose_file = tmp_path / "app" / "docker-compose.yml"
+    compose_file.parent.mkdir()
+    compose_file.write_text("services:\n  web:\n    image: nginx\n")
+    monkeypatch.setenv("PATH", f"{tmp_path}:/usr/bin:/bin")
+    monkeypatch.setenv("DOCKER_BACKEND", "cli")
+    monkeypatch.setenv("DOCKER_RETRY_INITIAL_DELAY", "0")
+    service = DockerService(f"unix://{tmp_path}/missing.sock")
+
+    result = service.deploy_compose(str(compose_file), "app")
+    assert result["success"] is False
+    assert "connection refused" in result["message"]
+    assert calls.read_text().splitlines().count("compose") == 1
+    assert service.circuit_breaker.state == "closed"
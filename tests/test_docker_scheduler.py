@@ -0,0 +1,107 @@
+"""
+Unit tests for the Docker operation scheduler
+"""
+
+import threading
+import time
+
+import pytest
+from flask import Flask
+
+from app.services.docker_scheduler import DOCKER_QUEUE_DEPTH, DockerBusyError, DockerScheduler
+
+
+def hold(scheduler, priority, release, started=None, order=None):
+    """Run an operation in a thread until release is set"""
+    def run():
+        with scheduler.slot(priority):
+            if order is not None:
+                order.append(priority)
+            if started:
+                started.set()
+            release.wait(5)
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def wait_for(condition):
+    deadline = time.monotonic() + 5
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert condition()
+
+
+def test_reads_keep_reserved_slots_while_deploys_queue():
+    scheduler = DockerScheduler("unix:///test.sock", max_concurrent=2, reserved_reads=1)
+    release = threading.Event()
+    started = threading.Event()
+    hold(scheduler, "deploy", release, started)
+    started.wait(5)
+    waiting = hold(scheduler, "deploy", release)
+    wait_for(lambda: scheduler.stats()["waiting"]["deploy"] == 1)
+    assert "dockflow_docker_queue_depth" in "\n".join(DOCKER_QUEUE_DEPTH.render())
+
+    started = time.perf_counter()
+    with scheduler.slot("read"):
+        assert time.perf_counter() - started < 0.1
+        assert scheduler.stats()["running"] == {"read": 1, "deploy": 1, "pull": 0}
+
+    release.set()
+    waiting.join(5)
+    assert scheduler.stats()["running"] == {"read": 0, "deploy": 0, "pull": 0}
+
+
+def test_waiting_operations_run_by_priority():
+    scheduler = DockerScheduler("unix:///test.sock", max_concurrent=1, reserved_reads=0)
+    release, started = threading.Event(), threading.Event()
+    order = []
+    first = hold(scheduler, "pull", release, started)
+    started.wait(5)
+
+    threads = []
+    for priority in ("pull", "deploy", "read"):
+        threads.append(hold(scheduler, priority, release, order=order))
+        wait_for(lambda: sum(scheduler.stats()["waiting"].values()) == len(threads))
+
+    release.set()
+    for thread in [first, *threads]:
+        thread.join(5)
+    assert order == ["read", "deploy", "pull"]
+
+
+def test_api_requests_are_rejected_when_the_host_is_busy():
+    scheduler = DockerScheduler("unix:///test.sock", max_concurrent=1, reserved_reads=0, max_queued=1, queue_timeout=0.2)
+    release, started = threading.Event(), threading.Event()
+    hold(scheduler, "deploy", release, started)
+    started.wait(5)
+
+    with Flask(__name__).test_request_context():
+        # Waiting longer than the queue timeout
+        started = time.perf_counter()
+        with pytest.raises(DockerBusyError, match="no slot within 0.2s") as error:
+            with scheduler.slot("read"):
+                pass
+        assert 0.2 <= time.perf_counter() - started < 1
+        assert error.value.retry_after >= 1
+
+        # A full queue is rejected right away, background work still queues
+        queued = hold(scheduler, "deploy", release)
+        wait_for(lambda: scheduler.stats()["waiting"]["deploy"] == 1)
+        with pytest.raises(DockerBusyError, match="1 deploy operations are waiting"):
+            scheduler.admit("deploy")
+        with pytest.raises(DockerBusyError, match="1 deploy operations are waiting"):
+            with scheduler.slot("deploy"):
+                pass
+
+    release.set()
+    queued.join(5)
+    assert scheduler.stats()["waiting"] == {"read": 0, "deploy": 0, "pull": 0}
+
+
+def test_nested_operations_run_in_the_slot_they_are_part_of():
+    scheduler = DockerScheduler("unix:///test.sock", max_concurrent=1, reserved_reads=0)
+    with scheduler.slot("deploy"):
+        with scheduler.slot("read"):
+            assert scheduler.stats()["running"]["deploy"] == 1
+    assert scheduler.stats()["running"]["deploy"] == 0
@@ -0,0 +1,215 @@
+"""
+Unit tests for the GitOps reconciler, against local file:// repositories
+"""
+
+import os
+import subprocess
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app import create_app, db
+from app.models.application import Application
+from app.services import gitops_service
+from app.services.deployment_queue import DeploymentQueue
+from app.services.deployment_recorder import DeploymentRecorder
+from app.services.deployment_service import DeploymentService
+from app.services.event_bus import EventBus
+from app.services.gitops_service import GitOpsReconciler, RateLimiter, RepositoryCache, release_checkout
+from app.workers import gitops_worker
+
+
+def git(cwd, *args):
+    return subprocess.run(
+        ["git", "-c", "user.name=DockFlow", "-c", "user.email=dockflow@example.com", *args],
+        cwd=cwd, check=True, capture_output=True, text=True
+    ).stdout.strip()
+
+
+def commit(repo, content):
+    (repo / "docker-compose.yml").write_text(content)
+    git(repo, "add", "docker-compose.yml")
+    git(repo, "commit", "-q", "-m", "Update compose file")
+    return git(repo, "rev-parse", "HEAD")
+
+
+@pytest.fixture
+def flask_app(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path}/dockflow.db")
+    monkeypatch.setenv("DB_CREATE_ALL", "true")
+    app = create_app("development")
+    with app.app_context():
+        yield app
+
+
+@pytest.fixture
+def remote(tmp_path):
+    repo = tmp_path / "remote"
+    repo.mkdir()
+    git(repo, "init", "-q", "-b", "main")
+    # Let the cache exercise partial fetches like it would on a hosted remote
+    git(repo, "config", "uploadpack.allowFilter", "true")
+    commit(repo, "services:\n  web:\n    image: nginx:1.25\n")
+    return repo
+
+
+def test_cache_fetches_shallow_partial_heads(tmp_path, remote):
+    cache = RepositoryCache(str(tmp_path / "cache"))
+    url = f"file://{remote}"
+    head = commit(remote, "services:\n  web:\n    image: nginx:1.26\n")
+
+    assert cache.remote_head(url, "main") == head
+    assert cache.remote_head(url, "missing") is None
+
+    assert cache.fetch(url, "main") == head
+    git_dir = cache.repository_path(url)
+    assert git(remote, "--git-dir", git_dir, "rev-parse", "--is-shallow-repository") == "true"
+    assert git(remote, "--git-dir", git_dir, "rev-list", "--count", head) == "1"
+
+    checkout = cache.checkout(url, head)
+    assert "nginx:1.26" in open(f"{checkout}/docker-compose.yml").read()
+    assert cache.checkout(url, head) == checkout
+
+
+def test_checkouts_held_by_deployments_are_not_pruned(tmp_path, remote):
+    cache = RepositoryCache(str(tmp_path / "cache"), keep_checkouts=1)
+    url = f"file://{remote}"
+    checkouts = []
+    for version in (26, 27, 28):
+        revision = commit(remote, f"services:\n  web:\n    image: nginx:1.{version}\n")
+        cache.fetch(url, "main")
+        checkouts.append(cache.checkout(url, revision))
+        time.sleep(0.01)
+    # Every checkout is still held by its caller
+    assert all(os.path.isdir(checkout) for checkout in checkouts)
+
+    for checkout in checkouts[:2]:
+        release_checkout(checkout)
+    revision = commit(remote, "services:\n  web:\n    image: nginx:1.29\n")
+    cache.fetch(url, "main")
+    latest = cache.checkout(url, revision)
+    assert [os.path.isdir(checkout) for checkout in checkouts] == [False, False, True]
+    assert os.path.isdir(latest)
+
+
+def test_reconciler_redeploys_when_the_head_moves(tmp_path, remote):
+    url = f"file://{remote}"
+    targets = [
+        {"id": "app-1", "url": url, "branch": "main", "revision": None},
+        {"id": "app-2", "url": url, "branch": "main", "revision": None},
+    ]
+    deployed = []
+
+    def on_change(target, revision, checkout):
+        deployed.append((target["id"], revision, open(f"{checkout}/docker-compose.yml").read()))
+        target["revision"] = revision
+
+    cache = RepositoryCache(str(tmp_path / "cache"))
+    polls = []
+    remote_head = cache.remote_head
+    cache.remote_head = lambda *args: polls.append(args) or remote_head(*args)
+
+    reconciler = GitOpsReconciler(cache, lambda: targets, on_change, interval=0, jitter=0)
+    try:
+        first = reconciler.poll()
+        head = git(remote, "rev-parse", "HEAD")
+        assert [t["id"] for t in first] == ["app-1", "app-2"]
+        assert {revision for _, revision, _ in deployed} == {head}
+        # Applications sharing a repository share its polls
+        assert len(polls) == 1
+
+        assert reconciler.poll() == []
+        assert len(deployed) == 2
+
+        new_head = commit(remote, "services:\n  web:\n    image: nginx:1.27\n")
+        assert [t["revision"] for t in reconciler.poll()] == [new_head, new_head]
+        assert all("nginx:1.27" in compose for _, _, compose in deployed[2:])
+    finally:
+        reconciler.close()
+
+
+def test_reconciler_polls_on_a_jittered_schedule(tmp_path, remote):
+    targets = [{"id": "app-1", "url": f"file://{remote}", "branch": "main", "revision": None}]
+    reconciler = GitOpsReconciler(
+        RepositoryCache(str(tmp_path / "cache")), lambda: targets, lambda *args: None,
+        interval=60, jitter=0.5
+    )
+    try:
+        assert len(reconciler.poll()) == 1
+        assert 30 - 1 <= reconciler.seconds_until_due() <= 90
+        # Not due yet, so the branch is not polled again
+        assert reconciler.poll() == []
+    finally:
+        reconciler.close()
+
+
+def test_unknown_branch_is_skipped(tmp_path, remote):
+    targets = [{"id": "app-1", "url": f"file://{remote}", "branch": "missing", "revision": None}]
+    reconciler = GitOpsReconciler(RepositoryCache(str(tmp_path / "cache")), lambda: targets, lambda *args: None)
+    try:
+        assert reconciler.poll() == []
+    finally:
+        reconciler.close()
+
+
+def test_rate_limiter_spaces_calls():
+    limiter = RateLimiter(rate=20, burst=1)
+    started = time.monotonic()
+    for _ in range(5):
+        limiter.acquire()
+    assert time.monotonic() - started >= 0.15
+
+
+def test_revision_is_redeployed_until_a_deployment_succeeds(flask_app, tmp_path, monkeypatch):
+    app = Application(name="shop", repository_url="file:///shop")
+    db.session.add(app)
+    db.session.commit()
+    jobs = []
+
+    def enqueue(app, **options):
+        jobs.append(SimpleNamespace(id=str(len(jobs)), status="queued", options=options, callbacks=[]))
+        jobs[-1].add_done_callback = jobs[-1].callbacks.append
+        return jobs[-1]
+
+    monkeypatch.setattr(gitops_worker, "deployment_service", SimpleNamespace(prepull=lambda *args: {}, enqueue=enqueue))
+    monkeypatch.setattr(gitops_worker, "_deploying", {})
+    revision = "a" * 40
+
+    gitops_worker.redeploy({"id": app.id}, revision, str(tmp_path))
+    assert jobs[0].options["revision"] == revision
+    assert db.session.get(Application, app.id).repository_revision is None
+
+    # A revision still being deployed is not queued again
+    gitops_worker.redeploy({"id": app.id}, revision, str(tmp_path))
+    assert len(jobs) == 1
+
+    jobs[0].status = "failed"
+    gitops_worker.redeploy({"id": app.id}, revision, str(tmp_path))
+    assert len(jobs) == 2
+
+    # The checkout stays held until both deployments are done with it
+    assert gitops_service._checkout_held(str(tmp_path))
+    for job in jobs:
+        for callback in job.callbacks:
+            callback(job)
+    assert not gitops_service._checkout_held(str(tmp_path))
+
+
+def test_deployment_records_the_revision_on_success(flask_app, monkeypatch):
+    app = Application(name="shop", repository_url="file:///shop")
+    db.session.add(app)
+    db.session.commit()
+    recorder = DeploymentRecorder()
+    service = DeploymentService(DeploymentQueue(), EventBus(), recorder)
+    results = iter([{"success": False, "message": "pull failed"}, {"success": True}])
+    monkeypatch.setattr(service, "_deploy_to_host", lambda *args: next(results))
+
+    assert not service.deploy(app.id, revision="a" * 40)["success"]
+    recorder.flush()
+    assert db.session.get(Application, app.id).repository_revision is None
+
+    assert service.deploy(app.id, revision="a" * 40)["success"]
+    recorder.flush()
+    db.session.expire_all()
+    assert db.session.get(Application, app.id).repository_revision == "a" * 40
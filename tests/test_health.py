@@ -0,0 +1,56 @@
+"""
+Unit tests for the cached dependency probes behind /health/ready
+"""
+
+import threading
+import time
+
+from app.services.health_service import Probe, docker_check
+
+
+def test_results_are_cached_for_the_ttl():
+    calls = []
+    probe = Probe("db", lambda: calls.append(1), ttl=0.2, timeout=1)
+
+    first = probe.result()
+    assert first["status"] == "up"
+    assert "latency_ms" in first
+    assert probe.result() is first
+    assert len(calls) == 1
+
+    time.sleep(0.25)
+    probe.result()
+    assert len(calls) == 2
+
+
+def test_slow_checks_time_out_without_piling_up():
+    release = threading.Event()
+    calls = []
+
+    def hang():
+        calls.append(1)
+        release.wait(5)
+
+    probe = Probe("db", hang, ttl=0, timeout=0.05)
+    try:
+        assert probe.result()["error"] == "Timed out after 0.05s"
+        assert probe.result()["status"] == "down"
+        assert len(calls) == 1
+    finally:
+        release.set()
+
+
+def test_failures_are_reported():
+    def fail():
+        raise ConnectionRefusedError("connection refused")
+
+    result = Probe("db", fail).result()
+    assert result == {**result, "status": "down", "error": "connection refused"}
+
+
+def test_docker_check_pings_the_daemon(docker_host, fake_daemon, tmp_path):
+    assert Probe("docker", docker_check(docker_host, 1)).result()["status"] == "up"
+    assert fake_daemon.calls[-1][1] == "/_ping"
+
+    missing = Probe("docker", docker_check(f"unix://{tmp_path}/missing.sock", 1)).result()
+    assert missing["status"] == "down"
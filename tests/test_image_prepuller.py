@@ -0,0 +1,94 @@
+"""
+Unit tests for the image pre-puller
+"""
+
+import time
+
+from app.services.image_prepuller import ImagePrePuller, compose_images, registry_of
+
+
+def pulls(daemon):
+    return [call for call in daemon.calls if call[1] == "/images/create"]
+
+
+def test_registry_of_image_references():
+    assert registry_of("nginx:alpine") == "docker.io"
+    assert registry_of("library/nginx") == "docker.io"
+    assert registry_of("ghcr.io/acme/api:1.2") == "ghcr.io"
+    assert registry_of("localhost:5000/api") == "localhost:5000"
+
+
+def test_compose_images_skip_built_services(tmp_path):
+    compose_file = tmp_path / "docker-compose.yml"
+    compose_file.write_text(
+        "services:\n"
+        "  web: {image: nginx:alpine}\n"
+        "  worker: {image: nginx:alpine}\n"
+        "  api: {build: ., image: acme/api}\n"
+        "  db: {image: postgres:16}\n"
+    )
+    assert compose_images(str(compose_file)) == ["nginx:alpine", "postgres:16"]
+
+
+def test_shared_images_are_pulled_once(monkeypatch, fake_daemon, docker_host):
+    monkeypatch.setenv("CONTAINER_STATE_CACHE", "false")
+    fake_daemon.pull_delay = 0.2
+    prepuller = ImagePrePuller()
+
+    first = prepuller.schedule(docker_host, ["nginx:alpine", "redis:7"])
+    second = prepuller.schedule(docker_host, ["nginx:alpine"])
+    assert second["nginx:alpine"] is first["nginx:alpine"]
+
+    timings = prepuller.wait(first)
+    assert [(t["image"], t["status"]) for t in timings] == [("nginx:alpine", "pulled"), ("redis:7", "pulled")]
+    assert all(t["seconds"] >= 0.2 for t in timings)
+    assert len(pulls(fake_daemon)) == 2
+
+    # Once pulled, the image is present and not pulled again
+    again = prepuller.wait(prepuller.schedule(docker_host, ["nginx:alpine"]))
+    assert again[0]["status"] == "present"
+    assert len(pulls(fake_daemon)) == 2
+    assert [t["status"] for t in prepuller.timings()][0] == "present"
+    prepuller.close()
+
+
+def test_concurrent_pulls_are_limited_per_registry(monkeypatch, fake_daemon, docker_host):
+    monkeypatch.setenv("CONTAINER_STATE_CACHE", "false")
+    fake_daemon.pull_delay = 0.2
+    prepuller = ImagePrePuller(max_workers=4, per_registry=1)
+
+    started = time.monotonic()
+    futures = prepuller.schedule(docker_host, ["a:1", "b:1", "ghcr.io/acme/c:1", "ghcr.io/acme/d:1"])
+    timings = prepuller.wait(futures)
+    elapsed = time.monotonic() - started
+
+    assert all(t["status"] == "pulled" for t in timings)
+    # Two registries pulling one image at a time, side by side
+    assert 0.4 <= elapsed < 0.7
+    prepuller.close()
+
+
+def test_pulls_waiting_for_a_registry_do_not_hold_up_others(monkeypatch, fake_daemon, docker_host):
+    monkeypatch.setenv("CONTAINER_STATE_CACHE", "false")
+    fake_daemon.pull_delay = 0.2
+    prepuller = ImagePrePuller(max_workers=2, per_registry=1)
+
+    started = time.monotonic()
+    futures = prepuller.schedule(docker_host, ["a:1", "b:1", "c:1", "ghcr.io/acme/d:1"])
+    assert futures["ghcr.io/acme/d:1"].result(timeout=5)["status"] == "pulled"
+    # Pulled next to the first image of docker.io, not after the queued ones
+    assert time.monotonic() - started < 0.35
+
+    assert all(t["status"] == "pulled" for t in prepuller.wait(futures))
+    prepuller.close()
+
+
+def test_failed_pull_is_reported(monkeypatch, fake_daemon, docker_host):
+    monkeypatch.setenv("CONTAINER_STATE_CACHE", "false")
+    fake_daemon.missing_images.add("nginx:missing")
+    prepuller = ImagePrePuller()
+
+    timing, = prepuller.wait(prepuller.schedule(docker_host, ["nginx:missing"]))
+    assert timing["status"] == "failed"
+    assert "not found" in timing["error"]
+    prepuller.close()
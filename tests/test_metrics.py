@@ -0,0 +1,36 @@
+"""
+Unit tests for the metrics registry
+"""
+
+from app.core.metrics import Registry
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    histogram = registry.histogram("latency_seconds", "Latency", ["route"], buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3):
+        histogram.observe(value, route="/a")
+
+    lines = registry.render().splitlines()
+    assert lines[:2] == ["# HELP latency_seconds Latency", "# TYPE latency_seconds histogram"]
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 2' in lines
+    assert 'latency_seconds_bucket{route="/a",le="1.0"} 3' in lines
+    assert 'latency_seconds_bucket{route="/a",le="+Inf"} 4' in lines
+    assert 'latency_seconds_sum{route="/a"} 3.65' in lines
+    assert 'latency_seconds_count{route="/a"} 4' in lines
+
+
+def test_counters_gauges_and_collectors():
+    registry = Registry()
+    failures = registry.counter("failures_total", "Failures", ["operation"])
+    failures.inc(operation='say "hi"')
+    failures.inc(2, operation='say "hi"')
+    registry.gauge("in_flight", "In flight").inc()
+    registry.gauge("queued", "Queued").set_function(lambda: 7)
+    registry.add_collector(lambda: ["extra 1"])
+
+    lines = registry.render().splitlines()
+    assert 'failures_total{operation="say \\"hi\\""} 3' in lines
+    assert "in_flight 1" in lines
+    assert "queued 7" in lines
+    assert lines[-1] == "extra 1"
@@ -1,3 +1,4 @@
+import json
 import pytest
 import requests
 import time
@@ -42,6 +43,29 @@ services:
         assert response.status_code == 200
         assert response.json() == {"status": "healthy"}
     
+    def test_liveness_and_readiness(self, api_url):
+        """Test the liveness and readiness probes"""
+        response = requests.get(f"{api_url}/health/live")
+        assert response.status_code == 200
+        assert response.json() == {"status": "alive"}
+        
+        response = requests.get(f"{api_url}/health/ready")
+        ready = response.json()
+        assert response.status_code == (200 if ready["status"] == "ready" else 503)
+        assert ready["checks"]["database"]["status"] == "up"
+        assert "latency_ms" in ready["checks"]["docker"]
+    
+    def test_metrics(self, api_url):
+        """Test the Prometheus metrics endpoint"""
+        requests.get(f"{api_url}/health")
+        response = requests.get(f"{api_url}/metrics")
+        assert response.status_code == 200
+        assert response.headers["Content-Type"].startswith("text/plain")
+        body = response.text
+        assert 'dockflow_http_request_duration_seconds_count{method="GET",endpoint="health.health_check",status="200"}' in body
+        assert "dockflow_deployments_queued " in body
+        assert "dockflow_db_pool_checkout_wait_seconds_count" in body
+    
     def test_create_application(self, api_url, test_compose_file):
         """Test creating an application"""
         app_data = {
@@ -77,12 +101,66 @@ services:
         
         # Trigger deployment
         response = requests.post(f"{api_url}/api/v1/applications/{app_id}/deploy")
-        assert response.status_code == 200
+        assert response.status_code == 202
         result = response.json()
-        # For POC, we expect the deployment to fail due to missing Docker
-        # but the API should handle the error gracefully
-        assert "status" in result
+        assert result["status"] == "deploying"
         assert "message" in result
+        assert "job" in result
+    
+    def test_deployment_job_status(self, api_url):
+        """Test polling a queued deployment job"""
+        app_id = self.test_create_application(api_url, None)
+        
+        response = requests.post(f"{api_url}/api/v1/applications/{app_id}/deploy")
+        assert response.status_code == 202
+        job_url = response.headers["Location"]
+        
+        # For POC, we expect the deployment to fail due to missing Docker
+        # but the job should still finish and report a result
+        for _ in range(50):
+            job = requests.get(f"{api_url}{job_url}").json()
+            if job["status"] not in ("queued", "running"):
+                break
+            time.sleep(0.1)
+        
+        assert job["application_id"] == app_id
+        assert job["status"] in ("succeeded", "failed")
+        assert "message" in job["result"]
+        
+        # Every attempt is kept in the deployment history
+        response = requests.get(f"{api_url}/api/v1/applications/{app_id}/deployments")
+        assert response.status_code == 200
+        deployments = response.json()
+        assert [d["id"] for d in deployments] == job["result"]["deployments"]
+        assert deployments[0]["status"] == ("succeeded" if job["status"] == "succeeded" else "failed")
+        
+        status = requests.get(f"{api_url}/api/v1/applications/{app_id}").json()["status"]
+        assert status == ("running" if job["status"] == "succeeded" else "failed")
+        
+        response = requests.get(f"{api_url}/api/v1/jobs/non-existent")
+        assert response.status_code == 404
+    
+    def test_stream_application_events(self, api_url):
+        """Test streaming deployment status changes"""
+        app_id = self.test_create_application(api_url, None)
+        
+        response = requests.get(
+            f"{api_url}/api/v1/applications/{app_id}/events",
+            params={"until": "finished"},
+            stream=True,
+            timeout=30
+        )
+        assert response.status_code == 200
+        assert response.headers["Content-Type"].startswith("text/event-stream")
+        lines = response.iter_lines(decode_unicode=True)
+        assert next(lines) == "event: status"
+        assert '"created"' in next(lines)
+        
+        requests.post(f"{api_url}/api/v1/applications/{app_id}/deploy")
+        
+        statuses = [line for line in lines if line.startswith("data:") and '"status"' in line]
+        assert '"deploying"' in statuses[0]
+        assert '"running"' in statuses[-1] or '"failed"' in statuses[-1]
     
     def test_list_applications(self, api_url):
         """Test listing applications"""
@@ -91,6 +169,157 @@ services:
         applications = response.json()
         assert isinstance(applications, list)
     
+    def test_list_applications_pagination(self, api_url):
+        """Test paging through filtered applications with sparse fields"""
+        namespace = f"paging-{int(time.time() * 1000)}"
+        created = []
+        for name in ("alpha", "beta", "gamma"):
+            response = requests.post(
+                f"{api_url}/api/v1/applications",
+                json={"name": name, "namespace": namespace}
+            )
+            created.append(response.json()["id"])
+        
+        seen = []
+        params = {"namespace": namespace, "limit": 2, "fields": "name"}
+        while True:
+            response = requests.get(f"{api_url}/api/v1/applications", params=params)
+            assert response.status_code == 200
+            page = response.json()
+            assert all(set(app) == {"id", "name"} for app in page)
+            seen += [app["id"] for app in page]
+            if "X-Next-Cursor" not in response.headers:
+                break
+            params["cursor"] = response.headers["X-Next-Cursor"]
+        assert seen == created
+        
+        response = requests.get(
+            f"{api_url}/api/v1/applications",
+            params={"namespace": namespace, "name_prefix": "g"}
+        )
+        assert [app["name"] for app in response.json()] == ["gamma"]
+        
+        response = requests.get(f"{api_url}/api/v1/applications/export", params={"namespace": namespace})
+        assert [app["id"] for app in response.json()] == created
+        
+        response = requests.get(f"{api_url}/api/v1/applications", params={"cursor": "bogus"})
+        assert response.status_code == 400
+    
+    def test_conditional_application_reads(self, api_url):
+        """Test ETag revalidation of application reads"""
+        namespace = f"etag-{int(time.time() * 1000)}"
+        response = requests.post(
+            f"{api_url}/api/v1/applications",
+            json={"name": "cached", "namespace": namespace}
+        )
+        app_id = response.json()["id"]
+
+        response = requests.get(f"{api_url}/api/v1/applications/{app_id}")
+        etag = response.headers["ETag"]
+        response = requests.get(f"{api_url}/api/v1/applications/{app_id}", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+
+        params = {"namespace": namespace}
+        response = requests.get(f"{api_url}/api/v1/applications", params=params)
+        list_etag = response.headers["ETag"]
+        response = requests.get(f"{api_url}/api/v1/applications", params=params, headers={"If-None-Match": list_etag})
+        assert response.status_code == 304
+
+        # Deploying changes the application, and so the list it is part of
+        requests.post(f"{api_url}/api/v1/applications/{app_id}/deploy")
+        response = requests.get(f"{api_url}/api/v1/applications/{app_id}", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+        response = requests.get(f"{api_url}/api/v1/applications", params=params, headers={"If-None-Match": list_etag})
+        assert response.status_code == 200
+
+        # So does adding an application
+        list_etag = response.headers["ETag"]
+        requests.post(f"{api_url}/api/v1/applications", json={"name": "other", "namespace": namespace})
+        response = requests.get(f"{api_url}/api/v1/applications", params=params, headers={"If-None-Match": list_etag})
+        assert response.status_code == 200
+        assert len(response.json()) == 2
+
+        # A full page gets another ETag once a next page exists
+        params["limit"] = 2
+        response = requests.get(f"{api_url}/api/v1/applications", params=params)
+        list_etag = response.headers["ETag"]
+        assert "X-Next-Cursor" not in response.headers
+        requests.post(f"{api_url}/api/v1/applications", json={"name": "third", "namespace": namespace})
+        response = requests.get(f"{api_url}/api/v1/applications", params=params, headers={"If-None-Match": list_etag})
+        assert response.status_code == 200
+        assert response.headers["ETag"] != list_etag
+        assert "X-Next-Cursor" in response.headers
+
+    def test_container_deployment_settings(self, api_url):
+        """Test published ports and the deployment strategy of applications"""
+        response = requests.post(
+            f"{api_url}/api/v1/applications",
+            json={"name": "ports-app", "docker": {"ports": {"80": 8081, "9000/udp": None}}}
+        )
+        assert response.status_code == 201
+        app = response.json()
+        assert app["docker"]["ports"] == {"80/tcp": "8081", "9000/udp": None}
+        assert app["docker"]["strategy"] == "recreate"
+        
+        # Both containers run during a swap, so they cannot share a host port
+        response = requests.post(
+            f"{api_url}/api/v1/applications",
+            json={"name": "swap-app", "docker": {"strategy": "blue_green", "ports": {"80": 8081}}}
+        )
+        assert response.status_code == 400
+        
+        response = requests.post(
+            f"{api_url}/api/v1/applications/{app['id']}/deploy",
+            json={"strategy": "rolling"}
+        )
+        assert response.status_code == 400
+    
+    def test_bulk_import_and_export(self, api_url):
+        """Test importing applications from NDJSON and YAML, and exporting NDJSON"""
+        namespace = f"bulk-{int(time.time() * 1000)}"
+        rows = [
+            json.dumps({"name": "one", "namespace": namespace}),
+            "{not json",
+            json.dumps({"namespace": namespace}),
+            json.dumps({"name": "two", "namespace": namespace, "environments": [{"name": "prod"}]}),
+        ]
+        response = requests.post(
+            f"{api_url}/api/v1/applications/bulk",
+            data="\n".join(rows).encode(),
+            headers={"Content-Type": "application/x-ndjson"}
+        )
+        assert response.status_code == 200
+        results = [json.loads(line) for line in response.text.splitlines()]
+        # Invalid rows are reported at once, valid ones when their batch is written
+        statuses = {r["row"]: r["status"] for r in results[:-1]}
+        assert statuses == {1: "created", 2: "error", 3: "error", 4: "created"}
+        assert results[-1] == {"summary": {"created": 2, "updated": 0, "error": 2}}
+        
+        # Upserts match on namespace and name when no id is given
+        documents = f"name: one\nnamespace: {namespace}\ndocker:\n  composeFile: one.yml\n---\nname: three\nnamespace: {namespace}\n"
+        response = requests.post(
+            f"{api_url}/api/v1/applications/bulk",
+            params={"mode": "upsert"},
+            data=documents.encode(),
+            headers={"Content-Type": "application/yaml"}
+        )
+        results = [json.loads(line) for line in response.text.splitlines()]
+        assert results[0] == {"row": 1, "status": "updated", "id": results[0]["id"]}
+        assert results[-1] == {"summary": {"created": 1, "updated": 1, "error": 0}}
+        
+        response = requests.get(
+            f"{api_url}/api/v1/applications/export",
+            params={"namespace": namespace},
+            headers={"Accept": "application/x-ndjson"}
+        )
+        assert response.headers["Content-Type"].startswith("application/x-ndjson")
+        exported = {app["name"]: app for app in map(json.loads, response.text.splitlines())}
+        assert sorted(exported) == ["one", "three", "two"]
+        assert exported["one"]["docker"]["composeFile"] == "one.yml"
+        assert exported["two"]["environments"] == [{"name": "prod", "dockerHost": "localhost"}]
+    
     def test_get_application_status(self, api_url):
         """Test getting application status"""
         # First create an application
@@ -102,6 +331,62 @@ services:
         assert "status" in status
         assert "containers" in status
     
+    def test_local_compose_file_validation(self, api_url, tmp_path):
+        """Test local compose files are validated on create and summarized in the status"""
+        compose_file = tmp_path / "docker-compose.yml"
+        compose_file.write_text("services:\n  web: {ports: ['8080:80']}\n")
+        response = requests.post(
+            f"{api_url}/api/v1/applications",
+            json={"name": "invalid-compose-app", "docker": {"composeFile": str(compose_file)}}
+        )
+        assert response.status_code == 400
+        assert "neither an image nor a build" in response.json()["error"]
+
+        compose_file.write_text("services:\n  web: {image: 'nginx:alpine', ports: ['8080:80']}\n")
+        response = requests.post(
+            f"{api_url}/api/v1/applications",
+            json={"name": "compose-status-app", "docker": {"composeFile": str(compose_file)}}
+        )
+        assert response.status_code == 201
+
+        response = requests.get(f"{api_url}/api/v1/applications/{response.json()['id']}/status")
+        assert response.json()["services"]["web"]["image"] == "nginx:alpine"
+        assert response.json()["services"]["web"]["ports"][0]["published"] == "8080"
+
+    def test_get_applications_status(self, api_url):
+        """Test getting the status of several applications at once"""
+        app_ids = [self.test_create_application(api_url, None) for _ in range(2)]
+        
+        response = requests.get(
+            f"{api_url}/api/v1/applications/status",
+            params={"ids": ",".join(app_ids)}
+        )
+        assert response.status_code == 200
+        statuses = response.json()
+        assert sorted(status["id"] for status in statuses) == sorted(app_ids)
+        assert all("containers" in status for status in statuses)
+        
+        response = requests.get(
+            f"{api_url}/api/v1/applications/status",
+            params={"ids": ",".join(app_ids)},
+            headers={"Accept": "application/x-ndjson"}
+        )
+        assert response.status_code == 200
+        assert len(response.text.splitlines()) == 2
+        
+        # Statuses come one page at a time
+        response = requests.get(
+            f"{api_url}/api/v1/applications/status",
+            params={"ids": ",".join(app_ids), "limit": 1}
+        )
+        assert [status["id"] for status in response.json()] == app_ids[:1]
+        response = requests.get(
+            f"{api_url}/api/v1/applications/status",
+            params={"ids": ",".join(app_ids), "limit": 1, "cursor": response.headers["X-Next-Cursor"]}
+        )
+        assert [status["id"] for status in response.json()] == app_ids[1:]
+        assert "X-Next-Cursor" not in response.headers
+    
     def test_docker_compose_deployment(self, api_url, test_compose_file):
         """Test deployment using Docker Compose file"""
         # Create application with Docker Compose
@@ -130,10 +415,8 @@ services:
         
         # Deploy the application
         response = requests.post(f"{api_url}/api/v1/applications/{app_id}/deploy")
-        assert response.status_code == 200
+        assert response.status_code == 202
         
-        # For POC, we expect the deployment to fail due to missing Docker
-        # but the API should handle the error gracefully
         result = response.json()
         assert "status" in result
         assert "message" in result
@@ -0,0 +1,43 @@
+"""
+Unit tests for the response cache
+"""
+
+from app.services.response_cache import ResponseCache
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = ResponseCache(max_entries=2)
+    cache.put("a", b"1", {})
+    cache.put("b", b"2", {})
+    assert cache.get("a") == (b"1", {})
+    cache.put("c", b"3", {})
+
+    assert cache.get("b") is None
+    assert cache.get("a") == (b"1", {})
+    assert cache.get("c") == (b"3", {})
+
+
+def test_size_is_bounded_in_bytes():
+    cache = ResponseCache(max_bytes=10)
+    cache.put("a", b"x" * 6, {})
+    cache.put("b", b"y" * 6, {})
+    cache.put("huge", b"z" * 11, {})
+
+    assert cache.get("a") is None
+    assert cache.get("huge") is None
+    assert cache.stats()["bytes"] == 6
+
+
+def test_invalidate_drops_tagged_entries():
+    cache = ResponseCache()
+    cache.put("app", b"{}", {}, tags=["application:1"])
+    cache.put("page", b"[]", {"X-Next-Cursor": "c"}, tags=["applications", "application:1", "application:2"])
+    cache.put("other", b"{}", {}, tags=["application:2"])
+
+    cache.invalidate("application:1")
+    assert cache.get("app") is None
+    assert cache.get("page") is None
+    assert cache.get("other") == (b"{}", {})
+
+    cache.invalidate("application:2")
+    assert cache.stats()["entries"] == 0
@@ -0,0 +1,48 @@
+import time
+
+from app.services.docker_service import get_docker_service
+from app.services.rollout import rollout
+
+
+def deploy_nginx(target):
+    return get_docker_service(target["dockerHost"]).deploy_container("web", "nginx:alpine")
+
+
+def test_rollout_deploys_hosts_concurrently(monkeypatch, start_fake_daemon):
+    """Every host gets the container, canary first and the rest in parallel"""
+    monkeypatch.setenv("CONTAINER_STATE_CACHE", "false")
+    daemons = [start_fake_daemon(f"host{i}") for i in range(5)]
+    for daemon in daemons:
+        daemon.delay = 0.2
+    targets = [
+        {"name": f"env{i}", "dockerHost": f"unix://{daemon.server_address}"}
+        for i, daemon in enumerate(daemons)
+    ]
+
+    started = time.monotonic()
+    result = rollout(targets, deploy_nginx, parallelism=4, canary=1)
+    elapsed = time.monotonic() - started
+
+    assert result["success"]
+    assert [host["name"] for host in result["hosts"]] == [target["name"] for target in targets]
+    assert all("web" in daemon.containers for daemon in daemons)
+    # One canary batch followed by a single batch of four
+    assert elapsed < 0.2 * 5
+
+
+def test_rollout_stops_after_failed_canary(monkeypatch, start_fake_daemon):
+    """A failing canary leaves the other hosts untouched"""
+    monkeypatch.setenv("CONTAINER_STATE_CACHE", "false")
+    daemons = [start_fake_daemon(f"host{i}") for i in range(3)]
+    daemons[0].fail_creates = True
+    targets = [
+        {"name": f"env{i}", "dockerHost": f"unix://{daemon.server_address}"}
+        for i, daemon in enumerate(daemons)
+    ]
+
+    result = rollout(targets, deploy_nginx, parallelism=2, canary=1)
+
+    assert not result["success"]
+    assert result["hosts"][0]["success"] is False
+    assert all(host.get("skipped") for host in result["hosts"][1:])
+    assert not any(daemon.containers for daemon in daemons[1:])